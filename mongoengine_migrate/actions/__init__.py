@@ -3,4 +3,6 @@ from .document import *
 from .embedded import *
 from .factory import *
 from .fields import *
+from .indexes import *
+from .optimizer import *
 from .run_python import *
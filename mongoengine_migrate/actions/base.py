@@ -3,6 +3,7 @@ __all__ = [
     'BaseActionMeta',
     'BaseAction',
     'BaseFieldAction',
+    'BaseIndexAction',
     'BaseDocumentAction',
     'BaseCreateDocument',
     'BaseDropDocument',
@@ -101,7 +102,7 @@ class BaseAction(metaclass=BaseActionMeta):
         collection_name = self.parameters.get('collection')
         if not collection_name:
             docschema = left_schema.get(self.document_type)
-            if docschema:
+            if docschema is not None:
                 collection_name = docschema.parameters.get('collection')
 
         collection = db[collection_name] if collection_name else db['COLLECTION_PLACEHOLDER']
@@ -295,6 +296,67 @@ class BaseFieldAction(BaseAction):
         return f'{self.__class__.__name__}({args_str}, ...)'
 
 
+class BaseIndexAction(BaseAction):
+    """
+    Base class for action which affects on one index in a collection
+    """
+
+    def __init__(self, document_type: str, index_name: str, **kwargs):
+        """
+        :param document_type: collection name to be affected
+        :param index_name: index name
+        """
+        super().__init__(document_type, **kwargs)
+        self.index_name = index_name
+
+    @classmethod
+    @abstractmethod
+    def build_object(cls,
+                     document_type: str,
+                     index_name: str,
+                     left_schema: Schema,
+                     right_schema: Schema) -> Optional['BaseIndexAction']:
+        """
+        Factory method which tests if current action type could process
+        schema changes for a given collection and index. If yes then
+        it produces object of current action type with filled out
+        perameters. If no then it returns None.
+        :param document_type: document type in schema to consider
+        :param index_name: index name to consider
+        :param left_schema: database schema before a migration
+         would get applied (left side)
+        :param right_schema: database schema after a migration
+         would get applied (right side)
+        :return: object of self type or None
+        """
+        pass
+
+    def to_python_expr(self) -> str:
+        parameters = {
+            name: getattr(val, 'to_python_expr', lambda: repr(val))()
+            for name, val in self.parameters.items()
+        }
+        if self.dummy_action:
+            parameters['dummy_action'] = True
+
+        kwargs_str = ''.join(f", {name}={val}" for name, val in sorted(parameters.items()))
+        return f'{self.__class__.__name__}({self.document_type!r}, {self.index_name!r}' \
+               f'{kwargs_str})'
+
+    def __repr__(self):
+        params_str = ', '.join(f'{k!r}={v!r}' for k, v in self.parameters.items())
+        args_str = f'{self.document_type!r}, {self.index_name!r}'
+        if self.dummy_action:
+            params_str += f', dummy_action={self.dummy_action}'
+        return f'{self.__class__.__name__}({args_str}, {params_str})'
+
+    def __str__(self):
+        args_str = f'{self.document_type!r}, {self.index_name!r}'
+        if self.dummy_action:
+            args_str += f', dummy_action={self.dummy_action}'
+        return f'{self.__class__.__name__}({args_str}, ...)'
+
+
 class BaseDocumentAction(BaseAction):
     """
     Base class for actions which change a document (collection or
@@ -376,7 +438,7 @@ class BaseDropDocument(BaseDocumentAction):
     @classmethod
     def build_object(cls, document_type: str, left_schema: Schema, right_schema: Schema):
         if document_type in left_schema and document_type not in right_schema:
-            return cls(document_type=document_type)  # FIXME: parameters (indexes, acl, etc.)
+            return cls(document_type=document_type)
 
     def to_schema_patch(self, left_schema: Schema):
         item = left_schema[self.document_type]
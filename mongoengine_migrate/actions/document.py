@@ -17,9 +17,7 @@ log = logging.getLogger('mongoengine-migrate')
 
 
 class CreateDocument(BaseCreateDocument):
-    """Create new document in db
-    # FIXME: parameters (indexes, acl, etc.)
-    """
+    """Create new document in db. Indexes are created by CreateIndex"""
     priority = 8
 
     @classmethod
@@ -34,7 +32,6 @@ class CreateDocument(BaseCreateDocument):
         """
         Mongodb automatically creates collection on the first insert
         So, do nothing
-        FIXME: parameters (indexes, acl, etc.)
         """
 
     def run_backward(self):
@@ -76,8 +73,7 @@ class DropDocument(BaseDropDocument):
     def run_backward(self):
         """
         Mongodb automatically creates collection on the first insert
-        So, do nothing
-        FIXME: parameters (indexes, acl, etc.)
+        So, do nothing. Indexes are created by DropIndex backward
         """
 
 
@@ -2,14 +2,15 @@ __all__ = [
     'build_actions_chain',
     'build_document_action_chain',
     'build_field_action_chain',
+    'build_index_action_chain',
     'get_all_document_types'
 ]
 
 import logging
-from copy import copy
+from copy import deepcopy
 from typing import Iterable, Type
 
-from dictdiffer import patch, diff
+from dictdiffer import diff
 
 import mongoengine_migrate.flags as flags
 from mongoengine_migrate.exceptions import ActionError
@@ -17,6 +18,7 @@ from mongoengine_migrate.schema import Schema
 from .base import (
     actions_registry,
     BaseFieldAction,
+    BaseIndexAction,
     BaseDocumentAction,
     BaseAction
 )
@@ -37,7 +39,8 @@ def build_actions_chain(left_schema: Schema, right_schema: Schema) -> Iterable[B
     # Actions registry sorted by priority
     registry = list(sorted(actions_registry.values(), key=lambda x: x.priority))
 
-    left_schema = copy(left_schema)
+    # Schema is patched in-place by chain builders below
+    left_schema = deepcopy(left_schema)
     document_types = get_all_document_types(left_schema, right_schema)
     for action_cls in registry:
         if issubclass(action_cls, BaseDocumentAction):
@@ -48,18 +51,15 @@ def build_actions_chain(left_schema: Schema, right_schema: Schema) -> Iterable[B
             new_actions = list(
                 build_field_action_chain(action_cls, left_schema, right_schema, document_types)
             )
+        elif issubclass(action_cls, BaseIndexAction):
+            new_actions = list(
+                build_index_action_chain(action_cls, left_schema, right_schema, document_types)
+            )
         else:
             continue
 
         for action in new_actions:
             log.debug('> %s', action)
-            try:
-                left_schema = patch(action.to_schema_patch(left_schema), left_schema)
-            except (TypeError, ValueError, KeyError) as e:
-                raise ActionError(
-                    f"Unable to apply schema patch of {action!r}. More likely that the "
-                    f"schema is corrupted. You can use schema repair tools to fix this issue"
-                ) from e
         action_chain.extend(new_actions)
         document_types = get_all_document_types(left_schema, right_schema)
 
@@ -82,7 +82,9 @@ def build_document_action_chain(action_cls: Type[BaseDocumentAction],
                                 document_types: Iterable[str]) -> Iterable[BaseAction]:
     """
     Walk through schema changes, and produce chain of Action objects
-    of given type which could handle schema changes from left to right
+    of given type which could handle schema changes from left to right.
+    Schema patch of every produced action is applied to `left_schema`
+    in-place
     :param action_cls: Action type to consider
     :param left_schema:
     :param right_schema:
@@ -93,7 +95,7 @@ def build_document_action_chain(action_cls: Type[BaseDocumentAction],
         action_obj = action_cls.build_object(document_type, left_schema, right_schema)
         if action_obj is not None:
             try:
-                left_schema = patch(action_obj.to_schema_patch(left_schema), left_schema)
+                left_schema.patch(action_obj.to_schema_patch(left_schema))
             except (TypeError, ValueError, KeyError) as e:
                 raise ActionError(
                     f"Unable to apply schema patch of {action_obj!r}. More likely that the "
@@ -109,7 +111,9 @@ def build_field_action_chain(action_cls: Type[BaseFieldAction],
                              document_types: Iterable[str]) -> Iterable[BaseAction]:
     """
     Walk through schema changes, and produce chain of Action objects
-    of given type which could handle schema changes from left to right
+    of given type which could handle schema changes from left to right.
+    Schema patch of every produced action is applied to `left_schema`
+    in-place
     :param action_cls: Action type to consider
     :param left_schema:
     :param right_schema:
@@ -127,7 +131,46 @@ def build_field_action_chain(action_cls: Type[BaseFieldAction],
                                                  right_schema)
             if action_obj is not None:
                 try:
-                    left_schema = patch(action_obj.to_schema_patch(left_schema), left_schema)
+                    left_schema.patch(action_obj.to_schema_patch(left_schema))
+                except (TypeError, ValueError, KeyError) as e:
+                    raise ActionError(
+                        f"Unable to apply schema patch of {action_obj!r}. More likely that the "
+                        f"schema is corrupted. You can use schema repair tools to fix this issue"
+                    ) from e
+
+                yield action_obj
+
+
+def build_index_action_chain(action_cls: Type[BaseIndexAction],
+                             left_schema: Schema,
+                             right_schema: Schema,
+                             document_types: Iterable[str]) -> Iterable[BaseAction]:
+    """
+    Walk through schema changes, and produce chain of Action objects
+    of given type which could handle index changes from left to right.
+    Schema patch of every produced action is applied to `left_schema`
+    in-place
+    :param action_cls: Action type to consider
+    :param left_schema:
+    :param right_schema:
+    :param document_types: list of document types to inspect
+    :return: iterable of suitable Action objects
+    """
+    for document_type in document_types:
+        # Take all indexes to detect if they created, changed or dropped
+        all_indexes = set()
+        for schema in (left_schema, right_schema):
+            if document_type in schema:
+                all_indexes |= schema[document_type].indexes.keys()
+
+        for index_name in sorted(all_indexes):
+            action_obj = action_cls.build_object(document_type,
+                                                 index_name,
+                                                 left_schema,
+                                                 right_schema)
+            if action_obj is not None:
+                try:
+                    left_schema.patch(action_obj.to_schema_patch(left_schema))
                 except (TypeError, ValueError, KeyError) as e:
                     raise ActionError(
                         f"Unable to apply schema patch of {action_obj!r}. More likely that the "
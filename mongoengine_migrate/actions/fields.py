@@ -158,7 +158,7 @@ class DropField(BaseFieldAction):
         updater = DocumentUpdater(self._run_ctx['db'], self.document_type,
                                   self._run_ctx['left_schema'], db_field,
                                   self._run_ctx['migration_policy'], document_cls)
-        updater.update_by_path(by_path)
+        updater.with_snapshot().update_by_path(by_path)
 
     def run_backward(self):
         """
@@ -0,0 +1,143 @@
+__all__ = [
+    'CreateIndex',
+    'DropIndex'
+]
+
+import logging
+from copy import deepcopy
+
+from pymongo import IndexModel
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+
+from mongoengine_migrate.flags import EMBEDDED_DOCUMENT_NAME_PREFIX
+from mongoengine_migrate.indexes import get_current_index_builds
+from mongoengine_migrate.mongo import create_indexes
+from mongoengine_migrate.schema import Schema
+from .base import BaseIndexAction
+
+log = logging.getLogger('mongoengine-migrate')
+
+#: Error code which server returns on dropping of nonexistent index
+INDEX_NOT_FOUND_CODE = 27
+
+
+def build_index(collection: Collection, index_name: str, index_spec: dict):
+    """
+    Build index from its schema. If index builds are collecting
+    then the build is deferred until the migration end
+    :param collection: pymongo collection object
+    :param index_name: index name
+    :param index_spec: index schema
+    """
+    options = {k: v for k, v in index_spec.items() if k != 'fields'}
+    index = IndexModel([tuple(f) for f in index_spec['fields']], name=index_name, **options)
+
+    index_builds = get_current_index_builds()
+    if index_builds is not None:
+        log.debug('> Build of index %s on %s is deferred', index_name, collection.name)
+        index_builds.add(collection, index)
+    else:
+        create_indexes([(collection, [index])])
+
+
+def drop_index(collection: Collection, index_name: str):
+    """
+    Drop index if it exists
+    :param collection: pymongo collection object
+    :param index_name: index name
+    """
+    try:
+        collection.drop_index(index_name)
+    except OperationFailure as e:
+        if e.code != INDEX_NOT_FOUND_CODE:
+            raise
+        log.debug('> Index %s not found on %s, skip', index_name, collection.name)
+
+
+class CreateIndex(BaseIndexAction):
+    """Create index in a collection"""
+    priority = 14
+
+    def __init__(self, document_type: str, index_name: str, *, fields: list, **kwargs):
+        """
+        :param document_type: collection name to be affected
+        :param index_name: index name
+        :param fields: index keys: [[field, direction], ...]
+        :param kwargs: index options, e.g. `unique`, `sparse`, etc.
+        """
+        super().__init__(document_type, index_name, fields=fields, **kwargs)
+
+    @classmethod
+    def build_object(cls,
+                     document_type: str,
+                     index_name: str,
+                     left_schema: Schema,
+                     right_schema: Schema):
+        if document_type.startswith(EMBEDDED_DOCUMENT_NAME_PREFIX):
+            # This is an embedded document
+            return None
+
+        match = document_type in left_schema \
+            and document_type in right_schema \
+            and index_name not in left_schema[document_type].indexes \
+            and index_name in right_schema[document_type].indexes
+        if match:
+            return cls(document_type=document_type,
+                       index_name=index_name,
+                       **right_schema[document_type].indexes[index_name])
+
+    def to_schema_patch(self, left_schema: Schema):
+        left_item = left_schema[self.document_type]
+        right_item = deepcopy(left_item)
+        right_item.indexes[self.index_name] = deepcopy(self.parameters)
+
+        return [('change', self.document_type, (left_item, right_item))]
+
+    def run_forward(self):
+        build_index(self._run_ctx['collection'], self.index_name, self.parameters)
+
+    def run_backward(self):
+        drop_index(self._run_ctx['collection'], self.index_name)
+
+
+class DropIndex(BaseIndexAction):
+    """Drop index from a collection
+
+    Also used when index spec was changed, so index will be created
+    again by CreateIndex with a new spec
+    """
+    priority = 7
+
+    @classmethod
+    def build_object(cls,
+                     document_type: str,
+                     index_name: str,
+                     left_schema: Schema,
+                     right_schema: Schema):
+        if document_type.startswith(EMBEDDED_DOCUMENT_NAME_PREFIX):
+            # This is an embedded document
+            return None
+
+        if document_type not in left_schema \
+                or index_name not in left_schema[document_type].indexes:
+            return None
+
+        right_indexes = right_schema[document_type].indexes \
+            if document_type in right_schema else {}
+        if left_schema[document_type].indexes[index_name] != right_indexes.get(index_name):
+            return cls(document_type=document_type, index_name=index_name)
+
+    def to_schema_patch(self, left_schema: Schema):
+        left_item = left_schema[self.document_type]
+        right_item = deepcopy(left_item)
+        del right_item.indexes[self.index_name]
+
+        return [('change', self.document_type, (left_item, right_item))]
+
+    def run_forward(self):
+        drop_index(self._run_ctx['collection'], self.index_name)
+
+    def run_backward(self):
+        index_spec = self._run_ctx['left_schema'][self.document_type].indexes[self.index_name]
+        build_index(self._run_ctx['collection'], self.index_name, index_spec)
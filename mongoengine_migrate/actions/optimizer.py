@@ -0,0 +1,272 @@
+__all__ = [
+    'ActionsOptimizer'
+]
+
+import logging
+from copy import deepcopy
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from mongoengine import fields
+
+import mongoengine_migrate.flags as flags
+from mongoengine_migrate.fields.converters import nothing, deny
+from mongoengine_migrate.fields.registry import type_key_registry, get_type_converter
+from mongoengine_migrate.schema import Schema
+from .base import BaseAction, BaseFieldAction
+from .fields import CreateField, DropField, AlterField, RenameField
+from .run_python import RunPython
+
+log = logging.getLogger('mongoengine-migrate')
+
+#: Type convertions which keep values unchanged, so a convertion
+#: which follows them gives the same result as if it would be
+#: applied to original values
+#:
+#: Format: {(from_field_cls, to_field_cls), ...}
+LOSSLESS_CONVERTIONS = {
+    (fields.IntField, fields.LongField),
+    (fields.IntField, fields.DecimalField),
+    (fields.LongField, fields.DecimalField),
+}
+
+#: Key of action in pending actions list: (migration_name, action_number)
+ActionKey = Tuple[str, int]
+
+
+class _FieldChain:
+    """Actions which were applied to the same field one by one,
+    including field renames
+    """
+    def __init__(self, created: bool):
+        self.created = created
+        # [(key, action, field_schema_before), ...]
+        self.members: List[Tuple[ActionKey, BaseFieldAction, Optional[dict]]] = []
+        # Consecutive AlterField actions which change field type only
+        # [(key, action, field_schema_before), ...]
+        self.type_changes: List[Tuple[ActionKey, AlterField, dict]] = []
+
+
+class ActionsOptimizer:
+    """Peephole optimizer of pending actions.
+
+    Looks over actions of several pending migrations at once and finds
+    actions which data passes are redundant:
+
+    * Field which is created and then dropped (maybe after renames and
+      alterations) -- data passes of all these actions are skipped
+    * Existing field which is altered and then dropped -- alterations
+      are skipped, since their results will be dropped anyway. Not
+      applied if field values snapshot is enabled, because snapshot
+      must keep the values converted by alterations
+    * Consecutive type changes of a field -- collapsed into one direct
+      convertion if result will be the same according to convertion
+      matrix
+
+    Renames are composed in order to track a field through the chain,
+    they do not have data passes.
+
+    Optimizer only decides which data passes to run, schema patches of
+    all actions are applied as usual, so the resulting schema is the
+    same. RunPython actions are barriers which any optimization can't
+    be made across, because user functions could read the data.
+    """
+    def __init__(self, left_schema: Schema):
+        """
+        :param left_schema: db schema before the pending actions
+        """
+        self.left_schema = left_schema
+
+        #: Actions to run instead of original ones. None means that
+        #: data pass of action should be skipped
+        self.overrides: Dict[ActionKey, Optional[BaseAction]] = {}
+
+        self._notes: Dict[ActionKey, str] = {}
+        self._chains: Dict[Tuple[str, str], _FieldChain] = {}  # {(document_type, field): chain}
+
+    def optimize(self,
+                 actions: Sequence[Tuple[ActionKey, BaseAction]]
+                 ) -> Dict[ActionKey, Optional[BaseAction]]:
+        """
+        Find redundant data passes in pending actions
+        :param actions: pending actions in applying order with their
+         keys: [((migration_name, action_number), action_object), ...]
+        :return: dict {key: action_object_to_run_or_None} for actions
+         which should be run in a different way than they are
+        """
+        schema = deepcopy(self.left_schema)
+        for key, action in actions:
+            field_schema = None
+            if isinstance(action, BaseFieldAction):
+                field_schema = deepcopy(schema.get(action.document_type, {})
+                                        .get(action.field_name))
+
+            try:
+                schema.patch(action.to_schema_patch(schema))
+            except Exception as e:
+                # Let the migration process to report the error
+                log.debug('> Optimizer stopped on %s: %s', action, e)
+                self.overrides.clear()
+                self._notes.clear()
+                return self.overrides
+
+            if action.dummy_action:
+                continue
+
+            if isinstance(action, RunPython) \
+                    or action.document_type.startswith(flags.EMBEDDED_DOCUMENT_NAME_PREFIX):
+                # User function could read any data. Embedded document
+                # could be a part of any field
+                self._close_chains(lambda doc: True)
+            elif isinstance(action, BaseFieldAction):
+                self._add_field_action(key, action, field_schema)
+            else:
+                self._close_chains(lambda doc: doc == action.document_type)
+
+        self._close_chains(lambda doc: True)
+
+        for note in self.report:
+            log.info('Optimizer: %s', note)
+
+        return self.overrides
+
+    @property
+    def report(self) -> List[str]:
+        """Human-readable notes about every optimization made"""
+        return list(self._notes.values())
+
+    def _add_field_action(self, key: ActionKey, action: BaseFieldAction, field_schema: dict):
+        chain_key = (action.document_type, action.field_name)
+        if isinstance(action, CreateField):
+            self._close_chain(chain_key)
+            chain = self._chains[chain_key] = _FieldChain(created=True)
+        else:
+            chain = self._chains.setdefault(chain_key, _FieldChain(created=False))
+
+        chain.members.append((key, action, field_schema))
+
+        if isinstance(action, RenameField):
+            self._close_chain((action.document_type, action.new_name))
+            self._chains[(action.document_type, action.new_name)] = self._chains.pop(chain_key)
+        elif isinstance(action, DropField):
+            self._drop_chain(chain_key)
+        elif isinstance(action, AlterField):
+            if self._is_type_change_only(action, field_schema):
+                chain.type_changes.append((key, action, field_schema))
+            else:
+                self._collapse_type_changes(chain)
+
+    def _drop_chain(self, chain_key: Tuple[str, str]):
+        """Field was dropped at the end of chain"""
+        chain = self._chains.pop(chain_key)
+        drop_key, drop_action, _ = chain.members[-1]
+        if chain.created:
+            create_key, create_action, _ = chain.members[0]
+            for key, action, _ in chain.members:
+                if isinstance(action, RenameField):
+                    continue  # Has no data pass
+                self._skip(key, action, f'field is created by {create_action} '
+                                        f'[{create_key[0]} #{create_key[1]}] and dropped by '
+                                        f'{drop_action} [{drop_key[0]} #{drop_key[1]}]')
+            return
+
+        if flags.snapshot:
+            self._collapse_type_changes(chain)
+            return
+
+        # Alterations made after the last db_field change are
+        # redundant. Alterations before it can't be skipped, because
+        # the field should be dropped by its final name. Type changes
+        # which were not collapsed yet are made after it as well
+        for key, action, field_schema in reversed(chain.members[:-1]):
+            if isinstance(action, AlterField):
+                db_field = field_schema.get('db_field')
+                if action.parameters.get('db_field', db_field) != db_field:
+                    break
+                self._skip(key, action, f'field is dropped by {drop_action} '
+                                        f'[{drop_key[0]} #{drop_key[1]}]')
+
+    def _close_chains(self, predicate):
+        for chain_key in [k for k in self._chains if predicate(k[0])]:
+            self._close_chain(chain_key)
+
+    def _close_chain(self, chain_key: Tuple[str, str]):
+        chain = self._chains.pop(chain_key, None)
+        if chain is not None:
+            self._collapse_type_changes(chain)
+
+    def _collapse_type_changes(self, chain: _FieldChain):
+        """
+        Collapse consecutive type changes collected in chain into
+        direct convertions where possible
+        """
+        type_changes, chain.type_changes = chain.type_changes, []
+        group = []
+        for item in type_changes:
+            if group and not self._can_merge(group, item):
+                self._merge(group)
+                group = []
+            group.append(item)
+
+        self._merge(group)
+
+    def _can_merge(self, group: list, item: tuple) -> bool:
+        from_type = group[0][2]['type_key']
+        middle_type = item[2]['type_key']
+        to_type = item[1].parameters['type_key']
+        from_cls, middle_cls, to_cls = (type_key_registry[t].field_cls
+                                        for t in (from_type, middle_type, to_type))
+
+        direct_converter = get_type_converter(from_cls, to_cls)
+        if direct_converter is None or direct_converter is deny:
+            return False
+
+        # Values are left as is, so the next convertion will do the
+        # same as a direct one only if they are the same
+        if get_type_converter(from_cls, middle_cls) is nothing:
+            return direct_converter is get_type_converter(middle_cls, to_cls)
+
+        return (from_cls, middle_cls) in LOSSLESS_CONVERTIONS
+
+    def _merge(self, group: list):
+        if len(group) < 2:
+            return
+
+        (first_key, first_action, first_field_schema), *rest = group
+        from_type = first_field_schema['type_key']
+        to_type = group[-1][1].parameters['type_key']
+        types = ' -> '.join([from_type] + [a.parameters['type_key'] for _, a, _ in group])
+        if from_type == to_type:
+            self._skip(first_key, first_action, f'type changes {types} give the same type')
+        else:
+            # Run the direct convertion in place of the first action
+            self.overrides[first_key] = AlterField(first_action.document_type,
+                                                   first_action.field_name,
+                                                   type_key=to_type)
+            self._notes[first_key] = f'{first_action} [{first_key[0]} #{first_key[1]}]: type ' \
+                                     f'changes {types} are collapsed into one convertion'
+
+        for key, action, _ in rest:
+            self._skip(key, action, f'type change is collapsed into {first_action} '
+                                    f'[{first_key[0]} #{first_key[1]}]')
+
+    def _skip(self, key: ActionKey, action: BaseAction, reason: str):
+        self.overrides[key] = None
+        self._notes[key] = f'{action} [{key[0]} #{key[1]}]: data pass is skipped, {reason}'
+
+    @staticmethod
+    def _is_type_change_only(action: AlterField, field_schema: Optional[dict]) -> bool:
+        """
+        Return True if AlterField action changes only field type.
+        Parameters which are not in skeleton of the current field type
+        are not processed on data during type change
+        """
+        if field_schema is None or 'type_key' not in action.parameters:
+            return False
+        if field_schema['type_key'] not in type_key_registry \
+                or action.parameters['type_key'] not in type_key_registry:
+            return False
+
+        handler_cls = action.get_field_handler_cls(field_schema['type_key'])
+        changed = {k for k, v in handler_cls.schema_skel().items()
+                   if action.parameters.get(k, field_schema.get(k, v)) != field_schema.get(k, v)}
+        return changed == {'type_key'}
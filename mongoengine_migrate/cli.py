@@ -93,6 +93,26 @@ def cli_options(f):
     return f
 
 
+def optimize_option(f):
+    return click.option(
+        '--optimize',
+        default=False,
+        is_flag=True,
+        help='Skip redundant data passes of every pending migration on upgrade, such as passes '
+             'for a field which is dropped later in the same migration'
+    )(f)
+
+
+def prevalidate_option(f):
+    return click.option(
+        '--prevalidate',
+        default=False,
+        is_flag=True,
+        help='Run data checks of all pending migrations in one pass before upgrade and report '
+             'all inconsistencies found at once. Works with "strict" migration policy'
+    )(f)
+
+
 def migration_options(f):
     decorators = [
         click.option(
@@ -106,6 +126,37 @@ def migration_options(f):
             default=False,
             is_flag=True,
             help='Perform migrations without doing any database modifications'
+        ),
+        click.option(
+            '--optimistic-concurrency',
+            default=False,
+            is_flag=True,
+            help='Do not overwrite documents which were concurrently modified while they were '
+                 'processed, reread and process them again instead. Allows to migrate a '
+                 'database which is being used'
+        ),
+        click.option(
+            '--snapshot',
+            default=False,
+            is_flag=True,
+            help='Save original values of fields which are going to be lost (dropped fields, '
+                 'truncated values, etc.), so downgrade could restore them'
+        ),
+        click.option(
+            '--lease',
+            default=False,
+            is_flag=True,
+            help='Run migrations under an exclusive lease. Other processes started with this '
+                 'flag on the same database wait until the lease holder finishes instead of '
+                 'running the same migrations'
+        ),
+        click.option(
+            '--defer-indexes',
+            default=False,
+            is_flag=True,
+            help='Drop secondary indexes of a collection before rewriting its documents one by '
+                 'one and build them again after the action. Speeds up heavy conversions of '
+                 'large collections'
         )
     ]
     for decorator in reversed(decorators):
@@ -129,9 +180,18 @@ def cli(uri, directory, collection, **kwargs):
 @click.command(short_help='Upgrade db to the given migration')
 @click.argument('migration', required=True)
 @migration_options
-def upgrade(migration, dry_run, schema_only):
+@optimize_option
+@prevalidate_option
+def upgrade(migration, dry_run, schema_only, optimistic_concurrency, snapshot, optimize, lease,
+            prevalidate, defer_indexes):
     flags.dry_run = dry_run
     flags.schema_only = schema_only
+    flags.optimistic_concurrency = optimistic_concurrency
+    flags.snapshot = snapshot
+    flags.optimize = optimize
+    flags.lease = lease
+    flags.prevalidate = prevalidate
+    flags.defer_indexes = defer_indexes
 
     mongoengine_migrate.upgrade(migration)
 
@@ -139,21 +199,92 @@ def upgrade(migration, dry_run, schema_only):
 @click.command(short_help='Downgrade db to the given migration')
 @click.argument('migration', required=True)
 @migration_options
-def downgrade(migration, dry_run, schema_only):
+def downgrade(migration, dry_run, schema_only, optimistic_concurrency, snapshot, lease,
+              defer_indexes):
     flags.dry_run = dry_run
     flags.schema_only = schema_only
+    flags.optimistic_concurrency = optimistic_concurrency
+    flags.snapshot = snapshot
+    flags.lease = lease
+    flags.defer_indexes = defer_indexes
     mongoengine_migrate.downgrade(migration)
 
 
 @click.command(short_help='Migrate db to the given migration. By default is to the last one')
 @click.argument('migration', required=False)
 @migration_options
-def migrate(migration, dry_run, schema_only):
+@optimize_option
+@prevalidate_option
+def migrate(migration, dry_run, schema_only, optimistic_concurrency, snapshot, optimize, lease,
+            prevalidate, defer_indexes):
     flags.dry_run = dry_run
     flags.schema_only = schema_only
+    flags.optimistic_concurrency = optimistic_concurrency
+    flags.snapshot = snapshot
+    flags.optimize = optimize
+    flags.lease = lease
+    flags.prevalidate = prevalidate
+    flags.defer_indexes = defer_indexes
     mongoengine_migrate.migrate(migration)
 
 
+@click.command('migrate-many',
+               short_help='Migrate several databases concurrently to the given migration. By '
+                          'default is to the last one')
+@click.argument('migration', required=False)
+@click.option(
+    '-D',
+    '--database',
+    'databases',
+    multiple=True,
+    metavar='NAME',
+    help='Database name to migrate. Can be specified several times'
+)
+@click.option(
+    '--databases-file',
+    type=click.File(),
+    help='File with database names to migrate, one per line'
+)
+@click.option(
+    '--concurrency',
+    type=click.IntRange(min=1),
+    default=4,
+    help='How many databases are migrated at once',
+    show_default=True
+)
+@migration_options
+@optimize_option
+@prevalidate_option
+def migrate_many(migration, databases, databases_file, concurrency, dry_run, schema_only,
+                 optimistic_concurrency, snapshot, optimize, lease, prevalidate,
+                 defer_indexes):
+    flags.dry_run = dry_run
+    flags.schema_only = schema_only
+    flags.optimistic_concurrency = optimistic_concurrency
+    flags.snapshot = snapshot
+    flags.optimize = optimize
+    flags.lease = lease
+    flags.prevalidate = prevalidate
+    flags.defer_indexes = defer_indexes
+
+    databases = list(databases)
+    if databases_file is not None:
+        databases.extend(line.strip() for line in databases_file if line.strip())
+    if not databases:
+        raise click.UsageError('No databases given')
+
+    results = mongoengine_migrate.migrate_many(databases, migration, concurrency)
+    for res in results:
+        status = 'OK' if res['ok'] else 'FAILED'
+        error = f': {res["error"]}' if res['error'] else ''
+        click.echo(f'[{status}] {res["database"]} ({res["elapsed"]:.2f}s){error}')
+
+    failed = sum(1 for res in results if not res['ok'])
+    click.echo(f'Migrated: {len(results) - failed}, failed: {failed}')
+    if failed:
+        sys.exit(1)
+
+
 @click.command(short_help='Generate migration file based on mongoengine model changes')
 @click.option(
     "-m",
@@ -169,10 +300,89 @@ def makemigrations(models_module):
     mongoengine_migrate.makemigrations()
 
 
+@click.command(short_help='Squash a range of migrations into one migration')
+@click.argument('from_migration', required=True)
+@click.argument('to_migration', required=True)
+def squashmigrations(from_migration, to_migration):
+    mongoengine_migrate.squashmigrations(from_migration, to_migration)
+
+
+@click.command(short_help='Show migrations and whether they were applied')
+def status():
+    for name, applied in mongoengine_migrate.status():
+        click.echo(f'[{"X" if applied else " "}] {name}')
+
+
+@click.command(short_help='Find records which do not conform to schema')
+@click.option(
+    '--install-validators',
+    default=False,
+    is_flag=True,
+    help='Also install $jsonSchema validators on collections, so records which do not conform '
+         'to schema will be rejected by server'
+)
+@click.option(
+    '--dry-run',
+    default=False,
+    is_flag=True,
+    help='Dry run mode. Just show validators to be installed'
+)
+def check(install_validators, dry_run):
+    flags.dry_run = dry_run
+    results = mongoengine_migrate.check(install_validators)
+    for res in results:
+        examples = ', '.join(str(x) for x in res['examples'])
+        details = f' (e.g. _id: {examples})' if examples else ''
+        click.echo(f'{res["collection"]}: {res["count"]} non-conforming records{details}')
+
+    if any(res['count'] for res in results):
+        sys.exit(1)
+
+
+@click.command(short_help='Make initial migration from existing collections')
+@click.option(
+    '-c',
+    '--collection',
+    'collections',
+    multiple=True,
+    metavar='COLLECTION',
+    help='Collection to inspect. Can be specified several times. By default all collections '
+         'are inspected'
+)
+@click.option(
+    '--sample-size',
+    default=flags.INSPECT_SAMPLE_SIZE,
+    type=click.IntRange(min=1),
+    help='How many records are sampled from every collection',
+    show_default=True,
+)
+@click.option(
+    '--concurrency',
+    default=4,
+    type=click.IntRange(min=1),
+    help='How many collections are inspected at once',
+    show_default=True,
+)
+@click.option(
+    '--dry-run',
+    default=False,
+    is_flag=True,
+    help='Dry run mode. Write migration file, but do not mark it as applied'
+)
+def inspectdb(collections, sample_size, concurrency, dry_run):
+    flags.dry_run = dry_run
+    mongoengine_migrate.inspectdb(collections or None, sample_size, concurrency)
+
+
 cli.add_command(upgrade)
 cli.add_command(downgrade)
 cli.add_command(makemigrations)
 cli.add_command(migrate)
+cli.add_command(migrate_many)
+cli.add_command(squashmigrations)
+cli.add_command(status)
+cli.add_command(check)
+cli.add_command(inspectdb)
 
 
 if __name__ == '__main__':
@@ -4,7 +4,8 @@ __all__ = [
     'ActionError',
     'SchemaError',
     'MigrationError',
-    'InconsistencyError'
+    'InconsistencyError',
+    'LeaseError'
 ]
 
 
@@ -32,3 +33,9 @@ class InconsistencyError(MigrationError):
     """Error which could occur during migration if data inconsistency
     was detected
     """
+
+
+class LeaseError(MongoengineMigrateError):
+    """Error related to migration lease, e.g. it could not be taken
+    or it was lost
+    """
@@ -4,22 +4,42 @@ __all__ = [
 ]
 
 import inspect
+import logging
 import weakref
-from typing import Type, Iterable, List, Tuple, Collection, Any
+from typing import Type, Iterable, List, Tuple, Collection, Any, Optional
 
 import mongoengine.fields
+import pymongo
+import pymongo.errors
 from pymongo.database import Database
 
 import mongoengine_migrate.flags as flags
-from mongoengine_migrate.exceptions import SchemaError, MigrationError, ActionError
-from mongoengine_migrate.fields.registry import type_key_registry, add_field_handler
+from mongoengine_migrate.exceptions import (
+    SchemaError,
+    MigrationError,
+    ActionError,
+    InconsistencyError
+)
+from mongoengine_migrate.fields.registry import (
+    type_key_registry,
+    add_field_handler,
+    get_registry_item,
+    get_type_converter
+)
 from mongoengine_migrate.graph import MigrationPolicy
-from mongoengine_migrate.mongo import check_empty_result
+from mongoengine_migrate.mongo import (
+    check_empty_result,
+    check_no_duplicates,
+    check_references,
+    create_index,
+    find_index
+)
 from mongoengine_migrate.schema import Schema
-from mongoengine_migrate.utils import get_closest_parent, document_type_to_class_name, Diff, UNSET
-from .registry import CONVERTION_MATRIX
+from mongoengine_migrate.utils import document_type_to_class_name, Diff, UNSET
 from ..updater import ByPathContext, ByDocContext, DocumentUpdater
 
+log = logging.getLogger('mongoengine-migrate')
+
 
 class FieldHandlerMeta(type):
     def __new__(mcs, name, bases, attrs):
@@ -127,15 +147,12 @@ class CommonFieldHandler(metaclass=FieldHandlerMeta):
         if field_class.__name__ in type_key_registry:
             schema['type_key'] = field_class.__name__
         else:
-            registry_field_cls = get_closest_parent(
-                field_class,
-                (x.field_cls for x in type_key_registry.values())
-            )
-            if registry_field_cls is None:
+            registry_item = get_registry_item(field_class)
+            if registry_item is None:
                 raise ActionError(f'Could not find {field_class!r} or one of its base classes '
                                   f'in type_key registry')
 
-            schema['type_key'] = registry_field_cls.__name__
+            schema['type_key'] = registry_item.field_cls.__name__
 
         return schema
 
@@ -214,12 +231,26 @@ class CommonFieldHandler(metaclass=FieldHandlerMeta):
         pass
 
     def change_unique(self, updater: DocumentUpdater, diff: Diff):
-        # TODO
-        pass
+        """
+        Build or drop unique index on a field. Under strict policy
+        duplicate values are reported before index build
+        :param updater:
+        :param diff:
+        :return:
+        """
+        self._check_diff(updater, diff, False, bool)
+        self._update_unique_index(updater)
 
     def change_unique_with(self, updater: DocumentUpdater, diff: Diff):
-        # TODO
-        pass
+        """
+        Rebuild unique index on a field with a new fields set. Under
+        strict policy duplicate values are reported before index build
+        :param updater:
+        :param diff:
+        :return:
+        """
+        self._check_diff(updater, diff, True, (str, list, tuple))
+        self._update_unique_index(updater)
 
     def change_primary_key(self, updater: DocumentUpdater, diff: Diff):
         """
@@ -231,6 +262,10 @@ class CommonFieldHandler(metaclass=FieldHandlerMeta):
         def by_path(ctx: ByPathContext):
             fltr = {ctx.filter_dotpath: {'$exists': False}, **ctx.extra_filter}
             check_empty_result(ctx.collection, ctx.filter_dotpath, fltr)
+            if diff.new is True:
+                check_no_duplicates(ctx.collection,
+                                    [ctx.filter_dotpath],
+                                    find_filter=ctx.extra_filter)
 
         self._check_diff(updater, diff, False, bool)
 
@@ -238,7 +273,6 @@ class CommonFieldHandler(metaclass=FieldHandlerMeta):
             raise SchemaError(f'Embedded document {updater.document_type} cannot have primary key')
         if self.migration_policy.name == 'strict':
             updater.update_by_path(by_path)
-        # self.change_unique([], []) or []  # TODO
 
     # TODO: consider Document, EmbeddedDocument as choices
     def change_choices(self, updater: DocumentUpdater, diff: Diff):
@@ -325,22 +359,181 @@ class CommonFieldHandler(metaclass=FieldHandlerMeta):
         :return:
         """
 
-        type_converters = CONVERTION_MATRIX.get(from_field_cls) or \
-            CONVERTION_MATRIX.get(get_closest_parent(from_field_cls, CONVERTION_MATRIX.keys()))
-
-        if type_converters is None:
-            raise MigrationError(f'Type converter not found for convertion '
-                                 f'{from_field_cls!r} -> {to_field_cls!r}')
-
-        type_converter = type_converters.get(to_field_cls) or \
-            type_converters.get(get_closest_parent(to_field_cls, type_converters))
-
+        type_converter = get_type_converter(from_field_cls, to_field_cls)
         if type_converter is None:
             raise MigrationError(f'Type converter not found for convertion '
                                  f'{from_field_cls!r} -> {to_field_cls!r}')
 
         type_converter(updater)
 
+    def _update_unique_index(self, updater: DocumentUpdater):
+        """
+        Make unique index on a field to match the right field schema:
+        build index of the right schema and drop index of the left one.
+        The left index is dropped only after the right one is built, so
+        a failed check or build leaves the collection as it was. Both
+        `unique` and `unique_with` changes lead here, so the second
+        call in the same action finds the index already built
+        :param updater:
+        :return:
+        """
+        def by_path(ctx: ByPathContext):
+            left_keys = self._get_unique_index_keys(self.left_field_schema,
+                                                    self.left_schema[self.document_type],
+                                                    ctx)
+            right_keys = self._get_unique_index_keys(self.right_field_schema,
+                                                     self._get_right_document_schema(),
+                                                     ctx)
+            right_sparse = bool(self.right_field_schema.get('sparse'))
+
+            if right_keys and not find_index(ctx.collection,
+                                             right_keys,
+                                             unique=True,
+                                             sparse=right_sparse):
+                build_index(ctx, right_keys, right_sparse)
+
+            if left_keys and left_keys != right_keys:
+                index_name = find_index(ctx.collection, left_keys, unique=True)
+                if index_name is not None:
+                    ctx.collection.drop_index(index_name)
+
+        def build_index(ctx: ByPathContext, keys: List[Tuple[str, int]], sparse: bool):
+            db_fields = [k for k, _ in keys]
+            if self.migration_policy.name == 'strict':
+                # Sparse index does not contain records without fields
+                fltr = {'$or': [{f: {'$exists': True}} for f in db_fields]} if sparse else None
+                unwind_paths = self._get_array_paths(ctx.update_dotpath)
+                check_no_duplicates(ctx.collection, db_fields, unwind_paths, fltr)
+
+            try:
+                create_index(ctx.collection, keys, unique=True, sparse=sparse)
+            except pymongo.errors.DuplicateKeyError as e:
+                if self.migration_policy.name == 'strict':
+                    raise InconsistencyError(
+                        f"Fields {ctx.collection.name}.{','.join(db_fields)} in some "
+                        f"records have duplicate values: {e}"
+                    ) from e
+                log.warning('Unique index on %s.%s was not built because of duplicate values: %s',
+                            ctx.collection.name, ','.join(db_fields), e)
+
+        updater.update_by_path(by_path)
+
+    def _get_right_document_schema(self) -> dict:
+        """
+        Return fields schema of document after the field change. Only
+        the handled field is changed, it's found by its db_field
+        """
+        db_field = self.left_field_schema.get('db_field')
+        return {
+            name: self.right_field_schema if field_schema.get('db_field') == db_field
+            else field_schema
+            for name, field_schema in self.left_schema[self.document_type].items()
+        }
+
+    def _get_unique_index_keys(self,
+                               field_schema: dict,
+                               document_schema: dict,
+                               ctx: ByPathContext) -> Optional[List[Tuple[str, int]]]:
+        """
+        Return keys of unique index which mongoengine builds for a
+        field with given schema, or None if field is not unique
+        :param field_schema: field schema
+        :param document_schema: schema of document fields where
+         `unique_with` fields are looked up
+        :param ctx:
+        """
+        unique_with = field_schema.get('unique_with') or []
+        if isinstance(unique_with, str):
+            unique_with = [unique_with]
+        if not field_schema.get('unique') and not unique_with:
+            return None
+
+        prefix = ctx.filter_dotpath.split('.')[:-1]
+        db_fields = [field_schema['db_field']]
+        for field_path in unique_with:
+            name, *rest = field_path.split('.')
+            db_field = document_schema.get(name, {}).get('db_field', name)
+            db_fields.append('.'.join([db_field] + rest))
+
+        keys = [('.'.join(prefix + [f]), pymongo.ASCENDING) for f in db_fields]
+        # Mongoengine prepends `_cls` to non-sparse indexes of
+        # documents with inheritance
+        if self._is_inherited_collection(ctx.collection.name) and not field_schema.get('sparse'):
+            keys.insert(0, ('_cls', pymongo.ASCENDING))
+
+        return keys
+
+    def _is_inherited_collection(self, collection_name: str) -> bool:
+        """
+        Return True if documents stored in a collection use inheritance.
+        Embedded documents are looked up in documents of the collection
+        they are stored in
+        :param collection_name: collection name
+        """
+        if not self.document_type.startswith(flags.EMBEDDED_DOCUMENT_NAME_PREFIX):
+            return bool(self.left_schema[self.document_type].parameters.get('inherit'))
+
+        return any(
+            document_schema.parameters.get('inherit')
+            for document_type, document_schema in self.left_schema.items()
+            if not document_type.startswith(flags.EMBEDDED_DOCUMENT_NAME_PREFIX)
+            and document_schema.parameters.get('collection') == collection_name
+        )
+
+    def _check_target_references(self,
+                                 updater: DocumentUpdater,
+                                 target_doctype: str,
+                                 id_key: Optional[str] = None):
+        """
+        Under strict policy check that values of a reference field
+        point to existing records in collection of a target document
+        type. Only ids are read, referenced records are not fetched
+        :param updater:
+        :param target_doctype: document type which field refers to
+        :param id_key: Optional. Key of id if values are embedded
+         documents (like cached references)
+        :return:
+        """
+        def by_path(ctx: ByPathContext):
+            db_field = f'{ctx.filter_dotpath}.{id_key}' if id_key else ctx.filter_dotpath
+            check_references(ctx.collection,
+                             db_field,
+                             self.db[target_collection],
+                             self._get_array_paths(ctx.update_dotpath),
+                             ctx.extra_filter)
+
+        if self.migration_policy.name != 'strict':
+            return
+
+        if target_doctype == 'self':
+            target_doctype = updater.document_type
+        # Referenced document could not exist in schema yet
+        target_collection = None
+        if target_doctype in self.left_schema:
+            target_collection = self.left_schema[target_doctype].parameters.get('collection')
+        if not target_collection:
+            log.debug('> Collection of %s is unknown, skip references check', target_doctype)
+            return
+
+        updater.update_by_path(by_path)
+
+    @staticmethod
+    def _get_array_paths(update_dotpath: str) -> List[str]:
+        """
+        Return dotpaths of arrays of embedded documents which are met
+        on a field path
+        :param update_dotpath: update dotpath with array filters
+        :return:
+        """
+        res, path = [], []
+        for part in update_dotpath.split('.'):
+            if part.startswith('$['):
+                res.append('.'.join(path))
+            else:
+                path.append(part)
+
+        return res
+
     @staticmethod
     def _check_diff(updater: DocumentUpdater, diff: Diff, can_be_none=True, check_type=None):
         if diff.new == diff.old:
@@ -19,7 +19,7 @@ __all__ = [
 ]
 
 import re
-from typing import Type, Collection, Union
+from typing import Type, Collection, Union, List
 
 import bson
 import mongoengine.fields
@@ -27,9 +27,14 @@ import mongoengine.fields
 from mongoengine_migrate.exceptions import SchemaError, InconsistencyError
 from mongoengine_migrate.mongo import (
     check_empty_result,
-    mongo_version
+    mongo_version,
+    build_path_filter,
+    build_path_update,
+    dbref_expr,
+    dbref_field_expr
 )
 from ..updater import ByPathContext, ByDocContext, DocumentUpdater
+from mongoengine_migrate.references import ReferenceResolver
 from mongoengine_migrate.utils import get_document_type, Diff, UNSET
 from .base import CommonFieldHandler
 from .converters import to_string, to_decimal
@@ -87,8 +92,26 @@ class StringFieldHandler(CommonFieldHandler):
 
     schema_skel_keys = {'max_length', 'min_length', 'regex'}
 
+    @mongo_version(min_version='4.2')
     def change_max_length(self, updater: DocumentUpdater, diff: Diff):
         """Cut off a string if it longer than limitation (if any)"""
+        def condition(path: str) -> dict:
+            value = f'${path}'
+            # $and in expression is short-circuit, so $strLenCP
+            # is not evaluated for non-strings
+            expr = {'$and': [
+                {'$eq': [{'$type': value}, 'string']},
+                {'$gt': [{'$strLenCP': value}, diff.new]}
+            ]}
+            return {path: {'$type': 'string'}, '$expr': expr}
+
+        def by_path(ctx: ByPathContext):
+            value = f'${ctx.filter_dotpath}'
+            ctx.collection.update_many(
+                {**condition(ctx.filter_dotpath), **ctx.extra_filter},
+                [{'$set': {ctx.update_dotpath: {'$substrCP': [value, 0, diff.new]}}}]  # >= 4.2
+            )
+
         def by_doc(ctx: ByDocContext):
             doc = ctx.document
             match = updater.field_name in doc and len(doc[updater.field_name]) > diff.new
@@ -101,8 +124,9 @@ class StringFieldHandler(CommonFieldHandler):
         if diff.new < 0:
             diff.new = 0
 
-        # Cut too long strings
-        updater.update_by_document(by_doc)
+        # Cut too long strings. Pipeline could not update
+        # embedded documents in arrays
+        updater.with_snapshot(condition).update_combined(by_path, by_doc, False, True)
 
     @mongo_version(min_version='3.6')
     def change_min_length(self, updater: DocumentUpdater, diff: Diff):
@@ -323,8 +347,20 @@ class ComplexDateTimeFieldHandler(StringFieldHandler):
 
     schema_skel_keys = {'separator'}
 
+    @mongo_version(min_version='4.4')
     def change_separator(self, updater: DocumentUpdater, diff: Diff):
         """Change separator in datetime strings"""
+        def by_path(ctx: ByPathContext):
+            fltr = {
+                ctx.filter_dotpath: {'$type': 'string', '$regex': re.escape(diff.old)},
+                **ctx.extra_filter
+            }
+            replace = {'input': f'${ctx.filter_dotpath}', 'find': diff.old, 'replacement': diff.new}
+            ctx.collection.update_many(
+                fltr,
+                [{'$set': {ctx.update_dotpath: {'$replaceAll': replace}}}]  # >= 4.4
+            )
+
         def by_doc(ctx: ByDocContext):
             doc = ctx.document
             if updater.field_name in doc:
@@ -337,7 +373,7 @@ class ComplexDateTimeFieldHandler(StringFieldHandler):
         if diff.new == UNSET:
             return
 
-        updater.update_by_document(by_doc)
+        updater.update_combined(by_path, by_doc, False, True)
 
 
 class ListFieldHandler(CommonFieldHandler):
@@ -365,8 +401,25 @@ class ListFieldHandler(CommonFieldHandler):
 
         return skel
 
+    @mongo_version(min_version='4.2')
     def change_max_length(self, updater: DocumentUpdater, diff: Diff):
         """Cut off a list if it longer than limitation (if any)"""
+        def condition(path: str) -> dict:
+            value = f'${path}'
+            # $and in expression is short-circuit, so $size
+            # is not evaluated for non-arrays
+            expr = {'$and': [{'$isArray': value}, {'$gt': [{'$size': value}, diff.new]}]}
+            return {path: {'$exists': True}, '$expr': expr}
+
+        def by_path(ctx: ByPathContext):
+            value = f'${ctx.filter_dotpath}'
+            # $slice does not accept zero length
+            sliced = {'$slice': [value, diff.new]} if diff.new > 0 else {'$literal': []}
+            ctx.collection.update_many(
+                {**condition(ctx.filter_dotpath), **ctx.extra_filter},
+                [{'$set': {ctx.update_dotpath: sliced}}]  # >= 4.2
+            )
+
         def by_doc(ctx: ByDocContext):
             doc = ctx.document
             match = updater.field_name in doc and len(doc[updater.field_name]) > diff.new
@@ -377,7 +430,8 @@ class ListFieldHandler(CommonFieldHandler):
         if diff.new in (UNSET, None):
             return
 
-        updater.update_by_document(by_doc)
+        # Pipeline could not update embedded documents in arrays
+        updater.with_snapshot(condition).update_combined(by_path, by_doc, False, True)
 
 
 class DictFieldHandler(CommonFieldHandler):
@@ -455,8 +509,12 @@ class ReferenceFieldHandler(CommonFieldHandler):
     schema_skel_keys = {'target_doctype', 'dbref'}
 
     def change_target_doctype(self, updater: DocumentUpdater, diff: Diff):
-        """Collection could not exist in db, so do nothing"""
+        """
+        Values are not changed. Under strict policy check that they
+        point to existing records of a new target collection
+        """
         self._check_diff(updater, diff, False, str)
+        self._check_target_references(updater, diff.new)
 
     def change_dbref(self, updater: DocumentUpdater, diff: Diff):
         """Change reference storing format: ObjectId or DBRef"""
@@ -467,21 +525,50 @@ class ReferenceFieldHandler(CommonFieldHandler):
         else:
             self._dbref_to_objectid(updater)
 
+    @mongo_version(min_version='5.0')
     def _objectid_to_dbref(self, updater: DocumentUpdater):
+        def by_path(ctx: ByPathContext):
+            def expression(value: str):
+                is_object_id = {'$eq': [{'$type': value}, 'objectId']}
+                return {'$cond': [is_object_id, dbref_expr(ctx.collection.name, value), value]}
+
+            ctx.collection.update_many(
+                {**ctx.extra_filter,
+                 **build_path_filter(ctx.update_dotpath, lambda p: {p: {'$type': 'objectId'}})},
+                build_path_update(ctx.update_dotpath, expression)  # >= 5.0
+            )
+
         def by_doc(ctx: ByDocContext):
             doc = ctx.document
             if isinstance(doc.get(updater.field_name), bson.ObjectId):
                 doc[updater.field_name] = bson.DBRef(ctx.collection.name, doc[updater.field_name])
 
-        updater.update_by_document(by_doc)
+        updater.update_combined(by_path, by_doc, False, False)
 
+    @mongo_version(min_version='5.0')
     def _dbref_to_objectid(self, updater: DocumentUpdater):
+        def by_path(ctx: ByPathContext):
+            def expression(value: str):
+                # $and is short-circuit, so $getField is evaluated
+                # only on objects
+                is_dbref = {'$and': [
+                    {'$eq': [{'$type': value}, 'object']},
+                    {'$ne': [{'$type': dbref_field_expr('$id', value)}, 'missing']}
+                ]}
+                return {'$cond': [is_dbref, dbref_field_expr('$id', value), value]}
+
+            ctx.collection.update_many(
+                {**ctx.extra_filter,
+                 **build_path_filter(ctx.update_dotpath, lambda p: {f'{p}.$id': {'$exists': True}})},
+                build_path_update(ctx.update_dotpath, expression)  # >= 5.0
+            )
+
         def by_doc(ctx: ByDocContext):
             doc = ctx.document
             if isinstance(doc.get(updater.field_name), bson.DBRef):
                 doc[updater.field_name] = doc[updater.field_name].id
 
-        updater.update_by_document(by_doc)
+        updater.update_combined(by_path, by_doc, False, False)
 
     @classmethod
     def build_schema(
@@ -508,24 +595,66 @@ class CachedReferenceFieldHandler(CommonFieldHandler):
     schema_skel_keys = {'target_doctype', 'fields'}
 
     def change_target_doctype(self, updater: DocumentUpdater, diff: Diff):
-        """Collection could not exist in db, so do nothing"""
+        """
+        Cached values are not changed. Under strict policy check that
+        they point to existing records of a new target collection
+        """
         self._check_diff(updater, diff, False, str)
+        self._check_target_references(updater, diff.new, '_id')
 
     def change_fields(self, updater: DocumentUpdater, diff: Diff):
+        """
+        Remove values of fields which are not cached anymore and fill
+        in values of newly cached fields from referenced documents.
+        Referenced documents are fetched by one query per batch
+        """
+        def lookup(contexts: List[ByDocContext]):
+            ids = [ctx.document[updater.field_name]['_id'] for ctx in contexts
+                   if need_fill(ctx.document.get(updater.field_name))]
+            resolver.prefetch(target_collection, ids)
+
+        def need_fill(value) -> bool:
+            return isinstance(value, dict) and '_id' in value \
+                and any(k not in value for k in new_fields)
+
         def by_doc(ctx: ByDocContext):
-            if updater.field_name in ctx.document:
-                if isinstance(ctx.document[updater.field_name], dict):
-                    ctx.document[updater.field_name] = {
-                        k: v for k, v in ctx.document[updater.field_name].items()
-                        if k in keep_fields
-                    }
+            value = ctx.document.get(updater.field_name)
+            if not isinstance(value, dict):
+                return
+
+            value = {k: v for k, v in value.items() if k in keep_fields}
+            if new_fields and need_fill(value):
+                ref_doc = resolver.get(target_collection, value['_id']) or {}
+                value.update((k, ref_doc[k]) for k in new_fields if k not in value and k in ref_doc)
+            ctx.document[updater.field_name] = value
 
         self._check_diff(updater, diff, False, (list, tuple))
 
         if diff.new:
-            keep_fields = set(diff.new)
+            # Cached values are kept under db field names
+            target_doctype = self.left_field_schema.get('target_doctype')
+            if target_doctype == 'self':
+                target_doctype = updater.document_type
+            target_schema = self.left_schema.get(target_doctype, {})
+            db_fields = {f: (target_schema.get(f) or {}).get('db_field') or f for f in diff.new}
+
+            keep_fields = set(db_fields.values())
             if not updater.is_embedded:
                 keep_fields.add('_id')
+
+            # Referenced collection could not exist in db schema
+            target_collection = None
+            if target_doctype in self.left_schema:
+                target_collection = self.left_schema[target_doctype].parameters.get('collection')
+            old_fields = set(diff.old) if diff.old not in (UNSET, None) else set()
+            new_fields = []
+            if target_collection:
+                new_fields = [db_fields[f] for f in diff.new if f not in old_fields]
+
+            updater = updater.with_snapshot()
+            if new_fields:
+                resolver = ReferenceResolver(self.db, projection={k: True for k in new_fields})
+                updater = updater.with_lookup(lookup)
             updater.update_by_document(by_doc)
 
     @classmethod
@@ -27,15 +27,26 @@ __all__ = [
 
 import re
 import uuid
+from collections import defaultdict
+from typing import Callable, List, Tuple, Optional
 
 import bson
 from dateutil.parser import parse as dateutil_parse
 
+import mongoengine_migrate.flags as flags
 from mongoengine_migrate.exceptions import MigrationError, InconsistencyError
 from mongoengine_migrate.mongo import (
-    check_empty_result
+    check_empty_result,
+    mongo_version,
+    build_path_filter,
+    build_path_update,
+    dbref_expr,
+    dbref_field_expr
 )
+from mongoengine_migrate.references import ReferenceResolver
+from mongoengine_migrate.schema import Schema
 from mongoengine_migrate.updater import ByPathContext, ByDocContext, DocumentUpdater
+from mongoengine_migrate.utils import document_type_to_class_name
 
 
 def nothing(*args, **kwargs):
@@ -58,7 +69,7 @@ def drop_field(updater: DocumentUpdater):
             array_filters=ctx.build_array_filters()
         )
 
-    updater.update_by_path(by_path)
+    updater.with_snapshot().update_by_path(by_path)
 
 
 def item_to_list(updater: DocumentUpdater, remove_cls_key=False):
@@ -124,7 +135,12 @@ def remove_cls_key(updater: DocumentUpdater):
     updater.update_by_path(by_path)
 
 
+@mongo_version(min_version='5.0')
 def to_object_id(updater: DocumentUpdater):
+    def branches(ctx: ByPathContext, value: str):
+        cases = __reference_cases(value)
+        return [cases['string'], cases['dynamic_ref'], cases['dbref'], cases['manual_ref']]
+
     def by_doc(ctx: ByDocContext):
         doc = ctx.document
         if updater.field_name not in doc or doc[updater.field_name] is None:
@@ -139,7 +155,7 @@ def to_object_id(updater: DocumentUpdater):
                 pass
 
         if isinstance(f, bson.ObjectId):
-            return
+            doc[updater.field_name] = f
         elif is_dict and isinstance(f.get('_ref'), bson.DBRef):  # Already dynamic ref
             doc[updater.field_name] = f['_ref'].id
         elif isinstance(f, bson.DBRef):
@@ -152,13 +168,26 @@ def to_object_id(updater: DocumentUpdater):
                                      f"(should be DBRef, ObjectId, manual ref, dynamic ref, "
                                      f"ObjectId string) in record {doc}")
 
-    # TODO: precheck if field actually contains value other than ObjectId
-    updater.update_by_document(by_doc)
+    __convert_reference(updater, lambda p: {p: {'$type': ['string', 'object']}}, branches, by_doc)
 
 
+@mongo_version(min_version='5.0')
 def to_manual_ref(updater: DocumentUpdater):
     """Convert references (ObjectId, DBRef, dynamic ref) to manual ref
     """
+    def source_filter(path: str):
+        return {'$or': [
+            {path: {'$type': ['string', 'objectId']}},
+            {f'{path}.$id': {'$exists': True}},
+            {f'{path}._ref': {'$exists': True}}
+        ]}
+
+    def branches(ctx: ByPathContext, value: str):
+        cases = __reference_cases(value)
+        return [(cond, {'_id': id_value}) for cond, id_value in (
+            cases['string'], cases['object_id'], cases['dynamic_ref'], cases['dbref']
+        )]
+
     def by_doc(ctx: ByDocContext):
         doc = ctx.document
         if updater.field_name not in doc or doc[updater.field_name] is None:
@@ -185,13 +214,28 @@ def to_manual_ref(updater: DocumentUpdater):
                                      f"(should be DBRef, ObjectId, manual ref, dynamic ref, "
                                      f"ObjectId string) in record {doc}")
 
-    # TODO: precheck if field actually contains value other than manual ref
-    updater.update_by_document(by_doc)
+    __convert_reference(updater, source_filter, branches, by_doc)
 
 
+@mongo_version(min_version='5.0')
 def to_dbref(updater: DocumentUpdater):
     """Convert references (ObjectId, manual ref, dynamic ref) to dbref
     """
+    def source_filter(path: str):
+        return {'$or': [
+            {path: {'$type': ['string', 'objectId']}},
+            {f'{path}._id': {'$exists': True}},
+            {f'{path}._ref': {'$exists': True}}
+        ]}
+
+    def branches(ctx: ByPathContext, value: str):
+        cases = __reference_cases(value)
+        res = [(cond, dbref_expr(ctx.collection.name, id_value)) for cond, id_value in (
+            cases['string'], cases['object_id'], cases['manual_ref']
+        )]
+        res.append((cases['dynamic_ref'][0], f'{value}._ref'))
+        return res
+
     def by_doc(ctx: ByDocContext):
         doc = ctx.document
         if updater.field_name not in doc or doc[updater.field_name] is None:
@@ -219,46 +263,63 @@ def to_dbref(updater: DocumentUpdater):
                                      f"(should be DBRef, ObjectId, manual ref, dynamic ref, "
                                      f"ObjectId string) in record {doc}")
 
-    # TODO: precheck if field actually contains value other than DBRef
-    updater.update_by_document(by_doc)
+    __convert_reference(updater, source_filter, branches, by_doc)
 
 
 def to_dynamic_ref(updater: DocumentUpdater):
-    """Convert references (ObjectId, DBRef, manual ref) to dynamic ref
+    """Convert references (ObjectId, DBRef, manual ref) to dynamic ref.
+    Class names of referenced documents are fetched by one query per
+    batch of documents
     """
-    def by_doc(ctx: ByDocContext):
-        doc = ctx.document
-        if updater.field_name not in doc or doc[updater.field_name] is None:
-            return
-
-        f = doc[updater.field_name]
-        is_dict = isinstance(f, dict)
+    def get_dbref(ctx: ByDocContext, f) -> Optional[bson.DBRef]:
         collection_name = ctx.collection.name if ctx.collection else None
-
         if isinstance(f, str):  # ObjectId as string
             try:
                 f = bson.ObjectId(f)
             except bson.errors.BSONError:
                 pass
 
-        # We cannot get dynamic ref from other types of refs because
-        # of lack of '_cls' value. Mongoengine fields which use this
-        # converter can keep DBRef. So return DBRef instead
-        if is_dict and isinstance(f.get('_ref'), bson.DBRef):  # Already dynamic ref
+        if isinstance(f, bson.DBRef):
+            return f
+        elif isinstance(f, dict) and isinstance(f.get('_id'), bson.ObjectId):  # manual ref
+            return bson.DBRef(collection_name, f['_id'])
+        elif isinstance(f, bson.ObjectId):
+            return bson.DBRef(collection_name, f)
+        return None
+
+    def lookup(contexts: List[ByDocContext]):
+        ids = defaultdict(list)
+        for ctx in contexts:
+            dbref = get_dbref(ctx, ctx.document.get(updater.field_name))
+            if dbref is not None:
+                ids[dbref.collection].append(dbref.id)
+        resolver.prefetch_many(ids)
+
+    def by_doc(ctx: ByDocContext):
+        doc = ctx.document
+        if updater.field_name not in doc or doc[updater.field_name] is None:
             return
-        elif isinstance(f, bson.DBRef):
+
+        f = doc[updater.field_name]
+        if isinstance(f, dict) and isinstance(f.get('_ref'), bson.DBRef):  # Already dynamic ref
             return
-        elif is_dict and isinstance(f.get('_id'), bson.ObjectId):  # manual ref
-            doc[updater.field_name] = bson.DBRef(collection_name, f['_id'])
-        elif isinstance(f, bson.ObjectId):
-            doc[updater.field_name] = bson.DBRef(collection_name, f)
-        elif updater.migration_policy.name == 'strict':  # Other data type
-            raise InconsistencyError(f"Field {updater.field_name} has wrong value {f!r} "
-                                     f"(should be DBRef, ObjectId, manual ref, dynamic ref) "
-                                     f"in record {doc}")
 
-    # TODO: precheck if field actually contains value other than dynamic ref or DBRef
-    updater.update_by_document(by_doc)
+        dbref = get_dbref(ctx, f)
+        if dbref is None:
+            if updater.migration_policy.name == 'strict':  # Other data type
+                raise InconsistencyError(f"Field {updater.field_name} has wrong value {f!r} "
+                                         f"(should be DBRef, ObjectId, manual ref, dynamic ref) "
+                                         f"in record {doc}")
+            return
+
+        # Class of a document which does not exist is unknown.
+        # Mongoengine fields which use this converter can keep DBRef.
+        # So keep DBRef instead
+        cls_name = __get_class_name(updater.db_schema, resolver, dbref)
+        doc[updater.field_name] = {'_cls': cls_name, '_ref': dbref} if cls_name else dbref
+
+    resolver = ReferenceResolver(updater.db, projection={'_cls': True})
+    updater.with_lookup(lookup).update_by_document(by_doc)
 
 
 def to_string(updater: DocumentUpdater):
@@ -445,3 +506,121 @@ def __mongo_convert(updater: DocumentUpdater, target_type: str):
                                              f'{field_name}: {doc[field_name]} to type {t}') from e
 
     updater.update_by_document(by_doc)
+
+
+#: ObjectId string representation
+__OBJECT_ID_REGEX = r'^[0-9a-fA-F]{24}$'
+
+
+def __reference_cases(value: str) -> dict:
+    """
+    Return conditions which recognize reference forms of a value and
+    expressions of referenced ObjectId for each of them
+    :param value: value expression, such as "$field"
+    :return: dict {form: (condition_expression, id_expression)}
+    """
+    is_object = {'$eq': [{'$type': value}, 'object']}
+    dynamic_ref = f'{value}._ref'
+    # $and is short-circuit, so $getField is evaluated only on objects
+    return {
+        'object_id': ({'$eq': [{'$type': value}, 'objectId']}, value),
+        'string': (
+            {'$and': [{'$eq': [{'$type': value}, 'string']},
+                      {'$regexMatch': {'input': value, 'regex': __OBJECT_ID_REGEX}}]},
+            {'$toObjectId': value}
+        ),
+        'dynamic_ref': (
+            {'$and': [is_object,
+                      {'$eq': [{'$type': dynamic_ref}, 'object']},
+                      {'$ne': [{'$type': dbref_field_expr('$id', dynamic_ref)}, 'missing']}]},
+            dbref_field_expr('$id', dynamic_ref)
+        ),
+        'dbref': (
+            {'$and': [is_object, {'$ne': [{'$type': dbref_field_expr('$id', value)}, 'missing']}]},
+            dbref_field_expr('$id', value)
+        ),
+        'manual_ref': (
+            {'$and': [is_object, {'$eq': [{'$type': f'{value}._id'}, 'objectId']}]},
+            f'{value}._id'
+        ),
+    }
+
+
+def __get_class_name(db_schema: Schema,
+                     resolver: ReferenceResolver,
+                     dbref: bson.DBRef) -> Optional[str]:
+    """
+    Return class name of a referenced document. It is taken from
+    `_cls` key of document, or from schema if collection keeps
+    documents of one class
+    :param db_schema: db schema
+    :param resolver: resolver which fetches `_cls` of documents
+    :param dbref: reference
+    :return: class name or None if referenced document not found or
+     its class is ambiguous
+    """
+    ref_doc = resolver.get(dbref.collection, dbref.id)
+    if ref_doc is None:
+        return None
+    if ref_doc.get('_cls'):
+        return ref_doc['_cls']
+
+    document_types = [
+        document_type for document_type, document_schema in db_schema.items()
+        if document_schema.parameters.get('collection') == dbref.collection
+        and flags.DOCUMENT_NAME_SEPARATOR not in document_type
+    ]
+    if len(document_types) == 1:
+        return document_type_to_class_name(document_types[0])
+
+    return None
+
+
+def __invalid_reference_filter(path: str) -> dict:
+    """Filter of values which are not references in any form"""
+    return {'$or': [
+        {path: {'$exists': True, '$not': {'$type': ['null', 'objectId', 'string', 'object']}}},
+        {path: {'$regex': r'^(?![0-9a-fA-F]{24}$)'}},  # Matches only strings
+        {
+            path: {'$type': 'object'},
+            f'{path}._id': {'$not': {'$type': 'objectId'}},
+            f'{path}.$id': {'$exists': False},
+            f'{path}._ref.$id': {'$exists': False}
+        }
+    ]}
+
+
+def __convert_reference(updater: DocumentUpdater,
+                        source_filter: Callable[[str], dict],
+                        branches: Callable[[ByPathContext, str], List[Tuple[dict, object]]],
+                        by_doc: Callable):
+    """
+    Convert reference field to another reference form by update
+    pipeline with `$switch`. Only records which contain values in
+    other forms are updated. Arrays of embedded documents are
+    rewritten by `$map`
+    :param updater: DocumentUpdater object
+    :param source_filter: callable which accepts field dotpath and
+     returns filter of values which should be converted
+    :param branches: callable which accepts context and value
+     expression and returns list of `$switch` branches
+     [(case, then), ...]. Value is left as is if nothing matched
+    :param by_doc: by_doc callback used on MongoDB older than 5.0
+    """
+    def by_path(ctx: ByPathContext):
+        if updater.migration_policy.name == 'strict':
+            fltr = build_path_filter(ctx.update_dotpath, __invalid_reference_filter)
+            check_empty_result(ctx.collection, ctx.filter_dotpath, {**ctx.extra_filter, **fltr})
+
+        def expression(value: str):
+            return {'$switch': {
+                'branches': [{'case': case, 'then': then} for case, then in branches(ctx, value)],
+                'default': value
+            }}
+
+        ctx.collection.update_many(
+            {**ctx.extra_filter, **build_path_filter(ctx.update_dotpath, source_filter)},
+            build_path_update(ctx.update_dotpath, expression)  # >= 5.0
+        )
+
+    updater.update_combined(by_path, by_doc, False, False)
@@ -3,18 +3,22 @@ __all__ = [
     'type_key_registry',
     'add_type_key',
     'add_field_handler',
-    'CONVERTION_MATRIX'
+    'get_registry_item',
+    'CONVERTION_MATRIX',
+    'get_type_converter',
+    'invalidate_caches'
 ]
 
 import decimal
 import inspect
 from datetime import datetime, date
 from functools import partial
-from typing import Dict, Type, Optional, NamedTuple
+from typing import Dict, Type, Optional, NamedTuple, Callable, Tuple
 
 import bson
 from mongoengine import fields
 
+from mongoengine_migrate.utils import get_closest_parent
 from . import converters
 
 
@@ -148,6 +152,22 @@ class TypeKeyRegistryItem(NamedTuple):
 #: there is used handler associated with this field or CommonFieldHander
 type_key_registry: Dict[str, TypeKeyRegistryItem] = {}
 
+# Caches of field classes resolution in registry and convertion matrix
+# {field_cls: registry_item_or_None}
+_registry_items_cache: Dict[Type[fields.BaseField], Optional[TypeKeyRegistryItem]] = {}
+# {(from_field_cls, to_field_cls): converter_or_None}
+_type_converters_cache: Dict[Tuple[Type[fields.BaseField], Type[fields.BaseField]],
+                             Optional[Callable]] = {}
+
+
+def invalidate_caches():
+    """
+    Clear cached resolution of field classes. Called on registry
+    changes. Must be called after CONVERTION_MATRIX is modified
+    """
+    _registry_items_cache.clear()
+    _type_converters_cache.clear()
+
 
 def add_type_key(field_cls: Type[fields.BaseField]):
     """
@@ -160,6 +180,7 @@ def add_type_key(field_cls: Type[fields.BaseField]):
 
     type_key_registry[field_cls.__name__] = TypeKeyRegistryItem(field_cls=field_cls,
                                                                 field_handler_cls=None)
+    invalidate_caches()
 
 
 def add_field_handler(field_cls: Type[fields.BaseField], handler_cls: Type['CommonFieldHandler']):
@@ -183,6 +204,26 @@ def add_field_handler(field_cls: Type[fields.BaseField], handler_cls: Type['Comm
                 field_cls=registry_item.field_cls,
                 field_handler_cls=handler_cls
             )
+    invalidate_caches()
+
+
+def get_registry_item(field_cls: Type[fields.BaseField]) -> Optional[TypeKeyRegistryItem]:
+    """
+    Return type_key registry item of a given mongoengine field class.
+    If the class is not in registry then its closest parent is used.
+    Result is cached until registry is changed
+    :param field_cls: mongoengine field class
+    :return: registry item or None if not found
+    """
+    try:
+        return _registry_items_cache[field_cls]
+    except KeyError:
+        pass
+
+    items = {x.field_cls: x for x in type_key_registry.values()}
+    item = items.get(field_cls) or items.get(get_closest_parent(field_cls, items.keys()))
+    _registry_items_cache[field_cls] = item
+    return item
 
 
 # Fill out the type key registry with all mongoengine fields
@@ -304,6 +345,8 @@ def get_geojson_converters(from_type):
 #:
 #: Format: {field_type1: {field_type2: converter_function, ...}, ...}
 #:
+#: Lookups are cached, call `invalidate_caches` after modifying it
+#:
 CONVERTION_MATRIX = {
     fields.ObjectIdField: OBJECTID_CONVERTERS.copy(),
     fields.StringField: {
@@ -477,3 +520,37 @@ for klass, converters_mapping in CONVERTION_MATRIX.items():
 
     # Force set convertion between class and its parent/child class
     CONVERTION_MATRIX[klass][klass] = converters.nothing
+
+
+def get_type_converter(from_field_cls: Type[fields.BaseField],
+                       to_field_cls: Type[fields.BaseField]) -> Optional[Callable]:
+    """
+    Return converter function from convertion matrix for convertion
+    between given field classes. If a class is not in matrix then its
+    closest parent is used. Result is cached
+    :param from_field_cls: mongoengine field class which was used
+     before
+    :param to_field_cls: mongoengine field class which will be used
+     further
+    :return: converter function or None if not found
+    """
+    key = (from_field_cls, to_field_cls)
+    try:
+        return _type_converters_cache[key]
+    except KeyError:
+        pass
+
+    converter = _find_type_converter(from_field_cls, to_field_cls)
+    _type_converters_cache[key] = converter
+    return converter
+
+
+def _find_type_converter(from_field_cls: Type[fields.BaseField],
+                         to_field_cls: Type[fields.BaseField]) -> Optional[Callable]:
+    type_converters = CONVERTION_MATRIX.get(from_field_cls) or \
+        CONVERTION_MATRIX.get(get_closest_parent(from_field_cls, CONVERTION_MATRIX.keys()))
+    if type_converters is None:
+        return None
+
+    return type_converters.get(to_field_cls) or \
+        type_converters.get(get_closest_parent(to_field_cls, type_converters))
@@ -1,6 +1,7 @@
 """This module contains flags setting on starting, via command line
 for example
 """
+from contextvars import ContextVar
 from typing import Optional
 from pymongo.database import Database
 
@@ -22,6 +23,18 @@ mongo_version: Optional[str] = None
 database2: Optional[Database] = None
 
 
+#: Value of `database2` for the current context, overrides the value
+#: above. Set when several databases are migrated concurrently in
+#: separate threads, so every thread has its own database
+database2_context: ContextVar[Optional[Database]] = ContextVar('database2', default=None)
+
+
+def get_database2() -> Optional[Database]:
+    """Return `database2` which is in effect in the current context"""
+    db = database2_context.get()
+    return database2 if db is None else db
+
+
 #: If this prefix contains in collection name then this document
 #: is considered as embedded
 EMBEDDED_DOCUMENT_NAME_PREFIX = '~'
@@ -35,3 +48,75 @@ DOCUMENT_NAME_SEPARATOR = '->'
 #: Pay attention: max BSON size is 16Mb
 #: https://docs.mongodb.com/manual/reference/limits/#bson-documents
 BULK_BUFFER_LENGTH = 10000
+
+
+#: Optimistic concurrency mode. Documents which are rewritten in
+#: python loop are written only if their changed fields still have
+#: the values were read before. Documents which were concurrently
+#: modified by somebody else are reread and processed again
+optimistic_concurrency: bool = False
+
+
+#: How many times documents concurrently modified during an update
+#: will be reread and processed again in optimistic concurrency mode
+CONCURRENT_UPDATE_RETRIES = 5
+
+
+#: Save original values of fields which are going to be lost during
+#: migration (dropped fields, truncated strings, etc.) to a side
+#: collection. Downgrade restores them instead of writing defaults
+snapshot: bool = False
+
+
+#: Look over actions of all pending migrations before upgrade and
+#: skip or collapse data passes which are redundant. E.g. passes of
+#: a field created and dropped later
+optimize: bool = False
+
+
+#: Run strict policy checks of all pending actions in one pass before
+#: upgrade, so all inconsistencies are reported before any write
+prevalidate: bool = False
+
+
+#: Drop secondary indexes of a collection before rewriting of its
+#: documents one by one, and build them again after the action
+defer_indexes: bool = False
+
+
+#: Run migrations under an exclusive lease in migration collection.
+#: Other processes which run migrations on the same database wait
+#: until the lease holder finishes
+lease: bool = False
+
+
+#: Seconds after which lease is considered as free if its holder did
+#: not prolong it
+LEASE_TTL = 60
+
+
+#: Seconds between lease checks while waiting for it
+LEASE_POLL_INTERVAL = 1
+
+
+#: Seconds between index build progress reports
+INDEX_BUILD_PROGRESS_INTERVAL = 5
+
+
+#: Maximum number of collections which indexes are built in parallel.
+#: MongoDB 4.4+ limits concurrent index builds to 3 by default
+INDEX_BUILD_WORKERS = 3
+
+
+#: How many records are sampled from collection on inspecting of its
+#: schema by `inspectdb`
+INSPECT_SAMPLE_SIZE = 1000
+
+
+#: How many documents are read before documents referenced by them are
+#: fetched by one query per collection
+LOOKUP_BATCH_SIZE = 1000
+
+
+#: How many referenced documents are kept in cache of lookups
+LOOKUP_CACHE_SIZE = 10000
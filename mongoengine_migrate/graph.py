@@ -4,12 +4,15 @@ __all__ = [
     'MigrationsGraph'
 ]
 
-from typing import Dict, List
+from copy import copy
+from typing import Dict, List, Optional, Iterator, Iterable, Set
 
 from mongoengine_migrate.exceptions import MigrationGraphError
 from mongoengine_migrate.utils import Slotinit
 from enum import Enum
 
+_missing = object()
+
 
 class MigrationPolicy(Enum):
     """Policy which determines how much the migration engine will
@@ -44,15 +47,35 @@ class Migration(Slotinit):
     * dependencies -- name list of migrations which this migration is
       dependent by
     * applied -- is migration was applied or not. Taken from database
+    * hash -- migration module source hash
+    * replaces -- name list of migrations which this squashed
+      migration replaces
+    * actions -- action objects which are used instead of ones from
+      migration module if set
     """
-    __slots__ = ('name', 'dependencies', 'applied', 'module')
-    defaults = {'applied': False}
+    __slots__ = ('name', 'dependencies', 'applied', 'module', 'hash', 'replaces', 'actions')
+    defaults = {'applied': False, 'hash': None, 'replaces': (), 'actions': None}
 
     def get_actions(self):
         # FIXME: type checking, attribute checking
         # FIXME: tests
+        if self.actions is not None:
+            return self.actions
         return self.module.actions
 
+    def copy(self) -> 'Migration':
+        """
+        Return unapplied copy of migration with its own action objects.
+        Action objects keep a state during run, so every database
+        which is migrated concurrently needs its own copies
+        """
+        return Migration(name=self.name,
+                         dependencies=list(self.dependencies),
+                         module=self.module,
+                         hash=self.hash,
+                         replaces=self.replaces,
+                         actions=[copy(a) for a in self.get_actions()])
+
     @property
     def policy(self) -> MigrationPolicy:
         attr = getattr(self.module, 'policy', MigrationPolicy.strict.name)
@@ -69,25 +92,106 @@ class MigrationsGraph:
 
         self._migrations: Dict[str, Migration] = {}  # {migration_name: migration_obj}
 
+        # Migrations which depend on a name, including names which
+        # have not been added yet
+        self._dependents: Dict[str, List[Migration]] = {}  # {dependency_name: [migration_obj...]}
+
+        self._numbers: Dict[str, int] = {}  # {migration_name: number in adding order}
+
+        # Caches, they are reset on every graph modification
+        self._initial = _missing
+        self._last = _missing
+        self._order: Optional[List[Migration]] = None
+        self._reversed_order: Optional[List[Migration]] = None
+        self._positions: Optional[Dict[str, int]] = None
+
     @property
     def initial(self):
         """Return initial migration object"""
-        for name, parents in self._parents.items():
-            if not parents:
-                return self._migrations[name]
+        if self._initial is _missing:
+            self._initial = next(
+                (self._migrations[name] for name, parents in self._parents.items() if not parents),
+                None
+            )
+        return self._initial
 
     @property
     def last(self):
         """Return last children migration object"""
-        for name, children in self._children.items():
-            if not children:
-                return self._migrations[name]
+        if self._last is _missing:
+            self._last = next(
+                (self._migrations[name] for name, children in self._children.items()
+                 if not children),
+                None
+            )
+        return self._last
 
     @property
     def migrations(self):
         """Migration objects dict"""
         return self._migrations
 
+    @property
+    def order(self) -> List[Migration]:
+        """
+        Migration objects in order as they should be applied starting
+        from the initial migration. Computed once and cached until
+        graph is modified
+        :raises MigrationGraphError: if graph has a closed cycle
+        """
+        if self._order is None:
+            initial = self.initial
+            self._order = [] if initial is None \
+                else list(self._traverse(initial, self._parents, self._children))
+        return self._order
+
+    @property
+    def reversed_order(self) -> List[Migration]:
+        """
+        Migration objects in order as they should be reverted starting
+        from the last migration. Computed once and cached until
+        graph is modified
+        :raises MigrationGraphError: if graph has a closed cycle
+        """
+        if self._reversed_order is None:
+            last = self.last
+            self._reversed_order = [] if last is None \
+                else list(self._traverse(last, self._children, self._parents))
+        return self._reversed_order
+
+    def position(self, migration_name: str) -> int:
+        """
+        Return position of a migration in applying order (see `order`)
+        :param migration_name: migration name
+        :raises MigrationGraphError: if migration is not reachable from
+         the initial migration
+        :return: zero-based position
+        """
+        if self._positions is None:
+            self._positions = {m.name: num for num, m in enumerate(self.order)}
+
+        try:
+            return self._positions[migration_name]
+        except KeyError as e:
+            raise MigrationGraphError(f'Migration {migration_name} not found in graph') from e
+
+    def descendants(self, migration_name: str) -> Set[str]:
+        """
+        Return names of migrations which depend on a given migration
+        directly or through other migrations
+        :param migration_name: migration name
+        :return: set of names including the given one
+        """
+        res = {migration_name}
+        stack = [migration_name]
+        while stack:
+            for child in self._children[stack.pop()]:
+                if child.name not in res:
+                    res.add(child.name)
+                    stack.append(child.name)
+
+        return res
+
     def add(self, migration: Migration):
         """
         Add migration to the graph. If object with that name exists
@@ -95,20 +199,94 @@ class MigrationsGraph:
         :param migration: Migration object
         :return:
         """
-        self._parents[migration.name] = []
-        self._children[migration.name] = []
+        self._reset_caches()
+        if migration.name in self._migrations:
+            self._unlink(self._migrations[migration.name])
+
+        self._numbers.setdefault(migration.name, len(self._numbers))
+
+        # Keep the order of partners as they were added to graph
+        parents = [self._migrations[name]
+                   for name in set(migration.dependencies)
+                   if name in self._migrations and name != migration.name]
+        self._parents[migration.name] = sorted(parents, key=lambda x: self._numbers[x.name])
+        self._children[migration.name] = [partner
+                                          for partner in self._dependents.get(migration.name, [])
+                                          if partner.name != migration.name]
+
+        for partner in self._parents[migration.name]:
+            self._children[partner.name].append(migration)
+        for partner in self._children[migration.name]:
+            self._parents[partner.name].append(migration)
+        for name in set(migration.dependencies):
+            self._dependents.setdefault(name, []).append(migration)
+
+        self._migrations[migration.name] = migration
+
+    def remove(self, migration_name: str):
+        """
+        Remove migration from the graph. Migrations which depend on it
+        remain in graph
+        :param migration_name: migration name
+        :return:
+        """
+        self._reset_caches()
+        migration = self._migrations.pop(migration_name)
+        self._unlink(migration)
+        del self._parents[migration_name]
+        del self._children[migration_name]
 
-        for partner in self._migrations.values():
-            if partner.name == migration.name:
+    def resolve_replacements(self):
+        """
+        Leave either squashed migrations or migrations they replace in
+        graph depending on which of them were applied.
+
+        If all replaced migrations have the same applied state or the
+        squashed migration itself was applied, then the replaced ones
+        are removed and the squashed migration takes their place and
+        their applied state. If replaced migrations were applied
+        partially, the squashed migration is removed and the rest of
+        replaced migrations will be applied one by one.
+
+        Dependencies on removed migrations are redirected to
+        migrations which took their place
+        :return:
+        """
+        for squashed in [m for m in self._migrations.values() if m.replaces]:
+            replaced = [self._migrations[name]
+                        for name in squashed.replaces
+                        if name in self._migrations]
+            states = {m.applied for m in replaced}
+            if squashed.applied or states == {True}:
+                squashed.applied = True
+            elif states == {True, False}:
+                self._redirect_dependencies([squashed.name], [m.name for m in replaced])
                 continue
-            if partner.name in migration.dependencies:
-                self._parents[migration.name].append(partner)
-                self._children[partner.name].append(migration)
-            if migration.name in partner.dependencies:
-                self._children[migration.name].append(partner)
-                self._parents[partner.name].append(migration)
 
-        self._migrations[migration.name] = migration
+            self._redirect_dependencies(squashed.replaces, [squashed.name])
+
+    def _redirect_dependencies(self, from_names: Iterable[str], to_names: List[str]):
+        """
+        Remove migrations from graph and make migrations which depend
+        on them to depend on another migrations
+        :param from_names: names of migrations to remove
+        :param to_names: names of migrations to depend on instead
+        """
+        from_names = set(from_names)
+        dependents = {m.name: m for name in from_names for m in self._dependents.get(name, [])}
+        for name in from_names:
+            if name in self._migrations:
+                self.remove(name)
+
+        for migration in dependents.values():
+            if migration.name not in self._migrations:
+                continue
+            self.remove(migration.name)
+            dependencies = [d for d in migration.dependencies if d not in from_names]
+            migration.dependencies = dependencies + [n for n in to_names
+                                                     if n not in dependencies
+                                                     and n != migration.name]
+            self.add(migration)
 
     def clear(self):  # TODO: tests
         """
@@ -118,6 +296,28 @@ class MigrationsGraph:
         self._parents = {}
         self._children = {}
         self._migrations = {}
+        self._dependents = {}
+        self._numbers = {}
+        self._reset_caches()
+
+    def _unlink(self, migration: Migration):
+        """Remove links between a migration and its partners"""
+        def remove(lst):
+            lst[:] = [x for x in lst if x is not migration]
+
+        for partner in self._parents[migration.name]:
+            remove(self._children[partner.name])
+        for partner in self._children[migration.name]:
+            remove(self._parents[partner.name])
+        for name in set(migration.dependencies):
+            remove(self._dependents[name])
+
+    def _reset_caches(self):
+        self._initial = _missing
+        self._last = _missing
+        self._order = None
+        self._reversed_order = None
+        self._positions = None
 
     def verify(self):
         """
@@ -155,10 +355,12 @@ class MigrationsGraph:
         if not initials or not last_children:
             raise MigrationGraphError(f'No initial or last children found')
 
-    def walk_down(self, from_node: Migration, unapplied_only=True, _node_counters=None):
+    @staticmethod
+    def _traverse(from_node: Migration,
+                  parents: Dict[str, List[Migration]],
+                  children: Dict[str, List[Migration]]) -> Iterator[Migration]:
         """
-        Walks down over migrations graph. Iterates in order as migrations
-        should be applied.
+        Traverse over migrations graph starting from a given node.
 
         We're used modified DFS (depth-first search) algorithm to traverse
         the graph. Migrations are built into directed graph (digraph)
@@ -180,82 +382,92 @@ class MigrationsGraph:
         If counter > 0 after that then don't touch this node and
         break traversing on this depth and go up. If counter == 0 then
         continue traversing.
+
+        DFS is made with explicit stack instead of recursion, so long
+        migration histories don't hit the recursion limit. Walking
+        backwards is the same with parents and children swapped
+        :param from_node: node to start from
+        :param parents: parents of each node
+        :param children: children of each node
+        :raises MigrationGraphError: if graph has a closed cycle
+        :return: Migration objects generator
+        """
+        node_counters = {}
+        stack = [iter((from_node, ))]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                continue
+
+            node_counters.setdefault(node.name, len(parents[node.name]) or 1)
+            node_counters[node.name] -= 1
+
+            if node_counters[node.name] > 0:
+                # Stop on this depth if not all parents has been viewed
+                continue
+
+            if node_counters[node.name] < 0:
+                # A node was already returned and we're reached it again
+                # This means there is a closed cycle
+                raise MigrationGraphError(f'Found closed cycle in migration graph, '
+                                          f'{node.name!r} is repeated twice')
+
+            yield node
+            stack.append(iter(children[node.name]))
+
+    def walk_down(self, from_node: Migration, unapplied_only=True):
+        """
+        Walks down over migrations graph. Iterates in order as migrations
+        should be applied. Walking from the initial migration uses
+        cached order (see `order`)
         :param from_node: current node in graph
         :param unapplied_only: if True then return only unapplied migrations
          or return all migrations otherwise
-        :param _node_counters:
         :raises MigrationGraphError: if graph has a closed cycle
         :return: Migration objects generator
         """
         # FIXME: may yield nodes not related to target migration if branchy graph
         # FIXME: if migration was applied after its dependencies unapplied then it is an error
         # FIXME: should have stable migrations order
-        if _node_counters is None:
-            _node_counters = {}
         if from_node is None:
-            return ()
-        _node_counters.setdefault(from_node.name, len(self._parents[from_node.name]) or 1)
-        _node_counters[from_node.name] -= 1
-
-        if _node_counters[from_node.name] > 0:
-            # Stop on this depth if not all parents has been viewed
             return
+        if from_node is self.initial:
+            nodes = self.order
+        else:
+            nodes = self._traverse(from_node, self._parents, self._children)
 
-        if _node_counters[from_node.name] < 0:
-            # A node was already returned and we're reached it again
-            # This means there is a closed cycle
-            raise MigrationGraphError(f'Found closed cycle in migration graph, '
-                                      f'{from_node.name!r} is repeated twice')
+        for node in nodes:
+            if not (node.applied and unapplied_only):
+                yield node
 
-        if not (from_node.applied and unapplied_only):
-            yield from_node
-
-        for child in self._children[from_node.name]:
-            yield from self.walk_down(child, unapplied_only, _node_counters)
-
-    def walk_up(self, from_node: Migration, applied_only=True, _node_counters=None):
+    def walk_up(self, from_node: Migration, applied_only=True):
         """
         Walks up over migrations graph. Iterates in order as migrations
         should be reverted.
 
-        We're using modified DFS (depth-first search) algorithm which in
-        reversed order (see `walk_down`). Instead of looking at node
-        parents count we're consider children count in order to return
-        all dependent nodes before dependency.
-
-        Because of the migrations graph may have many orphan child nodes
-        they all should be passed as parameter
+        Instead of looking at node parents count we're consider
+        children count in order to return all dependent nodes before
+        dependency (see `_traverse`). Walking from the last migration
+        uses cached order
         :param from_node:  last children node we are starting for
         :param applied_only: if True then return only applied migrations,
          return all migrations otherwise
-        :param _node_counters:
         :raises MigrationGraphError: if graph has a closed cycle
         :return: Migration objects generator
         """
         # FIXME: may yield nodes not related to reverting if branchy graph
         # FIXME: if migration was unapplied before its dependencies applied then it is an error
-        if _node_counters is None:
-            _node_counters = {}
         if from_node is None:
-            return ()
-        _node_counters.setdefault(from_node.name, len(self._children[from_node.name]) or 1)
-        _node_counters[from_node.name] -= 1
-
-        if _node_counters[from_node.name] > 0:
-            # Stop in this depth if not all children has been viewed
             return
-
-        if _node_counters[from_node.name] < 0:
-            # A node was already returned and we're reached it again
-            # This means there is a closed cycle
-            raise MigrationGraphError(f'Found closed cycle in migration graph, '
-                                      f'{from_node.name!r} is repeated twice')
-
-        if from_node.applied or not applied_only:
-            yield from_node
-
-        for child in self._parents[from_node.name]:
-            yield from self.walk_up(child, applied_only, _node_counters)
+        if from_node is self.last:
+            nodes = self.reversed_order
+        else:
+            nodes = self._traverse(from_node, self._children, self._parents)
+
+        for node in nodes:
+            if node.applied or not applied_only:
+                yield node
 
     def __iter__(self):
         return iter(self.walk_down(self.initial, unapplied_only=False))
@@ -0,0 +1,101 @@
+__all__ = [
+    'FINGERPRINT_ID',
+    'migrations_fingerprint',
+    'SchemaGuard'
+]
+
+import hashlib
+import json
+import logging
+from typing import Iterable, Optional
+
+from pymongo.database import Database
+
+from mongoengine_migrate.exceptions import SchemaError
+
+log = logging.getLogger('mongoengine-migrate')
+
+#: Id of document in migration collection which keeps fingerprints
+#: of db schema and applied migrations
+FINGERPRINT_ID = 'fingerprint'
+
+
+def migrations_fingerprint(records: Iterable[dict]) -> str:
+    """
+    Return hash of applied migrations list
+    :param records: applied migrations records in applying order as
+     they are written to db: [{'name': str, 'hash': str, ...}, ...]
+    :return: hex digest
+    """
+    data = json.dumps([[r['name'], r.get('hash')] for r in records], separators=(',', ':'))
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+class SchemaGuard:
+    """Check on application startup that db was migrated to the
+    current mongoengine models state.
+
+    Fingerprints of db schema and applied migrations list are kept in
+    a small document in migration collection, so the check costs one
+    read by `_id` and needs neither migration modules nor the schema
+    document itself. Result is cached, so the check could be called
+    on every request
+    """
+    def __init__(self,
+                 db: Database,
+                 collection_name: str = 'mongoengine_migrate',
+                 expected_migrations_fingerprint: Optional[str] = None):
+        """
+        :param db: application database
+        :param collection_name: migration collection name
+        :param expected_migrations_fingerprint: Optional. If set then
+         fingerprint of applied migrations list is checked as well
+        """
+        self.db = db
+        self.collection_name = collection_name
+        self.expected_migrations_fingerprint = expected_migrations_fingerprint
+        self._models_fingerprint: Optional[str] = None
+        self._result: Optional[bool] = None
+
+    @property
+    def models_fingerprint(self) -> str:
+        """Fingerprint of schema collected from mongoengine models"""
+        if self._models_fingerprint is None:
+            from mongoengine_migrate.loader import collect_models_schema
+            self._models_fingerprint = collect_models_schema().fingerprint()
+        return self._models_fingerprint
+
+    def read_fingerprints(self) -> dict:
+        """
+        Read fingerprints stored in db
+        :return: dict {'schema': str, 'migrations': str}. Values are
+         None if they were not written yet
+        """
+        res = self.db[self.collection_name].find_one({'_id': FINGERPRINT_ID}) or {}
+        return {'schema': res.get('schema'), 'migrations': res.get('migrations')}
+
+    def is_up_to_date(self, refresh: bool = False) -> bool:
+        """
+        Return True if db schema is the same as mongoengine models
+        schema. Result is cached
+        :param refresh: if True then ignore cached result
+        """
+        if self._result is None or refresh:
+            stored = self.read_fingerprints()
+            self._result = stored['schema'] == self.models_fingerprint
+            if self.expected_migrations_fingerprint is not None:
+                self._result = self._result \
+                    and stored['migrations'] == self.expected_migrations_fingerprint
+            log.debug('> Db schema fingerprint check result: %s', self._result)
+
+        return self._result
+
+    def check(self, refresh: bool = False):
+        """
+        Raise error if db is not up to date with mongoengine models
+        :param refresh: if True then ignore cached result
+        :raises SchemaError:
+        """
+        if not self.is_up_to_date(refresh):
+            raise SchemaError('Database schema does not match mongoengine models, '
+                              'migrations should be applied')
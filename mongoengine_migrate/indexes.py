@@ -0,0 +1,213 @@
+__all__ = [
+    'IndexBuilds',
+    'DeferredIndexes',
+    'get_current_index_builds',
+    'get_current_deferred_indexes'
+]
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Tuple, List, Iterable, Set
+
+import bson
+from pymongo import IndexModel
+from pymongo.collection import Collection
+
+log = logging.getLogger('mongoengine-migrate')
+
+#: Index builds which are currently collecting. Set during a
+#: migration run. Context variable, since several databases could be
+#: migrated concurrently in separate threads
+_current_index_builds: ContextVar[Optional['IndexBuilds']] = \
+    ContextVar('current_index_builds', default=None)
+
+#: Indexes which are dropped during the current action run. Context
+#: variable for the same reason as above
+_current_deferred_indexes: ContextVar[Optional['DeferredIndexes']] = \
+    ContextVar('current_deferred_indexes', default=None)
+
+#: Index information keys which are passed to `createIndexes` as
+#: index options. Others (version, namespace, etc.) are set by server
+INDEX_OPTIONS = (
+    'unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds', 'collation',
+    'hidden', 'storageEngine', 'weights', 'default_language', 'language_override',
+    'textIndexVersion', '2dsphereIndexVersion', 'bits', 'min', 'max', 'bucketSize',
+    'wildcardProjection'
+)
+
+
+def get_current_index_builds() -> Optional['IndexBuilds']:
+    """Return index builds which are currently collecting or None"""
+    return _current_index_builds.get()
+
+
+def get_current_deferred_indexes() -> Optional['DeferredIndexes']:
+    """Return deferred indexes of the current action run or None"""
+    return _current_deferred_indexes.get()
+
+
+class IndexBuilds:
+    """Index builds deferred until all actions of a migration are run.
+
+    Building an index requires a full collection scan. Indexes of one
+    collection are created by one command, so the collection is
+    scanned once for all of them. Indexes of different collections
+    are built in parallel
+    """
+    def __init__(self):
+        self._items: Dict[str, Tuple[Collection, List[IndexModel]]] = {}
+
+    @contextmanager
+    def collecting(self):
+        """Context manager which makes this object current, so
+        actions will add index builds to it instead of building
+        them immediately
+        """
+        token = _current_index_builds.set(self)
+        try:
+            yield self
+        finally:
+            _current_index_builds.reset(token)
+
+    def add(self, collection: Collection, index: IndexModel):
+        """
+        Add index to be built
+        :param collection: pymongo collection object
+        :param index: index to build
+        """
+        self._items.setdefault(collection.full_name, (collection, []))[1].append(index)
+
+    def run(self) -> List[Tuple[Collection, List[IndexModel]]]:
+        """
+        Build all collected indexes
+        :return: built indexes of every collection
+        """
+        from mongoengine_migrate.mongo import create_indexes
+
+        builds, self._items = list(self._items.values()), {}
+        create_indexes(builds)
+        return builds
+
+    def __len__(self):
+        return sum(len(models) for _, models in self._items.values())
+
+
+class DeferredIndexes:
+    """Secondary indexes which are dropped before rewriting of every
+    document in a collection and built again after the action run.
+
+    Every document write updates every index of collection, so on
+    large conversions it is faster to build indexes once afterwards.
+    Unique indexes are kept since they guard data consistency, as
+    well as indexes which are used by the rewriting query itself.
+    Indexes are built again also if action has failed.
+
+    Specs of dropped indexes are saved to a journal collection before
+    they are dropped and removed from it after they are built again.
+    So if the process was killed, indexes left in journal are built by
+    `build_pending` on the next run
+    """
+    #: Journal record type
+    record_type = 'deferred_index'
+
+    def __init__(self, journal: Optional[Collection] = None):
+        """
+        :param journal: Optional. Collection where specs of dropped
+         indexes are saved until they are built again
+        """
+        self.journal = journal
+        self._builds = IndexBuilds()
+        self._collections: Set[str] = set()
+
+    @contextmanager
+    def deferring(self):
+        """Context manager which makes this object current, so
+        updaters will drop indexes before documents rewriting. Dropped
+        indexes are built on exit. If building fails on action error,
+        the action error is reraised
+        """
+        token = _current_deferred_indexes.set(self)
+        try:
+            yield self
+        except BaseException:
+            _current_deferred_indexes.reset(token)
+            try:
+                self.build()
+            except Exception as e:
+                # Indexes are left in journal to be built on next run
+                log.error('Unable to build deferred indexes again: %s', e)
+            raise
+
+        _current_deferred_indexes.reset(token)
+        self.build()
+
+    def build(self):
+        """Build again indexes dropped so far and remove them from
+        journal
+        """
+        if not self._builds:
+            return
+
+        log.info('Building again %d deferred indexes...', len(self._builds))
+        builds = self._builds.run()
+        if self.journal is not None:
+            for collection, models in builds:
+                names = [model.document['name'] for model in models]
+                self.journal.delete_many({'type': self.record_type,
+                                          'collection': collection.name,
+                                          'name': {'$in': names}})
+
+    @classmethod
+    def build_pending(cls, journal: Collection):
+        """
+        Build indexes which were left in journal by interrupted run
+        :param journal: collection where specs of dropped indexes are
+         saved. Indexes are built in the same database
+        """
+        deferred = cls(journal)
+        for record in journal.find({'type': cls.record_type}):
+            spec = bson.BSON(record['spec']).decode()
+            collection = journal.database[record['collection']]
+            keys = [tuple(key) for key in spec['keys']]
+            deferred._builds.add(collection, IndexModel(keys, name=record['name'],
+                                                        **spec['options']))
+
+        deferred.build()
+
+    def defer(self, collection: Collection, filter_fields: Iterable[str]):
+        """
+        Drop secondary indexes of collection if they were not dropped
+        yet. Indexes are remembered to be built on exit
+        :param collection: pymongo collection object
+        :param filter_fields: fields of query which is used to find
+         documents to rewrite. Indexes which start with them are kept
+        """
+        if collection.full_name in self._collections:
+            return
+        self._collections.add(collection.full_name)
+
+        filter_fields = set(filter_fields)
+        for name, info in collection.index_information().items():
+            keys = list(info['key'])
+            keep = name == '_id_' \
+                or info.get('unique') \
+                or keys[0][0] in filter_fields \
+                or any(direction == 'text' for _, direction in keys)  # Keys are internal
+            if keep:
+                continue
+
+            options = {k: v for k, v in info.items() if k in INDEX_OPTIONS}
+            if self.journal is not None:
+                # Options could contain keys with `$` (partial filter),
+                # so the spec is stored encoded
+                spec = bson.BSON.encode({'keys': keys, 'options': options})
+                self.journal.update_one(
+                    {'type': self.record_type, 'collection': collection.name, 'name': name},
+                    {'$set': {'spec': bson.Binary(spec)}},
+                    upsert=True
+                )
+            log.info('Dropping index %s on %s until the action is finished',
+                     name, collection.full_name)
+            self._builds.add(collection, IndexModel(keys, name=name, **options))
+            collection.drop_index(name)
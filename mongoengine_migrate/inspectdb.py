@@ -0,0 +1,246 @@
+__all__ = [
+    'FIELD_TYPES',
+    'sample_fields',
+    'infer_document_schema',
+    'infer_schema'
+]
+
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Iterable, Optional
+
+from mongoengine import fields
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+import mongoengine_migrate.flags as flags
+from mongoengine_migrate.fields.registry import type_key_registry
+from mongoengine_migrate.schema import Schema
+
+log = logging.getLogger('mongoengine-migrate')
+
+#: Mongoengine fields which values of BSON types are kept in
+FIELD_TYPES = {
+    'string': fields.StringField,
+    'objectId': fields.ObjectIdField,
+    'bool': fields.BooleanField,
+    'date': fields.DateTimeField,
+    'int': fields.IntField,
+    'long': fields.LongField,
+    'double': fields.FloatField,
+    'decimal': fields.Decimal128Field,
+    'binData': fields.BinaryField,
+    'array': fields.ListField,
+    'object': fields.DictField,
+}
+
+#: Number types which could be kept in one field. Field of the last
+#: type in a list can keep values of all previous types
+NUMBER_TYPES = ('int', 'long', 'double')
+
+#: Objects with more keys are considered as dicts, not as embedded
+#: documents
+MAX_EMBEDDED_DOCUMENT_KEYS = 100
+
+#: How deep embedded documents are inspected. Deeper ones are
+#: considered as dicts
+MAX_EMBEDDED_DOCUMENT_DEPTH = 3
+
+#: Keys which are not inspected
+SKIP_KEYS = ('_id', )
+
+#: Path to embedded documents: [(key, is_list), ...]
+Path = List[Tuple[str, bool]]
+
+
+def sample_fields(collection: Collection, path: Path, sample_size: int) -> Dict[str, dict]:
+    """
+    Get keys of randomly sampled records (or embedded documents in
+    them) and types of their values. `$sample` does not perform full
+    collection scan if sample size is less than 5% of collection
+    :param collection: pymongo collection object
+    :param path: path to embedded documents. Empty list means records
+    :param sample_size: how many records to sample
+    :return: dict {key: {'types': {type: count}, 'item_types': set}}
+     where `item_types` are types of array items if value is array
+    """
+    pipeline = [{'$sample': {'size': sample_size}}]
+    for key, is_list in path:
+        pipeline.append({'$project': {'_v': f'${key}'}})
+        if is_list:
+            pipeline.append({'$unwind': '$_v'})
+        pipeline.extend([
+            {'$match': {'_v': {'$type': 'object'}}},
+            {'$replaceRoot': {'newRoot': '$_v'}}
+        ])
+
+    item_types = {'$map': {'input': '$kv.v', 'in': {'$type': '$$this'}}}
+    pipeline.extend([
+        {'$project': {'kv': {'$objectToArray': '$$ROOT'}}},
+        {'$unwind': '$kv'},
+        {'$group': {
+            '_id': {'k': '$kv.k', 't': {'$type': '$kv.v'}},
+            'count': {'$sum': 1},
+            'item_types': {'$addToSet': {
+                '$cond': [{'$isArray': '$kv.v'}, {'$setUnion': [item_types]}, []]
+            }}
+        }}
+    ])
+
+    res = {}
+    for item in collection.aggregate(pipeline, allowDiskUse=True):
+        key, bson_type = item['_id']['k'], item['_id']['t']
+        info = res.setdefault(key, {'types': {}, 'item_types': set()})
+        info['types'][bson_type] = info['types'].get(bson_type, 0) + item['count']
+        for types in item['item_types']:
+            info['item_types'].update(types)
+
+    return res
+
+
+def infer_document_schema(schema: Schema,
+                          collection: Collection,
+                          document_type: str,
+                          path: Path,
+                          sample_size: int) -> Schema.Document:
+    """
+    Infer document schema from sampled records. Schemas of embedded
+    documents found in records are added to a given schema
+    :param schema: schema to add embedded documents to
+    :param collection: pymongo collection object
+    :param document_type: document type to infer
+    :param path: path to embedded documents. Empty list means records
+    :param sample_size: how many records to sample
+    :return: document schema
+    """
+    document_schema = Schema.Document()
+    sampled = sample_fields(collection, path, sample_size)
+    # `_cls` is written by mongoengine when inheritance is allowed
+    if '_cls' in sampled:
+        document_schema.parameters['inherit'] = True
+
+    for key, info in sorted(sampled.items()):
+        if key == '_cls' or not path and key in SKIP_KEYS:
+            continue
+
+        types = {t for t in info['types'] if t not in ('null', 'undefined')}
+        null = 'null' in info['types']
+        field_cls = _get_field_cls(types)
+        target_doctype = None
+
+        embedded_field_cls = None
+        if len(path) < MAX_EMBEDDED_DOCUMENT_DEPTH:
+            if field_cls is fields.DictField:
+                embedded_field_cls = fields.EmbeddedDocumentField
+            elif field_cls is fields.ListField and info['item_types'] == {'object'}:
+                embedded_field_cls = fields.EmbeddedDocumentListField
+
+        if embedded_field_cls is not None:
+            embedded_document_type = _embedded_document_type(document_type, key)
+            embedded_schema = Schema()
+            is_list = embedded_field_cls is fields.EmbeddedDocumentListField
+            embedded = infer_document_schema(embedded_schema, collection, embedded_document_type,
+                                             path + [(key, is_list)], sample_size)
+            if _is_embedded_document(embedded):
+                field_cls = embedded_field_cls
+                target_doctype = embedded_document_type
+                schema.update(embedded_schema)
+                schema[target_doctype] = embedded
+
+        document_schema[_field_name(key)] = _build_field_schema(field_cls, key, null,
+                                                                target_doctype)
+
+    return document_schema
+
+
+def infer_schema(db: Database,
+                 collection_names: Optional[Iterable[str]] = None,
+                 sample_size: int = flags.INSPECT_SAMPLE_SIZE,
+                 concurrency: int = 4,
+                 exclude: Iterable[str] = ()) -> Schema:
+    """
+    Infer schema of database by sampling records of its collections.
+    Collections are inspected concurrently
+    :param db: pymongo database object
+    :param collection_names: Optional. Collections to inspect. By
+     default all collections except system ones are inspected
+    :param sample_size: how many records to sample on every level
+     of nesting
+    :param concurrency: how many collections are inspected at once
+    :param exclude: collections which are not inspected by default
+    :return: inferred schema
+    """
+    if collection_names is None:
+        collection_names = [
+            name for name in db.list_collection_names(filter={'type': 'collection'})
+            if not name.startswith('system.') and name not in exclude
+        ]
+
+    def inspect_collection(collection_name: str) -> Schema:
+        log.info('Inspecting collection %s...', collection_name)
+        collection_schema = Schema()
+        document_type = _class_name(collection_name)
+        document_schema = infer_document_schema(collection_schema,
+                                                db[collection_name],
+                                                document_type,
+                                                [],
+                                                sample_size)
+        document_schema.parameters['collection'] = collection_name
+        collection_schema[document_type] = document_schema
+        return collection_schema
+
+    schema = Schema()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for collection_schema in executor.map(inspect_collection, sorted(collection_names)):
+            for document_type, document_schema in collection_schema.items():
+                if document_type in schema:
+                    log.warning('Document type %s is inferred several times, the last one is '
+                                'used', document_type)
+                schema[document_type] = document_schema
+
+    return schema
+
+
+def _get_field_cls(types: set):
+    if len(types) == 1:
+        return FIELD_TYPES.get(next(iter(types)), fields.DynamicField)
+
+    numbers = [t for t in NUMBER_TYPES if t in types]
+    if numbers and len(numbers) == len(types):
+        return FIELD_TYPES[numbers[-1]]
+
+    return fields.DynamicField
+
+
+def _is_embedded_document(document_schema: Schema.Document) -> bool:
+    # Such keys are used by DBRef and by dicts with arbitrary keys
+    return 0 < len(document_schema) <= MAX_EMBEDDED_DOCUMENT_KEYS \
+        and not any(key.startswith('$') or '.' in key for key in document_schema)
+
+
+def _build_field_schema(field_cls, key: str, null: bool, target_doctype: Optional[str]) -> dict:
+    handler_cls = type_key_registry[field_cls.__name__].field_handler_cls
+    if target_doctype is None:
+        return handler_cls.build_schema(field_cls(db_field=key, null=null))
+
+    # Embedded document class does not exist, so the field object
+    # could not return it
+    field_obj = field_cls(target_doctype, db_field=key, null=null)
+    schema = super(handler_cls, handler_cls).build_schema(field_obj)
+    schema['target_doctype'] = target_doctype
+    return schema
+
+
+def _field_name(key: str) -> str:
+    name = re.sub(r'\W', '_', key)
+    return f'_{name}' if name[:1].isdigit() else name
+
+
+def _class_name(name: str) -> str:
+    return ''.join(part[:1].upper() + part[1:] for part in re.split(r'[\W_]+', name) if part)
+
+
+def _embedded_document_type(document_type: str, key: str) -> str:
+    document_type = document_type.lstrip(flags.EMBEDDED_DOCUMENT_NAME_PREFIX)
+    return f'{flags.EMBEDDED_DOCUMENT_NAME_PREFIX}{document_type}{_class_name(key)}'
@@ -0,0 +1,184 @@
+__all__ = [
+    'BSON_TYPES',
+    'document_json_schema',
+    'collection_json_schemas'
+]
+
+import re
+from typing import Dict, List, Optional, Sequence
+
+from mongoengine import fields
+
+import mongoengine_migrate.flags as flags
+from mongoengine_migrate.fields.registry import type_key_registry
+from mongoengine_migrate.schema import Schema
+from mongoengine_migrate.utils import get_closest_parent, document_type_to_class_name
+
+
+def _reference_types(field_schema: dict) -> Optional[List[str]]:
+    # Reference without dbref keeps primary key of any type
+    return ['object'] if field_schema.get('dbref') else None
+
+
+#: BSON types which values of mongoengine fields are stored as. Item
+#: could be a callable which accepts field schema and returns types.
+#: None means any type.
+#:
+#: Types are searched here either as exact class equality or the
+#: nearest parent. If type is not exists here, then any type is valid
+BSON_TYPES = {
+    fields.BaseField: None,  # + DynamicField, EnumField
+    fields.ObjectIdField: ['objectId'],
+    fields.StringField: ['string'],  # + URLField, EmailField, ComplexDateTimeField
+    fields.IntField: ['int', 'long'],  # + LongField
+    fields.FloatField: ['double'],
+    fields.DecimalField: lambda s: ['string'] if s.get('force_string') else ['double'],
+    fields.Decimal128Field: ['decimal'],
+    fields.BooleanField: ['bool'],
+    fields.DateTimeField: ['date'],  # + DateField
+    fields.EmbeddedDocumentField: ['object'],
+    fields.GenericEmbeddedDocumentField: ['object'],
+    fields.ListField: ['array'],  # + EmbeddedDocumentListField, SortedListField
+    fields.DictField: ['object'],  # + MapField
+    fields.ReferenceField: _reference_types,
+    fields.LazyReferenceField: _reference_types,
+    fields.CachedReferenceField: ['object'],
+    fields.GenericReferenceField: ['object'],  # + GenericLazyReferenceField
+    fields.BinaryField: ['binData'],
+    fields.FileField: ['objectId'],  # + ImageField
+    fields.UUIDField: lambda s: ['binData'] if s.get('binary') else ['string'],
+    fields.SequenceField: ['int', 'long'],
+    fields.GeoPointField: ['array'],
+    fields.GeoJsonBaseField: ['object'],  # All geo fields except GeoPointField
+}
+
+#: BSON types which could be restricted by `minimum` and `maximum`
+NUMBER_BSON_TYPES = ('int', 'long', 'double', 'decimal')
+
+
+def document_json_schema(schema: Schema, document_type: str) -> dict:
+    """
+    Translate document schema to MongoDB `$jsonSchema`.
+
+    Only restrictions which mongoengine applies on saving are
+    translated: value types, `null`, `required`, `choices`, lengths,
+    regex and value ranges. Fields which are not in schema are
+    allowed, since they could be written by derived documents
+    :param schema: db schema
+    :param document_type: document type to translate
+    :return: $jsonSchema dict
+    """
+    return _document_json_schema(schema, document_type, (document_type, ))
+
+
+def collection_json_schemas(schema: Schema) -> Dict[str, dict]:
+    """
+    Translate db schema to `$jsonSchema` of every collection. If
+    several documents share the same collection (inheritance) then
+    a record must match to one of them distinguished by `_cls`
+    :param schema: db schema
+    :return: dict {collection_name: $jsonSchema}
+    """
+    document_types = {}  # {collection_name: [document_type, ...]}
+    for document_type, document_schema in schema.items():
+        collection_name = document_schema.parameters.get('collection')
+        if document_type.startswith(flags.EMBEDDED_DOCUMENT_NAME_PREFIX) or not collection_name:
+            continue
+        document_types.setdefault(collection_name, []).append(document_type)
+
+    res = {}
+    for collection_name, types in sorted(document_types.items()):
+        if len(types) == 1:
+            res[collection_name] = document_json_schema(schema, types[0])
+            continue
+
+        variants = []
+        for document_type in sorted(types):
+            variant = document_json_schema(schema, document_type)
+            if schema[document_type].parameters.get('inherit'):
+                cls_name = document_type_to_class_name(document_type)
+                variant['properties']['_cls'] = {'enum': [cls_name]}
+            variants.append(variant)
+        res[collection_name] = {'anyOf': variants}
+
+    return res
+
+
+def _document_json_schema(schema: Schema, document_type: str, stack: Sequence[str]) -> dict:
+    properties = {}
+    required = []
+    for field_name, field_schema in sorted(schema[document_type].items()):
+        db_field = field_schema.get('db_field') or field_name
+        properties[db_field] = _field_json_schema(schema, field_schema, stack)
+        if field_schema.get('required'):
+            required.append(db_field)
+
+    res = {'bsonType': 'object', 'properties': properties}
+    if required:
+        res['required'] = required
+
+    return res
+
+
+def _field_json_schema(schema: Schema, field_schema: dict, stack: Sequence[str]) -> dict:
+    res = {}
+    bson_types = _get_bson_types(field_schema)
+    if bson_types is not None:
+        if field_schema.get('null'):
+            bson_types = bson_types + ['null']
+        res['bsonType'] = bson_types[0] if len(bson_types) == 1 else bson_types
+    bson_types = bson_types or []
+
+    choices = field_schema.get('choices')
+    if choices:
+        values = [c[0] if isinstance(c, (list, tuple)) else c for c in choices]
+        if 'array' in bson_types:
+            res['items'] = {'enum': values}
+        else:
+            res['enum'] = values + [None] if field_schema.get('null') else values
+
+    if 'string' in bson_types:
+        if field_schema.get('max_length') is not None:
+            res['maxLength'] = field_schema['max_length']
+        if field_schema.get('min_length') is not None:
+            res['minLength'] = field_schema['min_length']
+        regex = field_schema.get('regex')
+        if regex is not None:
+            res['pattern'] = regex.pattern if isinstance(regex, re.Pattern) else regex
+
+    if any(t in NUMBER_BSON_TYPES for t in bson_types):
+        if field_schema.get('max_value') is not None:
+            res['maximum'] = field_schema['max_value']
+        if field_schema.get('min_value') is not None:
+            res['minimum'] = field_schema['min_value']
+
+    # Embedded documents could refer to themselves
+    target_doctype = field_schema.get('target_doctype')
+    is_embedded = target_doctype \
+        and target_doctype.startswith(flags.EMBEDDED_DOCUMENT_NAME_PREFIX) \
+        and target_doctype in schema \
+        and target_doctype not in stack
+    if is_embedded:
+        embedded = _document_json_schema(schema, target_doctype, (*stack, target_doctype))
+        del embedded['bsonType']
+        if 'array' in bson_types:
+            res['items'] = embedded
+        else:
+            res.update(embedded)
+
+    return res
+
+
+def _get_bson_types(field_schema: dict) -> Optional[List[str]]:
+    registry_item = type_key_registry.get(field_schema.get('type_key'))
+    if registry_item is None:
+        return None
+
+    field_cls = registry_item.field_cls
+    if field_cls not in BSON_TYPES:
+        field_cls = get_closest_parent(field_cls, BSON_TYPES.keys())
+
+    bson_types = BSON_TYPES.get(field_cls)
+    if callable(bson_types):
+        return bson_types(field_schema)
+    return list(bson_types) if bson_types is not None else None
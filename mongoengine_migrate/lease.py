@@ -0,0 +1,166 @@
+__all__ = [
+    'MigrationLease'
+]
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import pymongo.errors
+from pymongo.collection import Collection
+
+from mongoengine_migrate.exceptions import LeaseError
+
+log = logging.getLogger('mongoengine-migrate')
+
+#: Lease document id in migration collection
+LEASE_ID = 'migration_lease'
+
+
+class MigrationLease:
+    """Exclusive lease to run migrations, shared between processes
+    working with the same database.
+
+    Lease is a document in migration collection which contains the
+    holder id and expiration time. Holder prolongs it from a background
+    thread (heartbeat) while it is working. Lease which was not
+    prolonged in time (e.g. holder process was killed) is considered
+    as free, so another process could take it over.
+
+    Other processes wait by polling the lease document, which is just
+    one indexed lookup per interval. Polling is used instead of change
+    streams, because they require a replica set.
+
+    Expiration time is set by holder local clock, so TTL must be much
+    greater than possible clock skew between hosts.
+    """
+    def __init__(self,
+                 collection: Collection,
+                 ttl: float = 60,
+                 poll_interval: float = 1,
+                 wait_timeout: Optional[float] = None):
+        """
+        :param collection: migration collection
+        :param ttl: seconds after which lease is expired if holder
+         did not prolong it. Heartbeat is sent 3 times per TTL
+        :param poll_interval: seconds between lease checks while
+         waiting for it
+        :param wait_timeout: Optional. Seconds to wait for the lease.
+         By default wait forever
+        """
+        self.collection = collection
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+        #: Whether heartbeat has found that lease was taken over by
+        #: somebody else
+        self.lost = False
+
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def try_acquire(self) -> bool:
+        """
+        Try to take the lease once
+        :return: True if lease was taken, False if it is held by
+         somebody else
+        """
+        now = datetime.now(timezone.utc)
+        fltr = {
+            '_id': LEASE_ID,
+            '$or': [{'expires_at': {'$lt': now}}, {'holder': self.holder}]
+        }
+        update = {'$set': {
+            'type': 'lease',
+            'holder': self.holder,
+            'acquired_at': now,
+            'expires_at': now + timedelta(seconds=self.ttl)
+        }}
+        try:
+            # Upsert fails on unique _id if lease is held by others
+            self.collection.update_one(fltr, update, upsert=True)
+        except pymongo.errors.DuplicateKeyError:
+            return False
+
+        return True
+
+    def acquire(self):
+        """
+        Wait for the lease and take it, then start heartbeat
+        :raises LeaseError: if wait timeout is exceeded
+        """
+        started = time.monotonic()
+        waiting = False
+        while not self.try_acquire():
+            if not waiting:
+                lease = self.collection.find_one({'_id': LEASE_ID}) or {}
+                log.info('Migrations are running by %s, waiting for them to finish...',
+                         lease.get('holder'))
+                waiting = True
+
+            if self.wait_timeout is not None \
+                    and time.monotonic() - started + self.poll_interval > self.wait_timeout:
+                raise LeaseError(f'Could not take migration lease in {self.wait_timeout}s')
+            time.sleep(self.poll_interval)
+
+        log.debug('> Migration lease is taken by %s', self.holder)
+        self.lost = False
+        self._stop_heartbeat.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat,
+                                                  name='mongoengine-migrate-lease',
+                                                  daemon=True)
+        self._heartbeat_thread.start()
+
+    def release(self):
+        """Stop heartbeat and free the lease if it is still ours"""
+        if self._heartbeat_thread is not None:
+            self._stop_heartbeat.set()
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+
+        self.collection.delete_one({'_id': LEASE_ID, 'holder': self.holder})
+        log.debug('> Migration lease is released by %s', self.holder)
+
+    def check(self):
+        """
+        Raise error if lease was lost, so it's not safe to continue
+        :raises LeaseError:
+        """
+        if self.lost:
+            raise LeaseError('Migration lease was lost, probably other process has taken it over. '
+                             'Consider to increase lease TTL')
+
+    def prolong(self) -> bool:
+        """
+        Prolong lease expiration time
+        :return: False if lease is not ours anymore
+        """
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        res = self.collection.update_one({'_id': LEASE_ID, 'holder': self.holder},
+                                         {'$set': {'expires_at': expires_at}})
+        return res.matched_count > 0
+
+    def _heartbeat(self):
+        while not self._stop_heartbeat.wait(self.ttl / 3):
+            try:
+                if not self.prolong():
+                    log.error('Migration lease has been lost by %s', self.holder)
+                    self.lost = True
+                    return
+            except pymongo.errors.PyMongoError as e:
+                # Lease is still ours until expiration, try again later
+                log.warning('Could not prolong migration lease: %s', e)
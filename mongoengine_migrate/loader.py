@@ -8,27 +8,35 @@ import functools
 import importlib.util
 import logging
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from copy import deepcopy
 from datetime import timezone, datetime
 from pathlib import Path
 from types import ModuleType
-from typing import Tuple, Iterable, Optional, Dict
+from typing import Tuple, Iterable, Optional, Dict, List, TYPE_CHECKING
 
 import pymongo.database
 import pymongo.errors
 from bson import CodecOptions
-from dictdiffer import patch, swap
-from jinja2 import Environment
-from mongoengine.base import _document_registry
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, DeleteMany, ASCENDING
 
 import mongoengine_migrate.flags as runtime_flags
-from mongoengine_migrate.actions.factory import build_actions_chain
 from mongoengine_migrate.exceptions import MongoengineMigrateError, ActionError, MigrationGraphError
-from mongoengine_migrate.fields.registry import type_key_registry
 from mongoengine_migrate.graph import Migration, MigrationsGraph, MigrationPolicy
-from mongoengine_migrate.query_tracer import DatabaseQueryTracer
+from mongoengine_migrate.guard import FINGERPRINT_ID, migrations_fingerprint
+from mongoengine_migrate.lease import MigrationLease
+from mongoengine_migrate.manifest import MigrationsManifest
 from mongoengine_migrate.schema import Schema
-from mongoengine_migrate.utils import get_closest_parent, get_document_type
+from mongoengine_migrate.snapshot import FieldSnapshot
+
+# Modules which are heavy to import (mongoengine, field handlers,
+# jinja2, etc.) are imported in functions where they are used, so
+# that commands which do not need them start faster
+if TYPE_CHECKING:
+    from mongoengine_migrate.stats import ActionStats
+    from mongoengine_migrate.validation import ValidationBatch
 
 log = logging.getLogger('mongoengine-migrate')
 
@@ -84,6 +92,10 @@ def collect_models_schema() -> Schema:
     Transform all available mongoengine document objects to db schema
     :return:
     """
+    from mongoengine.base import _document_registry
+    from mongoengine_migrate.fields.registry import get_registry_item
+    from mongoengine_migrate.utils import get_document_type
+
     schema = Schema()
     collections: Dict[str, set] = {}  # {collection_name: set(top_level_documents)}
 
@@ -124,8 +136,8 @@ def collect_models_schema() -> Schema:
         if model_cls._dynamic:
             schema[document_type].parameters['dynamic'] = True
 
-        # {field_cls: TypeKeyRegistryItem}
-        field_mapping_registry = {x.field_cls: x for x in type_key_registry.values()}
+        if not document_type.startswith(runtime_flags.EMBEDDED_DOCUMENT_NAME_PREFIX):
+            schema[document_type].indexes.update(_collect_model_indexes(model_cls))
 
         # Collect schema for every field
         for field_name, field_obj in model_cls._fields.items():
@@ -135,38 +147,105 @@ def collect_models_schema() -> Schema:
                 continue
 
             field_cls = field_obj.__class__
-
-            if field_cls in field_mapping_registry:
-                registry_field_cls = field_cls
-            else:
-                registry_field_cls = get_closest_parent(
-                    field_cls,
-                    field_mapping_registry.keys()
-                )
-
-            if registry_field_cls is None:
+            registry_item = get_registry_item(field_cls)
+            if registry_item is None:
                 raise ActionError(f'Could not find {field_cls!r} or one of its base classes '
                                   f'in type_key registry')
 
-            handler_cls = field_mapping_registry[registry_field_cls].field_handler_cls
+            handler_cls = registry_item.field_handler_cls
             schema[document_type][field_name] = handler_cls.build_schema(field_obj)
             # TODO: validate default against all field restrictions such as min_length, regex, etc.
 
         log.debug("> Schema '%s' => %s", document_type, str(schema[document_type]))
 
+    # Derived documents inherit indexes of their parents. Since they
+    # are in the same collection, keep indexes only in the parents
+    for document_type in schema:
+        parts = document_type.split(runtime_flags.DOCUMENT_NAME_SEPARATOR)
+        for depth in range(1, len(parts)):
+            parent = runtime_flags.DOCUMENT_NAME_SEPARATOR.join(parts[:depth])
+            if parent in schema:
+                for name in schema[parent].indexes.keys():
+                    schema[document_type].indexes.pop(name, None)
+
     return schema
 
 
+def _collect_model_indexes(model_cls) -> Dict[str, dict]:
+    """
+    Return indexes declared in mongoengine document meta. Indexes
+    made by `unique` and `unique_with` field parameters are not
+    included since they are a part of field schema
+    :param model_cls: mongoengine document class
+    :return: dict {index_name: index_schema}
+    """
+    indexes = {}
+    for spec in model_cls._meta.get('indexes', []):
+        spec = model_cls._build_index_spec(spec)
+        fields = [[key, direction] for key, direction in spec['fields']]
+        name = spec.get('name') or '_'.join(f'{key}_{direction}' for key, direction in fields)
+        indexes[name] = {
+            'fields': fields,
+            **{k: v for k, v in spec.items() if k not in ('fields', 'cls', 'name')}
+        }
+
+    return indexes
+
+
+def _with_lease(method):
+    """Decorator which runs MongoengineMigrate method under migration
+    lease if lease is enabled
+    """
+    @functools.wraps(method)
+    def wrapper(self: 'MongoengineMigrate', *args, **kwargs):
+        with self.lease():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class MongoengineMigrate:
     default_collection_name: str = 'mongoengine_migrate'
     default_directory: str = './migrations'
     default_models_module = 'models'
 
-    def __init__(self, mongo_uri: str, collection_name: str, migrations_dir: str, **kwargs):
+    def __init__(self,
+                 mongo_uri: str,
+                 collection_name: str,
+                 migrations_dir: str,
+                 client: Optional[MongoClient] = None,
+                 client2: Optional[MongoClient] = None,
+                 database_name: Optional[str] = None,
+                 **kwargs):
+        """
+        :param mongo_uri: MongoDB connect URI
+        :param collection_name: collection where schema and state
+         will be stored
+        :param migrations_dir: directory with migrations
+        :param client: Optional. MongoClient to use instead of making
+         a new one. Clients are shared when several databases are
+         migrated at once
+        :param client2: Optional. MongoClient to use as second client
+        :param database_name: Optional. Database name to migrate. By
+         default the database from URI is used
+        """
         self.mongo_uri = mongo_uri
         self.migrations_collection_name = collection_name
         self.migration_dir = migrations_dir
+        self.database_name = database_name
         self._kwargs = kwargs
+        self._lease: Optional[MigrationLease] = None
+        # What is written to db now, in order to write only changes.
+        # None means not read yet
+        self._db_schema_fingerprints: Optional[Dict[str, str]] = None  # {document_type: hash}
+        self._db_migration_records: Optional[Dict[str, dict]] = None  # {name: record}
+        self._indexes_created = False
+        if client is not None:
+            # Connection is already checked by client owner
+            self.client = client
+            self.client2 = client2 or client
+            return
+
         self.client = MongoClient(mongo_uri)
         # Another MongoClient for additional operations which should
         # be performed in separate connection such as parallel bulk
@@ -176,7 +255,7 @@ class MongoengineMigrate:
         # Initiate immediate connect to MongoDB in order to ensure
         # that it is accessible
         log.debug('Connecting to MongoDB...')
-        self.client.get_database().command('ping')
+        self.client.get_database(database_name).command('ping')
 
         # Trying to figure out server version if not specified
         if runtime_flags.mongo_version is None:
@@ -194,9 +273,10 @@ class MongoengineMigrate:
     @functools.cached_property
     def db(self) -> pymongo.database.Database:
         """Return MongoDB database object"""
-        db = self.client.get_database()
+        db = self.client.get_database(self.database_name)
         if runtime_flags.dry_run:
             log.debug('> Dry run mode requested, use mock database object for main connection')
+            from mongoengine_migrate.query_tracer import DatabaseQueryTracer
             db = DatabaseQueryTracer(db)
 
         return db
@@ -204,9 +284,10 @@ class MongoengineMigrate:
     @functools.cached_property
     def db2(self) -> pymongo.database.Database:
         """Return MongoDB database object for client2"""
-        db = self.client2.get_database()
+        db = self.client2.get_database(self.database_name)
         if runtime_flags.dry_run:
             log.debug('> Dry run mode requested, use mock database object for second connection')
+            from mongoengine_migrate.query_tracer import DatabaseQueryTracer
             db = DatabaseQueryTracer(db)
 
         return db
@@ -214,57 +295,234 @@ class MongoengineMigrate:
     @property
     def migration_collection(self) -> pymongo.collection.Collection:
         """Return collection object where we keep migration data"""
-        return self.client.get_database()[self.migrations_collection_name].with_options(
+        db = self.client.get_database(self.database_name)
+        return db[self.migrations_collection_name].with_options(
             codec_options=CodecOptions(tz_aware=True, tzinfo=timezone.utc)
         )
 
+    @property
+    def snapshot_collection(self) -> pymongo.collection.Collection:
+        """Return collection object where we keep field snapshots"""
+        db = self.client.get_database(self.database_name)
+        return db[f'{self.migrations_collection_name}_snapshot']
+
+    @contextmanager
+    def lease(self):
+        """
+        Context manager which takes migration lease if lease is
+        enabled and holds it until exit. If lease is held by other
+        process then wait for it. Nested calls use already taken lease
+        """
+        if not runtime_flags.lease or runtime_flags.dry_run or self._lease is not None:
+            yield
+            return
+
+        with MigrationLease(self.migration_collection,
+                            ttl=runtime_flags.LEASE_TTL,
+                            poll_interval=runtime_flags.LEASE_POLL_INTERVAL) as lease:
+            self._lease = lease
+            try:
+                yield
+            finally:
+                self._lease = None
+
+    def _check_lease(self):
+        """Raise error if migration lease was lost"""
+        if self._lease is not None:
+            self._lease.check()
+
+    def get_db_migrations(self) -> List[dict]:
+        """
+        Return applied migrations records was written in db in
+        applying order
+        """
+        # Every applied migration is a separate record. Previous
+        # versions kept all of them in one 'migrations' record
+        records, legacy_records = [], []
+        fltr = {'type': {'$in': ['migration', 'migrations']}}
+        for res in self.migration_collection.find(fltr):
+            if res['type'] == 'migrations':
+                legacy_records = res['value']
+            else:
+                records.append({k: res.get(k) for k in ('name', 'ordering_number', 'hash')})
+
+        self._db_migration_records = {r['name']: r for r in records}
+        return sorted(records or legacy_records, key=lambda x: x['ordering_number'])
+
     def get_db_migration_names(self) -> Iterable[str]:
         """
         Return iterable with migration names was written in db in
         applying order
         """
-        fltr = {'type': 'migrations'}
-        for migration in self.migration_collection.find(fltr).sort('ordering_number'):
-            return [m['name'] for m in migration['value']]
-
-        return []
+        return [m['name'] for m in self.get_db_migrations()]
 
     def write_db_migrations_graph(self, graph: MigrationsGraph):
         """
         Write migrations graph to db
         :param graph: migrations graph
         """
-        fltr = {'type': 'migrations'}
         records = []
         num = 0
         for migration in graph.walk_down(graph.initial, False):
             if migration.applied:
                 records.append({
                     'name': migration.name,
-                    'ordering_number': num
+                    'ordering_number': num,
+                    'hash': migration.hash
                 })
                 num += 1
 
-        data = {'type': 'migrations', 'value': records}
+        if self._db_migration_records is None:
+            self.get_db_migrations()
+
+        written = self._db_migration_records
+        requests = [
+            UpdateOne({'type': 'migration', 'name': r['name']}, {'$set': r}, upsert=True)
+            for r in records if written.get(r['name']) != r
+        ]
+        removed = written.keys() - {r['name'] for r in records}
+        if removed:
+            requests.append(DeleteMany({'type': 'migration', 'name': {'$in': list(removed)}}))
+
+        self._ensure_indexes()
+        if requests:
+            self.migration_collection.bulk_write(requests, ordered=True)
+        # Record of previous versions layout is removed only after all
+        # new records are written, so failed write does not lose it
+        self.migration_collection.delete_many({'type': 'migrations'})
+        self._db_migration_records = {r['name']: r for r in records}
+        self._write_db_fingerprint('migrations', migrations_fingerprint(records))
+
+    def write_db_migration_stats(self, migration_name: str, direction: str, actions_stats: list):
+        """
+        Write impact statistics of a migration run to db. Every run
+        is written as a separate record, so runs could be compared
+        :param migration_name: migration name
+        :param direction: 'upgrade' or 'downgrade'
+        :param actions_stats: list of statistics dicts of each action
+        """
+        data = {
+            'type': 'migration_stats',
+            'migration': migration_name,
+            'direction': direction,
+            'created_at': datetime.now(timezone.utc),
+            'elapsed': sum(a['elapsed'] for a in actions_stats),
+            'actions': actions_stats
+        }
+        self.migration_collection.insert_one(data)
+
+    def get_db_schema_snapshot_names(self) -> set:
+        """Return names of migrations which have schema snapshot"""
+        fltr = {'type': 'schema_snapshot'}
+        return {x['migration'] for x in self.migration_collection.find(fltr, {'migration': 1})}
+
+    def load_db_schema_snapshot(self, migration_name: str) -> Optional[Schema]:
+        """
+        Load schema snapshot taken after a given migration was applied
+        :param migration_name: migration name
+        :return: Schema object or None if snapshot was not found
+        """
+        fltr = {'type': 'schema_snapshot', 'migration': migration_name}
+        pointer = self.migration_collection.find_one(fltr)
+        if pointer is None:
+            return None
+
+        blob = self.migration_collection.find_one({'type': 'schema_blob', 'hash': pointer['hash']})
+        if blob is None:
+            return None
+
+        return Schema().load(blob['value'])
+
+    def write_db_schema_snapshot(self, migration_name: str, schema: Schema) -> None:
+        """
+        Write schema snapshot taken after a given migration was
+        applied. Schemas are stored content-addressed, so equal schemas
+        of different migrations are stored once
+        :param migration_name: migration name
+        :param schema: schema after migration
+        """
+        fingerprint = schema.fingerprint()
+        blob_fltr = {'type': 'schema_blob', 'hash': fingerprint}
+        if self.migration_collection.find_one(blob_fltr, {'_id': 1}) is None:
+            self.migration_collection.update_one(blob_fltr,
+                                                 {'$setOnInsert': {'value': schema.dump()}},
+                                                 upsert=True)
+        fltr = {'type': 'schema_snapshot', 'migration': migration_name}
+        data = {'type': 'schema_snapshot', 'migration': migration_name, 'hash': fingerprint}
         self.migration_collection.replace_one(fltr, data, upsert=True)
 
     def load_db_schema(self) -> Schema:
         """Load schema from db"""
-        fltr = {'type': 'schema'}
-        res = self.migration_collection.find_one(fltr)
+        # Every document schema is a separate record. Previous
+        # versions kept the whole schema in one 'schema' record
         schema = Schema()
-        schema.load(res.get('value', {}) if res else {})
+        fingerprints = {}
+        legacy_value = {}
+        fltr = {'type': {'$in': ['schema_document', 'schema']}}
+        for res in self.migration_collection.find(fltr):
+            if res['type'] == 'schema':
+                legacy_value = res.get('value', {})
+            else:
+                schema[res['name']] = Schema.Document().load(res['value'])
+                fingerprints[res['name']] = res['fingerprint']
+
+        self._db_schema_fingerprints = fingerprints
+        if not schema:
+            schema.load(legacy_value)
         return schema
 
     def write_db_schema(self, schema: Schema) -> None:
         """
-        Write schema to db
+        Write schema to db. Only document schemas which were changed
+        since the last load or write are written
         :param schema:
         :return:
         """
-        fltr = {'type': 'schema'}
-        data = {'type': 'schema', 'value': schema.dump()}
-        self.migration_collection.replace_one(fltr, data, upsert=True)
+        if self._db_schema_fingerprints is None:
+            fltr = {'type': 'schema_document'}
+            self._db_schema_fingerprints = {
+                res['name']: res['fingerprint']
+                for res in self.migration_collection.find(fltr, {'name': 1, 'fingerprint': 1})
+            }
+
+        written = self._db_schema_fingerprints
+        fingerprints = schema.document_fingerprints()
+        requests = [
+            UpdateOne({'type': 'schema_document', 'name': name},
+                      {'$set': {'value': schema[name].dump(), 'fingerprint': fingerprint}},
+                      upsert=True)
+            for name, fingerprint in fingerprints.items() if written.get(name) != fingerprint
+        ]
+        removed = written.keys() - fingerprints.keys()
+        if removed:
+            requests.append(DeleteMany({'type': 'schema_document', 'name': {'$in': list(removed)}}))
+
+        self._ensure_indexes()
+        if requests:
+            self.migration_collection.bulk_write(requests, ordered=True)
+        # Record of previous versions layout is removed only after all
+        # new records are written, so failed write does not lose it
+        self.migration_collection.delete_many({'type': 'schema'})
+        self._db_schema_fingerprints = fingerprints
+        self._write_db_fingerprint('schema', schema.fingerprint(fingerprints))
+
+    def _ensure_indexes(self):
+        """Create migration collection indexes if they do not exist"""
+        if not self._indexes_created:
+            self.migration_collection.create_index([('type', ASCENDING), ('name', ASCENDING)])
+            self._indexes_created = True
+
+    def _write_db_fingerprint(self, key: str, fingerprint: str) -> None:
+        """
+        Write fingerprint to document which is read by SchemaGuard
+        :param key: 'schema' or 'migrations'
+        :param fingerprint: fingerprint value
+        """
+        self.migration_collection.update_one(
+            {'_id': FINGERPRINT_ID},
+            {'$set': {'type': 'fingerprint', key: fingerprint}},
+            upsert=True
+        )
 
     def load_migrations(self,
                         directory: Path,
@@ -286,36 +544,64 @@ class MongoengineMigrate:
             if module_file.name.startswith("__"):
                 continue
 
-            log.debug('> Loading migration file %s', module_file)
-            migration_name = module_file.stem
-            spec = importlib.util.spec_from_file_location(
-                f"{namespace}.{migration_name}", str(module_file)
-            )
-            migration_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(migration_module)
+            migration_module = self._load_migration_module(module_file, namespace)
             yield Migration(
-                name=migration_name,
+                name=module_file.stem,
                 module=migration_module,
-                dependencies=migration_module.dependencies
+                dependencies=migration_module.dependencies,
+                replaces=list(getattr(migration_module, 'replaces', []))
             )
 
-    def build_graph(self) -> MigrationsGraph:
-        """Build migrations graph with all migration modules"""
+    def load_manifest(self) -> Dict[str, dict]:
+        """
+        Return manifest of migration modules: their names, dependencies
+        and source hashes. Modules are not executed unless their
+        dependencies could not be parsed
+        :return: dict {migration_name: {'hash': str, 'dependencies': list, 'replaces': list}}
+        """
+        directory = Path(self.migration_dir)
+        if not directory.exists():
+            raise MongoengineMigrateError(f"Directory '{directory}' does not exist")
+
+        namespace = f"{__name__}._migrations"
+        manifest = MigrationsManifest(
+            directory,
+            lambda f: self._load_migration_module(f, namespace).dependencies,
+            lambda f: getattr(self._load_migration_module(f, namespace), 'replaces', [])
+        )
+        return manifest.build()
+
+    @staticmethod
+    def _load_migration_module(module_file: Path, namespace: str) -> ModuleType:
+        """
+        Load migration python module from file
+        :param module_file: module file path
+        :param namespace: namespace name where module will be loaded
+        :return: module object
+        """
+        log.debug('> Loading migration file %s', module_file)
+        spec = importlib.util.spec_from_file_location(
+            f"{namespace}.{module_file.stem}", str(module_file)
+        )
+        migration_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration_module)
+
+        return migration_module
+
+    def build_graph(self, migrations: Optional[Iterable[Migration]] = None) -> MigrationsGraph:
+        """
+        Build migrations graph with all migration modules
+        :param migrations: Optional. Unapplied migration objects to
+         build graph from. If omitted, then they will be loaded
+        """
         graph = MigrationsGraph()
-        for m in self.load_migrations(Path(self.migration_dir)):
+        if migrations is None:
+            migrations = self._load_hashed_migrations()
+        for m in migrations:
             graph.add(m)
 
-        applied = []
-        for migration_name in self.get_db_migration_names():
-            if migration_name not in graph.migrations:
-                raise MigrationGraphError(
-                    f'Migration {migration_name} was applied, but its python module not found. '
-                    f'You can use schema repair to fix this issue'
-                )
-            graph.migrations[migration_name].applied = True
-            applied.append(migration_name)
+        self._mark_applied(graph, check_hashes=True)
 
-        log.debug('> Applied migrations: %s', applied)
         if graph.last:
             log.debug('> Last migration is: %s', graph.last.name)
         else:
@@ -323,6 +609,16 @@ class MongoengineMigrate:
 
         return graph
 
+    def _load_hashed_migrations(self) -> List[Migration]:
+        """Load migration modules and set their source hashes"""
+        manifest = self.load_manifest()
+        migrations = list(self.load_migrations(Path(self.migration_dir)))
+        for m in migrations:
+            m.hash = manifest[m.name]['hash']
+
+        return migrations
+
+    @_with_lease
     def upgrade(self, migration_name: str, graph: Optional[MigrationsGraph] = None):
         """
         Upgrade db to the given migration
@@ -331,6 +627,9 @@ class MongoengineMigrate:
          will be loaded
         :return:
         """
+        from mongoengine_migrate.indexes import IndexBuilds, DeferredIndexes
+        from mongoengine_migrate.stats import ActionStats
+
         if graph is None:
             log.debug('Loading migration files...')
             graph = self.build_graph()
@@ -340,36 +639,179 @@ class MongoengineMigrate:
         if migration_name not in graph.migrations:
             raise MigrationGraphError(f'Migration {migration_name} not found')
 
-        db = self.db
+        apply_migrations = []
         for migration in graph.walk_down(graph.initial, unapplied_only=True):
+            apply_migrations.append(migration)
+            if migration.name == migration_name:
+                break  # We've reached the target migration
+
+        overrides = {}  # {(migration_name, action_number): action_to_run_or_None}
+        if runtime_flags.optimize and not runtime_flags.schema_only:
+            from mongoengine_migrate.actions import ActionsOptimizer
+            log.debug('Optimizing pending actions...')
+            # Schema and applied migrations are written after every
+            # migration, so optimization is made within a migration.
+            # Otherwise an interrupted upgrade could leave a migration
+            # marked as applied with its data passes skipped
+            schema = deepcopy(left_schema)
+            for migration in apply_migrations:
+                actions = [((migration.name, idx), action_object)
+                           for idx, action_object in enumerate(migration.get_actions(), start=1)]
+                overrides.update(ActionsOptimizer(schema).optimize(actions))
+                try:
+                    for _, action_object in actions:
+                        schema.patch(action_object.to_schema_patch(schema))
+                except Exception as e:
+                    # Let the migration process to report the error
+                    log.debug('> Optimizer stopped on %s: %s', migration.name, e)
+                    break
+
+        validation = None
+        if runtime_flags.prevalidate and not runtime_flags.schema_only:
+            log.debug('Checking data of pending actions...')
+            validation = self._prevalidate(left_schema, apply_migrations, overrides)
+
+        # Values left from previous upgrade are cleared only if they
+        # could be there
+        clear_snapshots = not runtime_flags.dry_run \
+            and (runtime_flags.snapshot or self._snapshot_collection_exists())
+
+        if not runtime_flags.dry_run:
+            # Indexes could be left dropped by an interrupted run
+            DeferredIndexes.build_pending(self.migration_collection)
+
+        db = self.db
+        for migration in apply_migrations:
+            self._check_lease()
             log.info('Upgrading %s...', migration.name)
+            actions_stats = []
+            index_builds = IndexBuilds()
             for idx, action_object in enumerate(migration.get_actions(), start=1):
                 log.debug('> [%d] %s', idx, str(action_object))
-                if not action_object.dummy_action and not runtime_flags.schema_only:
-                    action_object.prepare(db, left_schema, migration.policy)
-                    action_object.run_forward()
-                    action_object.cleanup()
+                run_object = overrides.get((migration.name, idx), action_object)
+                if run_object is None:
+                    log.debug('> Data pass was skipped by optimizer')
+                    if clear_snapshots:
+                        # Values left from previous upgrade are not relevant anymore
+                        FieldSnapshot(self.snapshot_collection, migration.name, idx).clear()
+                elif not action_object.dummy_action and not runtime_flags.schema_only:
+                    stats = ActionStats()
+                    run_object.prepare(db, left_schema, migration.policy)
+                    checks = nullcontext() if validation is None \
+                        else validation.apply((migration.name, idx))
+                    deferred_indexes = DeferredIndexes(self.migration_collection).deferring() \
+                        if runtime_flags.defer_indexes and not runtime_flags.dry_run \
+                        else nullcontext()
+                    snapshot = self._record_snapshot(migration.name, idx) \
+                        if clear_snapshots else nullcontext()
+                    with snapshot, stats.collecting(), checks, \
+                            index_builds.collecting(), deferred_indexes:
+                        run_object.run_forward()
+                    run_object.cleanup()
+                    actions_stats.append(self._make_action_stats(idx, run_object, stats))
 
                 try:
-                    left_schema = patch(action_object.to_schema_patch(left_schema), left_schema)
+                    left_schema.patch(action_object.to_schema_patch(left_schema))
                 except (TypeError, ValueError, KeyError) as e:
                     raise ActionError(
                         f"Unable to apply schema patch of {action_object!r}. More likely that the "
                         f"schema is corrupted. You can use schema repair tools to fix this issue"
                     ) from e
 
+            if index_builds:
+                log.info('Building %d indexes...', len(index_builds))
+                index_builds.run()
+
             graph.migrations[migration.name].applied = True
 
             if not runtime_flags.dry_run:
                 log.debug('Writing db schema and migrations graph...')
                 self.write_db_schema(left_schema)
+                self.write_db_schema_snapshot(migration.name, left_schema)
                 self.write_db_migrations_graph(graph)
-
-            if migration.name == migration_name:
-                break   # We've reached the target migration
+                if actions_stats:
+                    self.write_db_migration_stats(migration.name, 'upgrade', actions_stats)
 
         self._verify_schema(left_schema)
 
+    def _prevalidate(self,
+                     left_schema: Schema,
+                     apply_migrations: List[Migration],
+                     overrides: dict) -> 'ValidationBatch':
+        """
+        Evaluate strict policy checks of pending actions in one pass
+        before upgrade.
+
+        Actions are run with mocked writes and their checks are
+        collected. A check is taken only if data it checks was not
+        modified by actions before, so its result before upgrade is
+        the same as it would be in its place. Collecting is stopped on
+        the first action which could modify any data, such as RunPython
+        :param left_schema: db schema before upgrade
+        :param apply_migrations: migrations to be applied
+        :param overrides: actions overridden by optimizer
+        :return: ValidationBatch object with checks already made
+        :raises InconsistencyError: if any check has failed
+        """
+        from mongoengine_migrate.actions import RunPython
+        from mongoengine_migrate.actions.base import BaseFieldAction
+        from mongoengine_migrate.query_tracer import DatabaseQueryTracer
+        from mongoengine_migrate.validation import ValidationBatch
+
+        validation = ValidationBatch()
+        # Use real database even in dry run mode, since checks only read
+        db = DatabaseQueryTracer(self.client.get_database(self.database_name),
+                                 on_modify=validation.mark_written)
+        schema = deepcopy(left_schema)
+
+        def touch(document_type: str, field_name: Optional[str]):
+            if document_type not in schema:
+                return
+            collection_name = schema[document_type].parameters.get('collection')
+            db_field = None
+            if field_name is not None:
+                db_field = schema[document_type].get(field_name, {}).get('db_field', field_name)
+            validation.touch(collection_name, db_field)
+
+        pending = [(m, idx, action_object)
+                   for m in apply_migrations
+                   for idx, action_object in enumerate(m.get_actions(), start=1)]
+        for migration, idx, action_object in pending:
+            run_object = overrides.get((migration.name, idx), action_object)
+            is_run = run_object is not None and not action_object.dummy_action
+            if is_run and (isinstance(run_object, RunPython) or run_object.document_type
+                           .startswith(runtime_flags.EMBEDDED_DOCUMENT_NAME_PREFIX)):
+                # User function could modify anything. Embedded
+                # document could be a part of any collection
+                log.debug('> Stop collecting checks on %s', run_object)
+                break
+
+            field_name = None
+            if is_run and isinstance(run_object, BaseFieldAction):
+                field_name = run_object.field_name
+
+            try:
+                if field_name is not None:
+                    run_object.prepare(db, schema, migration.policy)
+                    with validation.collect((migration.name, idx)):
+                        run_object.run_forward()
+                    run_object.cleanup()
+
+                # Both old and new field names are modified (renaming)
+                if is_run:
+                    touch(run_object.document_type, field_name)
+                schema.patch(action_object.to_schema_patch(schema))
+                if is_run:
+                    touch(run_object.document_type, field_name)
+            except Exception as e:
+                # Let the migration process to report the error
+                log.debug('> Stop collecting checks on %s: %s', action_object, e)
+                break
+
+        validation.run()
+        return validation
+
+    @_with_lease
     def downgrade(self, migration_name: str, graph: Optional[MigrationsGraph] = None):
         """
         Downgrade db to the given migration
@@ -378,6 +820,10 @@ class MongoengineMigrate:
          will be loaded
         :return:
         """
+        from dictdiffer import swap
+        from mongoengine_migrate.indexes import IndexBuilds, DeferredIndexes
+        from mongoengine_migrate.stats import ActionStats
+
         if graph is None:
             log.debug('Loading migration files...')
             graph = self.build_graph()
@@ -387,30 +833,31 @@ class MongoengineMigrate:
         if migration_name not in graph.migrations:
             raise MigrationGraphError(f'Migration {migration_name} not found')
 
-        log.debug('Precalculating schema diffs...')
-        # Collect schema diffs across all migrations
-        migration_diffs = {}  # {migration_name: [action1_diff, ...]}
-        temp_left_schema = Schema()
-        for migration in graph.walk_down(graph.initial, unapplied_only=False):
-            migration_diffs[migration.name] = []
-            for action in migration.get_actions():
-                forward_patch = action.to_schema_patch(temp_left_schema)
-                migration_diffs[migration.name].append(forward_patch)
-
-                try:
-                    temp_left_schema = patch(forward_patch, temp_left_schema)
-                except (TypeError, ValueError, KeyError) as e:
-                    raise ActionError(
-                        f"Unable to apply schema patch of {action!r}. More likely that the "
-                        f"schema is corrupted. You can use schema repair tools to fix this issue"
-                    ) from e
-
-        db = self.db
+        revert_migrations = []
         for migration in graph.walk_up(graph.last, applied_only=True):
             if migration.name == migration_name:
                 break  # We've reached the target migration
+            revert_migrations.append(migration)
+
+        if runtime_flags.prevalidate and revert_migrations:
+            log.warning('Prevalidation is made only on upgrade, checks of downgrade are run '
+                        'in place')
+
+        log.debug('Precalculating schema diffs...')
+        migration_diffs = self._get_schema_diffs(graph, revert_migrations)
 
+        restore_snapshots = not runtime_flags.dry_run and self._snapshot_collection_exists()
+
+        if not runtime_flags.dry_run:
+            # Indexes could be left dropped by an interrupted run
+            DeferredIndexes.build_pending(self.migration_collection)
+
+        db = self.db
+        for migration in revert_migrations:
+            self._check_lease()
             log.info('Downgrading %s...', migration.name)
+            actions_stats = []
+            index_builds = IndexBuilds()
 
             action_diffs = zip(
                 migration.get_actions(),
@@ -421,7 +868,7 @@ class MongoengineMigrate:
                 log.debug('> [%d] %s', idx, str(action_object))
 
                 try:
-                    left_schema = patch(list(swap(action_diff)), left_schema)
+                    left_schema.patch(swap(action_diff))
                 except (TypeError, ValueError, KeyError) as e:
                     raise ActionError(
                         f"Unable to apply schema patch of {action_object!r}. More likely that the "
@@ -429,9 +876,22 @@ class MongoengineMigrate:
                     ) from e
 
                 if not action_object.dummy_action and not runtime_flags.schema_only:
+                    stats = ActionStats()
                     action_object.prepare(db, left_schema, migration.policy)
-                    action_object.run_backward()
+                    deferred_indexes = DeferredIndexes(self.migration_collection).deferring() \
+                        if runtime_flags.defer_indexes and not runtime_flags.dry_run \
+                        else nullcontext()
+                    with stats.collecting(), index_builds.collecting(), deferred_indexes:
+                        action_object.run_backward()
                     action_object.cleanup()
+                    if restore_snapshots:
+                        # Bring back values lost on upgrade if they were saved
+                        FieldSnapshot(self.snapshot_collection, migration.name, idx).restore(db)
+                    actions_stats.append(self._make_action_stats(idx, action_object, stats))
+
+            if index_builds:
+                log.info('Building %d indexes...', len(index_builds))
+                index_builds.run()
 
             graph.migrations[migration.name].applied = False
 
@@ -439,38 +899,333 @@ class MongoengineMigrate:
                 log.debug('Writing db schema and migrations graph...')
                 self.write_db_schema(left_schema)
                 self.write_db_migrations_graph(graph)
+                if actions_stats:
+                    self.write_db_migration_stats(migration.name, 'downgrade', actions_stats)
 
         self._verify_schema(left_schema)
 
-    def migrate(self, migration_name: str = None):
+    def _get_schema_diffs(self,
+                          graph: MigrationsGraph,
+                          migrations: List[Migration]) -> Dict[str, list]:
+        """
+        Calculate schema diffs of every action in given migrations.
+        Schema diffs are calculated by replaying schema patches of all
+        migrations in applying order starting from the nearest schema
+        snapshot before the earliest given migration. If no snapshots
+        found then replaying is started from the initial migration
+        :param graph: migrations graph
+        :param migrations: migrations which diffs to calculate
+        :return: dict {migration_name: [action1_diff, ...]}
+        """
+        if not migrations:
+            return {}
+
+        order = graph.order
+        positions = sorted(graph.position(m.name) for m in migrations)
+        first, last = positions[0], positions[-1]
+
+        temp_left_schema = Schema()
+        replay_from = 0
+        snapshot_names = self.get_db_schema_snapshot_names()
+        for num in range(first - 1, -1, -1):
+            if order[num].name in snapshot_names:
+                snapshot = self.load_db_schema_snapshot(order[num].name)
+                if snapshot is not None:
+                    log.debug('> Start replaying from schema snapshot of %s', order[num].name)
+                    temp_left_schema = snapshot
+                    replay_from = num + 1
+                    break
+
+        migration_diffs = {}  # {migration_name: [action1_diff, ...]}
+        for migration in order[replay_from:last + 1]:
+            migration_diffs[migration.name] = []
+            for action in migration.get_actions():
+                forward_patch = action.to_schema_patch(temp_left_schema)
+                migration_diffs[migration.name].append(forward_patch)
+
+                try:
+                    temp_left_schema.patch(forward_patch)
+                except (TypeError, ValueError, KeyError) as e:
+                    raise ActionError(
+                        f"Unable to apply schema patch of {action!r}. More likely that the "
+                        f"schema is corrupted. You can use schema repair tools to fix this issue"
+                    ) from e
+
+        return migration_diffs
+
+    def migrate(self, migration_name: str = None, graph: Optional[MigrationsGraph] = None):
         """
         Migrate db in order to reach a given migration. This process
         may require either upgrading or downgrading
         :param migration_name: target migration name
+        :param graph: Optional. Migrations graph. If omitted, then it
+         will be loaded
         :return:
         """
+        if graph is None and migration_name is None and self.is_up_to_date():
+            # Fast path, do not load migration modules
+            log.info('No migrations to apply')
+            return
+
+        with self.lease():
+            if graph is None:
+                if migration_name is None and runtime_flags.lease and self.is_up_to_date():
+                    # Lease holder we were waiting for has done the work
+                    log.info('No migrations to apply')
+                    return
+
+                log.debug('Loading migration files...')
+                graph = self.build_graph()
+                self._write_stale_hashes(graph)
+            if not graph.last:
+                raise MigrationGraphError('No migrations found')
+
+            if migration_name is None:
+                migration_name = graph.last.name
+
+            if migration_name not in graph.migrations:
+                raise MigrationGraphError(f'Migration {migration_name} not found')
+
+            migration = graph.migrations[migration_name]
+            if migration.applied:
+                self.downgrade(migration_name, graph)
+            else:
+                self.upgrade(migration_name, graph)
+
+    def _write_stale_hashes(self, graph: MigrationsGraph):
+        """
+        Write source hashes of applied migrations if their records
+        have no hash (written by previous versions) or a hash of
+        changed module, so the fast path of `is_up_to_date` could be
+        used further
+        :param graph: migrations graph with hashes set
+        """
+        if runtime_flags.dry_run:
+            return
+
+        stale = any(
+            r['name'] in graph.migrations and r.get('hash') != graph.migrations[r['name']].hash
+            for r in self.get_db_migrations()
+        )
+        if stale:
+            log.debug('> Writing source hashes of applied migrations')
+            self.write_db_migrations_graph(graph)
+
+    def migrate_many(self,
+                     database_names: Iterable[str],
+                     migration_name: str = None,
+                     concurrency: int = 4) -> List[dict]:
+        """
+        Migrate several databases on the same server concurrently in
+        order to reach a given migration. Migration modules are loaded
+        once and connection pools are shared between databases. Error
+        in one database does not interrupt migration of others
+        :param database_names: names of databases to migrate
+        :param migration_name: target migration name. By default is
+         the last one
+        :param concurrency: how many databases are migrated at once
+        :return: list of per-database results in the same order as
+         database names were given:
+         [{'database': str, 'ok': bool, 'error': str|None, 'elapsed': float}, ...]
+        """
+        if concurrency < 1:
+            raise MongoengineMigrateError('Concurrency must be a positive number')
+
         log.debug('Loading migration files...')
-        graph = self.build_graph()
-        if not graph.last:
-            raise MigrationGraphError('No migrations found')
+        migrations = self._load_hashed_migrations()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(self._migrate_database, name, migration_name, migrations)
+                for name in database_names
+            ]
+            return [f.result() for f in futures]
+
+    def _migrate_database(self,
+                          database_name: str,
+                          migration_name: Optional[str],
+                          migrations: List[Migration]) -> dict:
+        """
+        Migrate one of several databases, run in a worker thread
+        :param database_name: database name
+        :param migration_name: target migration name
+        :param migrations: loaded migration objects which are copied
+         before use
+        :return: migration result dict
+        """
+        result = {'database': database_name, 'ok': True, 'error': None, 'elapsed': 0.0}
+        log.info('Migrating database %s...', database_name)
+        started = time.monotonic()
+        try:
+            migrate = MongoengineMigrate(self.mongo_uri,
+                                         self.migrations_collection_name,
+                                         self.migration_dir,
+                                         client=self.client,
+                                         client2=self.client2,
+                                         database_name=database_name)
+            token = runtime_flags.database2_context.set(migrate.db2)
+            try:
+                with migrate.lease():
+                    graph = migrate.build_graph([m.copy() for m in migrations])
+                    migrate._write_stale_hashes(graph)
+                    migrate.migrate(migration_name, graph)
+            finally:
+                runtime_flags.database2_context.reset(token)
+        except Exception as e:
+            log.error('Migration of database %s has failed: %s: %s',
+                      database_name, e.__class__.__name__, e,
+                      exc_info=log.isEnabledFor(logging.DEBUG))
+            result.update(ok=False, error=f'{e.__class__.__name__}: {e}')
+        else:
+            log.info('Database %s was migrated', database_name)
 
-        if migration_name is None:
-            migration_name = graph.last.name
+        result['elapsed'] = time.monotonic() - started
+        return result
 
-        if migration_name not in graph.migrations:
-            raise MigrationGraphError(f'Migration {migration_name} not found')
+    def is_up_to_date(self) -> bool:
+        """
+        Return True if all migrations in directory were applied and
+        they were not changed since then. Migration modules are not
+        executed
+        """
+        log.debug('Checking migrations manifest...')
+        graph = self._build_manifest_graph()
+        applied = {m['name']: m.get('hash') for m in self.get_db_migrations()}
+
+        # Squashed migration could be applied as migrations it replaces.
+        # Records written before hashes were introduced have no hash,
+        # it's written on the next full check
+        return bool(graph.migrations) \
+            and all(m.applied and applied.get(m.name) in (None, m.hash)
+                    for m in graph.migrations.values())
+
+    def get_expected_migrations_fingerprint(self) -> str:
+        """
+        Return fingerprint of applied migrations list which will be
+        written to db after migrating to the last migration. Can be
+        passed to SchemaGuard. Migration modules are not executed
+        """
+        graph = self._build_manifest_graph()
+        return migrations_fingerprint({'name': m.name, 'hash': m.hash} for m in graph.order)
+
+    def status(self) -> List[Tuple[str, bool]]:
+        """
+        Return migrations in applying order and whether they were
+        applied or not. Migration modules are not executed
+        :return: list of tuples (migration_name, is_applied)
+        """
+        graph = self._build_manifest_graph()
+        return [(m.name, m.applied) for m in graph.walk_down(graph.initial, unapplied_only=False)]
+
+    def check(self, install_validators: bool = False) -> List[dict]:
+        """
+        Find records which do not conform to schema in database. Every
+        collection is scanned by one query with `$jsonSchema` made
+        from schema
+        :param install_validators: if True then also set `$jsonSchema`
+         as collection validator, so server will reject new
+         non-conforming records. Existing ones are left as is
+        :return: list of dicts with keys: collection, count and
+         examples (several ids of non-conforming records)
+        """
+        from mongoengine_migrate.json_schema import collection_json_schemas
+        from mongoengine_migrate.mongo import mongo_version_below
+
+        if mongo_version_below('3.6'):
+            raise MongoengineMigrateError('$jsonSchema requires MongoDB 3.6 or newer')
+
+        # Reading is safe in dry run mode
+        db = self.client.get_database(self.database_name)
+        collection_names = set(db.list_collection_names())
+        res = []
+        for collection_name, json_schema in collection_json_schemas(self.load_db_schema()).items():
+            count = 0
+            examples = []
+            if collection_name in collection_names:
+                fltr = {'$nor': [{'$jsonSchema': json_schema}]}
+                for record in db[collection_name].find(fltr, {'_id': 1}):
+                    count += 1
+                    if len(examples) < 3:
+                        examples.append(record['_id'])
+
+            log.debug('> %s: %d non-conforming records', collection_name, count)
+            res.append({'collection': collection_name, 'count': count, 'examples': examples})
+
+            if install_validators:
+                self._install_validator(db, collection_name, json_schema, collection_names)
+
+        return res
+
+    @staticmethod
+    def _install_validator(db: pymongo.database.Database,
+                           collection_name: str,
+                           json_schema: dict,
+                           collection_names: Iterable[str]):
+        validator = {'$jsonSchema': json_schema}
+        # Do not validate updates of records which are already invalid
+        params = {'validator': validator, 'validationLevel': 'moderate'}
+        if runtime_flags.dry_run:
+            log.info('* db.%s.collMod(%s)', collection_name, params)
+            return
 
-        migration = graph.migrations[migration_name]
-        if migration.applied:
-            self.downgrade(migration_name, graph)
+        log.info('Installing validator on %s', collection_name)
+        if collection_name in collection_names:
+            db.command('collMod', collection_name, **params)
         else:
-            self.upgrade(migration_name, graph)
+            db.create_collection(collection_name, **params)
+
+    def _build_manifest_graph(self) -> MigrationsGraph:
+        """
+        Build migrations graph from manifest. Migration modules are
+        not executed, so migration objects does not have modules
+        """
+        graph = MigrationsGraph()
+        for name, item in self.load_manifest().items():
+            graph.add(Migration(name=name,
+                                dependencies=item['dependencies'],
+                                hash=item['hash'],
+                                replaces=item['replaces']))
+
+        self._mark_applied(graph)
+        return graph
+
+    def _mark_applied(self, graph: MigrationsGraph, check_hashes: bool = False):
+        """
+        Mark migrations in graph which were applied according to db.
+        Then leave in graph either squashed migrations or those ones
+        they replace
+        :param graph: migrations graph
+        :param check_hashes: if True then warn about migrations changed
+         after they had been applied
+        """
+        replaced_by = {name: m.name for m in graph.migrations.values() for name in m.replaces}
+        applied = []
+        for record in self.get_db_migrations():
+            migration_name = record['name']
+            if migration_name not in graph.migrations and migration_name in replaced_by:
+                # Replaced migration module was deleted after squashing
+                migration_name = replaced_by[migration_name]
+            if migration_name not in graph.migrations:
+                raise MigrationGraphError(
+                    f'Migration {migration_name} was applied, but its python module not found. '
+                    f'You can use schema repair to fix this issue'
+                )
+            if check_hashes and migration_name == record['name'] \
+                    and record.get('hash') not in (None, graph.migrations[migration_name].hash):
+                log.warning('Migration %s was changed after it had been applied', migration_name)
+            graph.migrations[migration_name].applied = True
+            applied.append(record['name'])
+
+        log.debug('> Applied migrations: %s', applied)
+        graph.resolve_replacements()
 
     def makemigrations(self):
         """
         Compare current mongoengine documents state and the last db
         state and make a migration file if needed
         """
+        from mongoengine_migrate.actions.factory import build_actions_chain
+
         log.debug('Loading migration files...')
         graph = self.build_graph()
         log.debug('Loading schema from database...')
@@ -483,7 +1238,7 @@ class MongoengineMigrate:
         for migration in graph.walk_down(graph.initial, unapplied_only=False):
             for action_object in migration.get_actions():
                 try:
-                    db_schema = patch(action_object.to_schema_patch(db_schema), db_schema)
+                    db_schema.patch(action_object.to_schema_patch(db_schema))
                 except (TypeError, ValueError, KeyError) as e:
                     raise ActionError(
                         f"Unable to apply schema patch of {action_object!r}. More likely that the "
@@ -499,6 +1254,163 @@ class MongoengineMigrate:
         log.debug('Building actions chain...')
         actions_chain = build_actions_chain(db_schema, models_schema)
 
+        seq_number = str(len(graph.migrations)).zfill(4)
+        name = f'{seq_number}_auto_{datetime.now().strftime("%Y%m%d_%H%M")}'
+        self._write_migration_file(name, actions_chain, [graph.last.name] if graph.last else [])
+
+    def squashmigrations(self, from_migration_name: str, to_migration_name: str):
+        """
+        Make a migration which replaces a range of migrations in
+        applying order. Its actions are built from the net schema
+        change made by migrations in range, so intermediate data
+        conversions are not performed. Migrations in range must depend
+        on the first one and must not contain RunPython actions.
+
+        Replaced migrations modules can be removed once all databases
+        will be upgraded past them
+        :param from_migration_name: first migration name in range
+        :param to_migration_name: last migration name in range
+        """
+        from mongoengine_migrate.actions import RunPython
+        from mongoengine_migrate.actions.factory import build_actions_chain
+
+        log.debug('Loading migration files...')
+        graph = self.build_graph()
+        for migration_name in (from_migration_name, to_migration_name):
+            if migration_name not in graph.migrations:
+                raise MigrationGraphError(f'Migration {migration_name} not found')
+
+        start = graph.position(from_migration_name)
+        end = graph.position(to_migration_name)
+        if start > end:
+            raise MigrationGraphError(f'Migration {from_migration_name} goes after '
+                                      f'{to_migration_name}')
+
+        order = graph.order
+        squashed = order[start:end + 1]
+        if len(squashed) < 2:
+            raise MigrationGraphError('At least two migrations are needed to squash')
+        names = [m.name for m in squashed]
+
+        # Applying order could interleave migrations of unrelated
+        # branches
+        descendants = graph.descendants(from_migration_name)
+        for migration in squashed:
+            if migration.name not in descendants:
+                raise MigrationGraphError(f'Migration {migration.name} does not depend on '
+                                          f'{from_migration_name}, so it could not be squashed')
+            # Data migrations could not be derived from schema change
+            for action_object in migration.get_actions():
+                if isinstance(action_object, RunPython):
+                    raise MigrationGraphError(f'Migration {migration.name} contains '
+                                              f'{action_object!r} which could not be squashed')
+
+        # Calculate schemas before and after migrations range
+        log.debug('Calculating schema changes...')
+        left_schema = None
+        right_schema = Schema()
+        for migration in order[:end + 1]:
+            if migration is squashed[0]:
+                left_schema = deepcopy(right_schema)
+            for action_object in migration.get_actions():
+                try:
+                    right_schema.patch(action_object.to_schema_patch(right_schema))
+                except (TypeError, ValueError, KeyError) as e:
+                    raise ActionError(
+                        f"Unable to apply schema patch of {action_object!r}. More likely that the "
+                        f"schema is corrupted. You can use schema repair tools to fix this issue"
+                    ) from e
+
+        log.debug('Building actions chain...')
+        actions_chain = build_actions_chain(left_schema, right_schema)
+
+        dependencies = []
+        for migration in squashed:
+            dependencies.extend(d for d in migration.dependencies
+                                if d not in names and d not in dependencies)
+        if any(m.policy == MigrationPolicy.relaxed for m in squashed):
+            policy = MigrationPolicy.relaxed
+        else:
+            policy = MigrationPolicy.strict
+
+        self._write_migration_file(f'{from_migration_name}_squashed_{to_migration_name}',
+                                   actions_chain,
+                                   dependencies,
+                                   replaces=names,
+                                   policy=policy)
+
+    @_with_lease
+    def inspectdb(self,
+                  collection_names: Optional[Iterable[str]] = None,
+                  sample_size: int = runtime_flags.INSPECT_SAMPLE_SIZE,
+                  concurrency: int = 4) -> Schema:
+        """
+        Infer schema from existing collections by sampling their
+        records and make the initial migration from it. Collections are
+        never fully scanned. Since data is already in database, the
+        migration is marked as applied without running its actions
+        :param collection_names: Optional. Collections to inspect. By
+         default all collections except migration ones are inspected
+        :param sample_size: how many records to sample on every level
+         of nesting
+        :param concurrency: how many collections are inspected at once
+        :return: inferred schema
+        """
+        from mongoengine_migrate.actions.factory import build_actions_chain
+        from mongoengine_migrate.inspectdb import infer_schema
+        from mongoengine_migrate.mongo import mongo_version_below
+
+        if mongo_version_below('3.4.4'):
+            raise MongoengineMigrateError('$objectToArray requires MongoDB 3.4.4 or newer')
+
+        log.debug('Loading migration files...')
+        graph = self.build_graph()
+        if graph.migrations:
+            raise MigrationGraphError('Database could be inspected only if no migrations exist')
+
+        # Reading is safe in dry run mode
+        db = self.client.get_database(self.database_name)
+        own_collections = (self.migration_collection.name, self.snapshot_collection.name)
+        schema = infer_schema(db, collection_names, sample_size, concurrency, own_collections)
+        if not schema:
+            log.info('No collections to inspect')
+            return schema
+
+        log.debug('Building actions chain...')
+        actions_chain = build_actions_chain(Schema(), schema)
+        name = f'0000_inspectdb_{datetime.now().strftime("%Y%m%d_%H%M")}'
+        self._write_migration_file(name, actions_chain, [])
+
+        if runtime_flags.dry_run:
+            return schema
+
+        graph = self.build_graph()
+        graph.migrations[name].applied = True
+        self.write_db_schema(schema)
+        self.write_db_schema_snapshot(name, schema)
+        self.write_db_migrations_graph(graph)
+        log.info('Migration %s was marked as applied', name)
+
+        return schema
+
+    def _write_migration_file(self,
+                              name: str,
+                              actions_chain: list,
+                              dependencies: List[str],
+                              replaces: Iterable[str] = (),
+                              policy: MigrationPolicy = MigrationPolicy.strict):
+        """
+        Render migration module and write it to migrations directory
+        :param name: migration name
+        :param actions_chain: migration actions
+        :param dependencies: names of migrations which the migration
+         is dependent by
+        :param replaces: names of migrations which the migration
+         replaces
+        :param policy: existing data processing policy
+        """
+        from jinja2 import Environment
+
         import_expressions = {'from mongoengine_migrate.actions import *'}
         for action in actions_chain:
             # If `regex` is set in action, then we probably need 're'
@@ -510,8 +1422,10 @@ class MongoengineMigrate:
         env = Environment()
         env.filters['symbol_wrap'] = symbol_wrap
         tpl_ctx = {
-            'graph': graph,
+            'dependencies': dependencies,
+            'replaces': list(replaces),
             'actions_chain': actions_chain,
+            'policy': policy,
             'policy_enum': MigrationPolicy,
             'import_expressions': import_expressions
         }
@@ -519,13 +1433,44 @@ class MongoengineMigrate:
         tpl = env.from_string(tpl_path.read_text())
         migration_source = tpl.render(tpl_ctx)
 
-        seq_number = str(len(graph.migrations)).zfill(4)
-        name = f'{seq_number}_auto_{datetime.now().strftime("%Y%m%d_%H%M")}.py'
-        migration_file = Path(self.migration_dir) / name
+        migration_file = Path(self.migration_dir) / f'{name}.py'
         migration_file.write_text(migration_source)
 
         log.info('Migration file "%s" was created', migration_file)
 
+    @staticmethod
+    def _make_action_stats(action_number: int, action_object, stats: 'ActionStats') -> dict:
+        """Return statistics dict of an action run"""
+        log.debug('> Action [%d] took %.3fs', action_number, stats.elapsed)
+        return {
+            'number': action_number,
+            'action': str(action_object),
+            'elapsed': stats.elapsed,
+            'collections': stats.to_list()
+        }
+
+    @contextmanager
+    def _record_snapshot(self, migration_name: str, action_number: int):
+        """
+        Context manager which records original values of fields lost
+        during an action run if snapshots are enabled
+        :param migration_name: migration name
+        :param action_number: action sequence number in migration
+        """
+        snapshot = FieldSnapshot(self.snapshot_collection, migration_name, action_number)
+        # Values left from previous upgrade are not relevant anymore
+        snapshot.clear()
+        if runtime_flags.snapshot:
+            with snapshot.recording():
+                yield
+        else:
+            yield
+
+    def _snapshot_collection_exists(self) -> bool:
+        """Return True if field snapshots were ever recorded"""
+        collection = self.snapshot_collection
+        return collection.name in collection.database.list_collection_names()
+
     def _verify_schema(self, schema: Schema):
         # Check if all derived documents have the same collection as
         # their parents.
@@ -0,0 +1,178 @@
+__all__ = [
+    'read_dependencies',
+    'read_replaces',
+    'file_hash',
+    'default_cache_dir',
+    'MigrationsManifest'
+]
+
+import ast
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional, List, Dict, Callable
+
+log = logging.getLogger('mongoengine-migrate')
+
+
+def read_dependencies(source: bytes) -> Optional[List[str]]:
+    """
+    Extract `dependencies` list from migration module source without
+    executing it
+    :param source: migration module source
+    :return: list of migration names or None if `dependencies`
+     variable is not found or it's not a literal
+    """
+    return _read_names_list(source, 'dependencies')
+
+
+def read_replaces(source: bytes) -> Optional[List[str]]:
+    """
+    Extract `replaces` list from squashed migration module source
+    without executing it
+    :param source: migration module source
+    :return: list of migration names or None if `replaces` variable
+     is not a literal. Empty list if variable is not found
+    """
+    return _read_names_list(source, 'replaces', default=[])
+
+
+def _read_names_list(source: bytes,
+                     variable: str,
+                     default: Optional[list] = None) -> Optional[List[str]]:
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        names = [t.id for t in node.targets if isinstance(t, ast.Name)]
+        if variable in names:
+            try:
+                value = ast.literal_eval(node.value)
+            except ValueError:
+                return None
+            if isinstance(value, (list, tuple)) and all(isinstance(x, str) for x in value):
+                return list(value)
+            return None
+
+    return default
+
+
+def file_hash(source: bytes) -> str:
+    """Return hash of a migration module source"""
+    return hashlib.sha1(source).hexdigest()
+
+
+def default_cache_dir() -> Path:
+    """
+    Return directory where caches are kept. It's taken from
+    `MONGOENGINE_MIGRATE_CACHE_DIR` environment variable, otherwise
+    it's `mongoengine-migrate` in user cache directory
+    """
+    cache_dir = os.environ.get('MONGOENGINE_MIGRATE_CACHE_DIR')
+    if cache_dir:
+        return Path(cache_dir)
+
+    base_dir = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base_dir) / 'mongoengine-migrate'
+
+
+class MigrationsManifest:
+    """Names, dependencies, replaced migrations and source hashes of
+    migration modules obtained without their execution.
+
+    Module sources are read and parsed only if they were changed since
+    the last manifest build. Previous results are kept in a cache file
+    keyed by file modification time and size. The file is placed in
+    cache directory outside of migrations directory, so user's source
+    tree is not modified. Cache is optional, failed writes are ignored
+    """
+    def __init__(self,
+                 directory: Path,
+                 load_dependencies: Callable[[Path], List[str]],
+                 load_replaces: Optional[Callable[[Path], List[str]]] = None,
+                 cache_dir: Optional[Path] = None):
+        """
+        :param directory: migrations directory
+        :param load_dependencies: fallback function which is called
+         with module file path if module dependencies could not be
+         parsed. Typically it executes the module
+        :param load_replaces: the same fallback for replaced
+         migrations list of squashed migration. If omitted then
+         unparsed list is treated as empty
+        :param cache_dir: Optional. Directory where cache file is
+         kept. By default it's `default_cache_dir()`
+        """
+        self.directory = directory
+        self.load_dependencies = load_dependencies
+        self.load_replaces = load_replaces
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+
+    @property
+    def cache_file(self) -> Path:
+        # Several projects could share the same cache directory
+        key = hashlib.sha1(str(self.directory.resolve()).encode()).hexdigest()[:16]
+        return self.cache_dir / f'manifest_{key}.json'
+
+    def build(self) -> Dict[str, dict]:
+        """
+        Build manifest of migration modules in directory
+        :return: dict {migration_name: {'hash': str, 'dependencies': list, 'replaces': list}}
+        """
+        cache = self._read_cache()
+        manifest = {}
+        new_cache = {}
+        for module_file in self.directory.glob("*.py"):
+            if module_file.name.startswith("__"):
+                continue
+
+            stat = module_file.stat()
+            cached = cache.get(module_file.stem)
+            if cached and cached['mtime_ns'] == stat.st_mtime_ns \
+                    and cached['size'] == stat.st_size and 'replaces' in cached:
+                item = cached
+            else:
+                log.debug('> Reading migration file %s', module_file)
+                source = module_file.read_bytes()
+                dependencies = read_dependencies(source)
+                if dependencies is None:
+                    dependencies = list(self.load_dependencies(module_file))
+                replaces = read_replaces(source)
+                if replaces is None:
+                    replaces = list(self.load_replaces(module_file)) if self.load_replaces else []
+                item = {
+                    'mtime_ns': stat.st_mtime_ns,
+                    'size': stat.st_size,
+                    'hash': file_hash(source),
+                    'dependencies': dependencies,
+                    'replaces': replaces
+                }
+
+            new_cache[module_file.stem] = item
+            manifest[module_file.stem] = {'hash': item['hash'],
+                                          'dependencies': item['dependencies'],
+                                          'replaces': item['replaces']}
+
+        if new_cache != cache:
+            self._write_cache(new_cache)
+
+        return manifest
+
+    def _read_cache(self) -> Dict[str, dict]:
+        try:
+            return json.loads(self.cache_file.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, cache: Dict[str, dict]):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self.cache_file.write_text(json.dumps(cache, indent=1, sort_keys=True))
+        except OSError as e:
+            # Cache directory could be read-only
+            log.debug('> Unable to write manifest cache file %s: %s', self.cache_file, e)
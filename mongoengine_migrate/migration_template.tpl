@@ -2,14 +2,23 @@
 
 # Existing data processing policy
 # Possible values are: {{ policy_enum | map(attribute="name") | join(", ") }}
-policy = "strict"
+policy = "{{ policy.name }}"
 
 # Names of migrations which the current one is dependent by
 dependencies = [
-{%- if graph.last %}
-    '{{ graph.last.name }}'
-{%- endif %}
+{%- for name in dependencies %}
+    '{{ name }}'{{ "," if not loop.last }}
+{%- endfor %}
+]
+{%- if replaces %}
+
+# Names of migrations which the current one replaces
+replaces = [
+{%- for name in replaces %}
+    '{{ name }}'{{ "," if not loop.last }}
+{%- endfor %}
 ]
+{%- endif %}
 
 # Action chain
 actions = [
@@ -1,16 +1,36 @@
 __all__ = [
     'check_empty_result',
-    'mongo_version'
+    'check_no_duplicates',
+    'check_references',
+    'create_index',
+    'create_indexes',
+    'find_index',
+    'mongo_version',
+    'mongo_version_below',
+    'version_tuple',
+    'build_path_filter',
+    'build_path_update',
+    'dbref_expr',
+    'dbref_field_expr'
 ]
 
 import functools
+import itertools
 import logging
+import re
+from collections.abc import Hashable
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import List, Sequence, Tuple, Optional, Iterable, Iterator, Callable
 
+import bson
+import pymongo.errors
+from pymongo import IndexModel
 from pymongo.collection import Collection
 
 from mongoengine_migrate.exceptions import InconsistencyError
 from . import flags
 from mongoengine_migrate.updater import DocumentUpdater, FallbackDocumentUpdater
+from mongoengine_migrate.validation import get_current_validation, format_violation
 
 
 log = logging.getLogger('mongoengine-migrate')
@@ -25,15 +45,264 @@ def check_empty_result(collection: Collection, db_field: str, find_filter: dict)
     :param find_filter: collection.find() method filter argument
     :raises MigrationError: if any records found
     """
+    validation = get_current_validation()
+    if validation is not None:
+        if validation.collecting:
+            validation.add(collection, db_field, find_filter)
+            return
+        if validation.skip(collection, db_field, find_filter):
+            log.debug('> Check of %s.%s was already made before migration',
+                      collection.name, db_field)
+            return
+
     bad_records = list(collection.find(find_filter, limit=3))
     if bad_records:
+        raise InconsistencyError(format_violation(collection.name, db_field, bad_records))
+
+
+def check_no_duplicates(collection: Collection,
+                        db_fields: Sequence[str],
+                        unwind_paths: Sequence[str] = (),
+                        find_filter: Optional[dict] = None) -> None:
+    """
+    Find values combinations of given fields which are met in several
+    records and raise error if anything found. Duplicates are searched
+    on server side by `$group` stage
+    :param collection: pymongo collection object to find in
+    :param db_fields: dotpaths of fields which values are checked
+     together
+    :param unwind_paths: dotpaths of arrays on the way to fields. Every
+     array item is considered separately, as unique index does
+    :param find_filter: Optional. Filter of records to be checked
+    :raises InconsistencyError: if duplicates found
+    """
+    validation = get_current_validation()
+    if validation is not None and validation.collecting:
+        # Check is not a filter, so it could not be evaluated together
+        # with others. It is made on action run
+        return
+
+    pipeline = []
+    if find_filter:
+        pipeline.append({'$match': find_filter})
+    pipeline.extend(
+        {'$unwind': {'path': f'${path}', 'preserveNullAndEmptyArrays': True}}
+        for path in unwind_paths
+    )
+    # Missing field is indexed as null
+    key = {str(num): {'$ifNull': [f'${field}', None]} for num, field in enumerate(db_fields)}
+    if unwind_paths:
+        # The same value repeated in one record is not a duplicate
+        pipeline.append({'$group': {'_id': {'key': key, 'id': '$_id'}}})
+        key = {str(num): f'$_id.key.{num}' for num in range(len(db_fields))}
+    pipeline.extend([
+        {'$group': {'_id': key, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+        {'$limit': 3}
+    ])
+
+    duplicates = list(collection.aggregate(pipeline, allowDiskUse=True))
+    if duplicates:
         examples = (
-            f'{{_id: {x.get("_id", "unknown")},...{db_field}: {x.get(db_field, "unknown")}}}'
-            for x in bad_records
+            '{' + ', '.join(f'{field}: {x["_id"].get(str(num))!r}'
+                            for num, field in enumerate(db_fields)) + f'}} x {x["count"]}'
+            for x in duplicates
+        )
+        raise InconsistencyError(f"Fields {collection.name}.{','.join(db_fields)} in some records "
+                                 f"have duplicate values. First several examples: "
+                                 f"{'; '.join(examples)}")
+
+
+def check_references(collection: Collection,
+                     db_field: str,
+                     target_collection: Collection,
+                     unwind_paths: Sequence[str] = (),
+                     find_filter: Optional[dict] = None) -> None:
+    """
+    Find referenced ids which are absent in target collection and
+    raise error if anything found. Distinct values are collected by
+    `$group` stage and streamed by chunks, every chunk is anti-joined
+    with target collection by one `$in` query which returns only ids.
+    On MongoDB 5.0+ if both collections are in the same database,
+    the anti-join is made by `$lookup` stage on server side
+    :param collection: pymongo collection object to find in
+    :param db_field: dotpath of reference values (ObjectId or DBRef)
+    :param target_collection: pymongo collection object where
+     referenced records must be
+    :param unwind_paths: dotpaths of arrays on the way to field
+    :param find_filter: Optional. Filter of records to be checked
+    :raises InconsistencyError: if dangling references found
+    """
+    validation = get_current_validation()
+    if validation is not None and validation.collecting:
+        # Check is not a filter, so it could not be evaluated together
+        # with others. It is made on action run
+        return
+
+    use_lookup = not mongo_version_below('5.0') \
+        and target_collection.database.name == collection.database.name
+
+    pipeline = []
+    if find_filter:
+        pipeline.append({'$match': find_filter})
+    pipeline.extend({'$unwind': f'${path}'} for path in unwind_paths)
+    pipeline.append({'$match': {db_field: {'$ne': None}}})
+
+    value = f'${db_field}'
+    if use_lookup:
+        # $and is short-circuit, so $getField is evaluated
+        # only on objects
+        is_dbref = {'$and': [
+            {'$eq': [{'$type': value}, 'object']},
+            {'$ne': [{'$type': dbref_field_expr('$id', value)}, 'missing']}
+        ]}
+        value = {'$cond': [is_dbref, dbref_field_expr('$id', value), value]}
+    pipeline.append({'$group': {'_id': value, 'count': {'$sum': 1}}})
+    if use_lookup:
+        pipeline.extend([
+            {'$lookup': {
+                'from': target_collection.name,
+                'localField': '_id',
+                'foreignField': '_id',
+                'pipeline': [{'$project': {'_id': True}}],
+                'as': 'found'
+            }},
+            {'$match': {'found': {'$size': 0}}},
+            {'$project': {'count': True}}
+        ])
+
+    cursor = collection.aggregate(pipeline, allowDiskUse=True)
+    dangling = cursor if use_lookup else _find_absent(cursor, target_collection)
+
+    ids_count, records_count, examples = 0, 0, []
+    for item in dangling:
+        ids_count += 1
+        records_count += item['count']
+        if len(examples) < 3:
+            examples.append(f'{item["_id"]!r} x {item["count"]}')
+
+    if ids_count:
+        raise InconsistencyError(f"Field {collection.name}.{db_field} in {records_count} records "
+                                 f"refers to {ids_count} ids which are absent in collection "
+                                 f"{target_collection.name}. First several examples: "
+                                 f"{'; '.join(examples)}")
+
+
+def _find_absent(items: Iterable[dict], collection: Collection) -> Iterator[dict]:
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, flags.LOOKUP_BATCH_SIZE))
+        if not chunk:
+            return
+
+        ids = [x['_id'].id if isinstance(x['_id'], bson.DBRef) else x['_id'] for x in chunk]
+        cursor = collection.find({'_id': {'$in': ids}}, projection={'_id': True})
+        found = {x['_id'] for x in cursor}
+        yield from (
+            item for item, item_id in zip(chunk, ids)
+            if not isinstance(item_id, Hashable) or item_id not in found
+        )
+
+
+def find_index(collection: Collection, keys: List[Tuple[str, int]], **kwargs) -> Optional[str]:
+    """
+    Find index by its keys and parameters
+    :param collection: pymongo collection object
+    :param keys: index keys in pymongo format: [(field, direction), ...]
+    :param kwargs: index parameters which must match, e.g. `unique`
+    :return: index name or None if not found
+    """
+    for name, info in collection.index_information().items():
+        if list(map(tuple, info['key'])) != list(keys):
+            continue
+        if all(bool(info.get(k, False)) == bool(v) for k, v in kwargs.items()):
+            return name
+
+
+def create_index(collection: Collection, keys: List[Tuple[str, int]], **kwargs) -> str:
+    """
+    Create index and log the build progress reported by server
+    :param collection: pymongo collection object
+    :param keys: index keys in pymongo format: [(field, direction), ...]
+    :param kwargs: create_index parameters
+    :return: index name
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(collection.create_index, keys, **kwargs)
+        while True:
+            try:
+                return future.result(timeout=flags.INDEX_BUILD_PROGRESS_INTERVAL)
+            except FutureTimeoutError:
+                _log_index_build_progress(collection)
+
+
+def create_indexes(builds: Iterable[Tuple[Collection, List[IndexModel]]]) -> None:
+    """
+    Create several indexes and log the build progress reported by
+    server. Indexes of one collection are built by one command, so
+    the collection is scanned once for all of them. Collections are
+    processed in parallel
+    :param builds: pairs of collection and its indexes to create
+    """
+    builds = [(collection, models) for collection, models in builds if models]
+    if not builds:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(len(builds), flags.INDEX_BUILD_WORKERS)) as executor:
+        futures = {executor.submit(collection.create_indexes, models): collection
+                   for collection, models in builds}
+        pending = futures.keys()
+        while pending:
+            done, pending = wait(pending, timeout=flags.INDEX_BUILD_PROGRESS_INTERVAL)
+            for future in done:
+                future.result()  # Reraise an error if any
+            for future in pending:
+                if future.running():
+                    _log_index_build_progress(futures[future])
+
+
+def _log_index_build_progress(collection: Collection) -> None:
+    try:
+        res = collection.database.client.admin.command(
+            'currentOp', {'ns': collection.full_name, 'command.createIndexes': {'$exists': True}}
         )
-        raise InconsistencyError(f"Field {collection.name}.{db_field} in some records "
-                                 f"has wrong values. First several examples: "
-                                 f"{','.join(examples)}")
+    except pymongo.errors.OperationFailure as e:
+        log.debug('> Could not get index build progress: %s', e)
+        return
+
+    for op in res.get('inprog', []):
+        progress = op.get('progress')
+        if progress and progress.get('total'):
+            log.info('Building index on %s: %d/%d (%.1f%%)',
+                     collection.full_name,
+                     progress['done'],
+                     progress['total'],
+                     100 * progress['done'] / progress['total'])
+        elif op.get('msg'):
+            log.info('Building index on %s: %s', collection.full_name, op['msg'])
+
+
+def version_tuple(version: str) -> Tuple[int, ...]:
+    """
+    Parse version string to a tuple of integers, so versions could be
+    compared: '3.4.10' is greater than '3.4.4'. Suffixes such as
+    '-rc0' are ignored, trailing zeros are removed: '3.6.0' equals
+    to '3.6'
+    :param version: version string
+    :return: tuple of integers
+    """
+    res = [int(re.match(r'\d*', part).group() or 0) for part in version.split('.')]
+    while res and res[-1] == 0:
+        res.pop()
+    return tuple(res)
+
+
+def mongo_version_below(version: str) -> bool:
+    """
+    Return True if current MongoDB version is less than a given one
+    :param version: version string
+    """
+    return version_tuple(flags.mongo_version) < version_tuple(version)
 
 
 def mongo_version(min_version: str = None, max_version: str = None):
@@ -53,8 +322,8 @@ def mongo_version(min_version: str = None, max_version: str = None):
     def dec(f):
         @functools.wraps(f)
         def w(*args, **kwargs):
-            invalid = min_version and flags.mongo_version < min_version \
-                or max_version and flags.mongo_version >= max_version
+            invalid = min_version and mongo_version_below(min_version) \
+                or max_version and not mongo_version_below(max_version)
 
             if invalid:
                 log.debug('MongoDB version is not in range (>=%s, <%s) for method %s. '
@@ -73,3 +342,85 @@ def mongo_version(min_version: str = None, max_version: str = None):
 
         return w
     return dec
+
+
+def build_path_filter(update_dotpath: str, condition: Callable[[str], dict]) -> dict:
+    """
+    Build a filter which matches records where at least one value
+    on a given path meets a condition. Every array on path (`$[...]`)
+    becomes `$elemMatch`, so condition is applied to every array
+    element separately
+    :param update_dotpath: field dotpath with `$[]` expressions
+    :param condition: callable which accepts field dotpath relative
+     to the innermost array element (or record) and returns filter
+    :return: filter dict
+    """
+    chunks = [[]]
+    for key in update_dotpath.split('.'):
+        if key.startswith('$['):
+            chunks.append([])
+        else:
+            chunks[-1].append(key)
+    assert chunks[-1], f'Path {update_dotpath} must point to a field'
+
+    fltr = condition('.'.join(chunks[-1]))
+    for chunk in reversed(chunks[:-1]):
+        fltr = {'.'.join(chunk): {'$elemMatch': fltr}}
+
+    return fltr
+
+
+def build_path_update(update_dotpath: str, expression: Callable[[str], dict]) -> List[dict]:
+    """
+    Build update pipeline which replaces every value on a given path
+    by an expression of it. Arrays on path (`$[...]`) are rewritten
+    by `$map`, embedded documents by `$mergeObjects`. Values of other
+    types on path are left as is. Requires MongoDB 4.2+
+    :param update_dotpath: field dotpath with `$[]` expressions
+    :param expression: callable which accepts value expression (such
+     as "$field" or "$$item0.field") and returns expression of a new
+     value. If it evaluates to missing, then value is left as is
+    :return: update pipeline
+    """
+    keys = update_dotpath.split('.')
+    assert not keys[0].startswith('$['), f'Path {update_dotpath} must start with a field'
+
+    def build(value: str, rest: List[str], depth: int) -> dict:
+        if not rest:
+            return expression(value)
+
+        key, rest = rest[0], rest[1:]
+        if key.startswith('$['):
+            var = f'item{depth}'
+            mapped = {'$map': {'input': value, 'as': var, 'in': build(f'$${var}', rest, depth + 1)}}
+            return {'$cond': [{'$isArray': value}, mapped, value]}
+
+        merged = {'$mergeObjects': [value, {key: build(f'{value}.{key}', rest, depth)}]}
+        return {'$cond': [{'$eq': [{'$type': value}, 'object']}, merged, value]}
+
+    return [{'$set': {keys[0]: build(f'${keys[0]}', keys[1:], 0)}}]
+
+
+def dbref_field_expr(key: str, value) -> dict:
+    """
+    Return expression which gets `$ref` or `$id` field of DBRef.
+    Value must be an object. Requires MongoDB 5.0+
+    :param key: '$ref' or '$id'
+    :param value: DBRef expression
+    :return: expression dict
+    """
+    return {'$getField': {'field': {'$literal': key}, 'input': value}}
+
+
+def dbref_expr(collection_name: str, id_value) -> dict:
+    """
+    Return expression which makes DBRef. Field names of DBRef start
+    with `$`, so it is built by `$setField`. Requires MongoDB 5.0+
+    :param collection_name: collection name to put to `$ref`
+    :param id_value: expression of value to put to `$id`
+    :return: expression dict
+    """
+    ref = {'$setField': {'field': {'$literal': '$ref'},
+                         'input': {'$literal': {}},
+                         'value': {'$literal': collection_name}}}
+    return {'$setField': {'field': {'$literal': '$id'}, 'input': ref, 'value': id_value}}
@@ -6,7 +6,7 @@ __all__ = [
 
 import logging
 from enum import Enum
-from typing import NamedTuple, Dict, Tuple, Any
+from typing import NamedTuple, Dict, Tuple, Any, Callable, Optional
 
 import wrapt
 from bson import ObjectId
@@ -62,7 +62,11 @@ def make_history_method(func_name, method_kind, return_value=_sentinel):
         if arguments:
             arguments += '\n'
         collection_name = instance.__wrapped__.full_name
-        log.info('* %s.%s(%s)', collection_name, func_name, arguments)
+        on_modify = instance._self_on_modify
+        if on_modify is not None and method_kind == 'MODIFY':
+            on_modify(instance.__wrapped__.name)
+        else:
+            log.info('* %s.%s(%s)', collection_name, func_name, arguments)
 
         if return_value == _sentinel:
             f = getattr(instance.__wrapped__, func_name)
@@ -78,8 +82,15 @@ class CollectionQueryTracer(wrapt.ObjectProxy):
     calls and writes their call to history
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, wrapped, on_modify: Optional[Callable[[str], Any]] = None):
+        """
+        :param wrapped: pymongo Collection object
+        :param on_modify: Optional. If set then it is called with
+         collection name on every modification method call instead of
+         writing the call to log
+        """
+        super().__init__(wrapped)
+        self._self_on_modify = on_modify
 
     # Collection modification methods
     bulk_write = make_history_method('bulk_write', 'MODIFY', return_value=BulkWriteResultMock())
@@ -133,24 +144,30 @@ class DatabaseQueryTracer(wrapt.ObjectProxy):
     """pymongo.Database wrapper which is acting as original object,
     but returns CollectionQueryTracer object instead of Collection
     """
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, wrapped, on_modify: Optional[Callable[[str], Any]] = None):
+        """
+        :param wrapped: pymongo Database object
+        :param on_modify: Optional. Passed to every
+         CollectionQueryTracer object
+        """
+        super().__init__(wrapped)
+        self._self_on_modify = on_modify
 
     def __getitem__(self, item):
         col = super().__getitem__(item)
-        return CollectionQueryTracer(col)
+        return CollectionQueryTracer(col, self._self_on_modify)
 
     def __getattr__(self, item):
         val = super().__getattr__(item)
         if isinstance(val, Collection):
-            return CollectionQueryTracer(val)
+            return CollectionQueryTracer(val, self._self_on_modify)
 
         return val
 
     def get_collection(self, *args, **kwargs):
         col = super().get_collection(*args, **kwargs)
-        return CollectionQueryTracer(col)
+        return CollectionQueryTracer(col, self._self_on_modify)
 
     def create_collection(self, *args, **kwargs):
         col = super().create_collection(*args, **kwargs)
-        return CollectionQueryTracer(col)
+        return CollectionQueryTracer(col, self._self_on_modify)
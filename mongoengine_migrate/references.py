@@ -0,0 +1,94 @@
+__all__ = [
+    'ReferenceResolver'
+]
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pymongo.database import Database
+
+import mongoengine_migrate.flags as flags
+
+log = logging.getLogger('mongoengine-migrate')
+
+
+class ReferenceResolver:
+    """
+    Fetches referenced documents. Ids are prefetched by batches, so
+    that documents of one collection are read by one `$in` query per
+    batch. Fetched documents (and misses) are kept in LRU cache, since
+    the same documents are usually referenced many times
+    """
+    def __init__(self,
+                 db: Database,
+                 projection: Optional[dict] = None,
+                 cache_size: int = flags.LOOKUP_CACHE_SIZE):
+        """
+        :param db: database where referenced documents are read from
+        :param projection: Optional. Projection of referenced documents
+        :param cache_size: how many documents are kept in cache
+        """
+        self.db = db
+        self.projection = projection
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # type: OrderedDict[Tuple[str, Any], Optional[dict]]
+
+    def prefetch(self, collection_name: str, ids: Iterable[Any]) -> None:
+        """
+        Fetch documents which are not in cache yet by one query
+        :param collection_name: collection of referenced documents
+        :param ids: ids of referenced documents
+        """
+        missing = {i for i in ids if self._is_hashable(i) and (collection_name, i) not in self._cache}
+        if not missing:
+            return
+
+        log.debug('> Fetching %s referenced documents from %s', len(missing), collection_name)
+        found = {
+            doc['_id']: doc
+            for doc in self.db[collection_name].find({'_id': {'$in': list(missing)}},
+                                                     self.projection)
+        }
+        for doc_id in missing:
+            self._put(collection_name, doc_id, found.get(doc_id))
+
+    def prefetch_many(self, ids: Dict[str, Iterable[Any]]) -> None:
+        """
+        Fetch documents of several collections, one query per
+        collection
+        :param ids: dict {collection_name: ids}
+        """
+        for collection_name, collection_ids in ids.items():
+            self.prefetch(collection_name, collection_ids)
+
+    def get(self, collection_name: str, doc_id: Any) -> Optional[dict]:
+        """
+        Return referenced document or None if it does not exist.
+        Document is fetched if it was not prefetched before
+        :param collection_name: collection of referenced document
+        :param doc_id: id of referenced document
+        :return: document with fields from projection
+        """
+        if not self._is_hashable(doc_id):
+            return self.db[collection_name].find_one({'_id': doc_id}, self.projection)
+
+        key = (collection_name, doc_id)
+        if key not in self._cache:
+            self.prefetch(collection_name, [doc_id])
+        self._cache.move_to_end(key)
+        return self._cache[key]
+
+    def _put(self, collection_name: str, doc_id: Any, doc: Optional[dict]) -> None:
+        self._cache[(collection_name, doc_id)] = doc
+        self._cache.move_to_end((collection_name, doc_id))
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _is_hashable(value: Any) -> bool:
+        try:
+            hash(value)
+        except TypeError:
+            return False
+        return True
@@ -1,7 +1,14 @@
 __all__ = ['Schema']
 
+import hashlib
+import json
+from copy import deepcopy
+from typing import Dict, Iterable, Optional, Union, Sequence
+
 from mongoengine_migrate.exceptions import SchemaError
 
+_missing = object()
+
 
 class SchemaAccessMixin:
     """Replace possible KeyError exceptions to SchemaError in dict key
@@ -38,18 +45,35 @@ class Schema(SchemaAccessMixin, dict):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self.__parameters = kwargs.pop('parameters', Schema.Document.Parameters())
+            self.__indexes = {}
 
         @property
         def parameters(self) -> dict:
             return self.__parameters
 
+        @property
+        def indexes(self) -> dict:
+            """Index specs by index name:
+            {name: {'fields': [[key, direction], ...], **options}}
+            """
+            return self.__indexes
+
         def load(self, document_schema: dict):
             self.__parameters = Schema.Document.Parameters(document_schema.get('parameters', {}))
+            # Index names could contain dots, so they are stored in list
+            self.__indexes = {
+                spec['name']: {k: v for k, v in spec.items() if k != 'name'}
+                for spec in document_schema.get('indexes', [])
+            }
             self.update(document_schema.get('fields', {}))
             return self
 
         def dump(self) -> dict:
-            return {'fields': dict(self.items()), 'parameters': self.__parameters}
+            res = {'fields': dict(self.items()), 'parameters': self.__parameters}
+            if self.__indexes:
+                res['indexes'] = [dict(spec, name=name)
+                                  for name, spec in sorted(self.__indexes.items())]
+            return res
 
         def __eq__(self, other):
             if self is other:
@@ -57,16 +81,20 @@ class Schema(SchemaAccessMixin, dict):
             if not isinstance(other, Schema.Document):
                 return False
 
-            return self.items() == other.items() and self.parameters == other.parameters
+            return self.items() == other.items() \
+                and self.parameters == other.parameters \
+                and self.indexes == other.indexes
 
         def __ne__(self, other):
             return not self.__eq__(other)
 
         def __str__(self):
-            return f'Document({super().__repr__()}, parameters={self.parameters!s})'
+            indexes = f', indexes={self.indexes!s}' if self.indexes else ''
+            return f'Document({super().__repr__()}, parameters={self.parameters!s}{indexes})'
 
         def __repr__(self):
-            return f'Document({super().__repr__()}, parameters={self.parameters!r})'
+            indexes = f', indexes={self.indexes!r}' if self.indexes else ''
+            return f'Document({super().__repr__()}, parameters={self.parameters!r}{indexes})'
 
     def load(self, db_schema: dict):
         """Load schema from db dict schema representation"""
@@ -77,6 +105,112 @@ class Schema(SchemaAccessMixin, dict):
         """Return schema representation for write to db"""
         return {name: doc.dump() for name, doc in self.items()}
 
+    def patch(self, diff: Iterable[tuple]) -> 'Schema':
+        """
+        Apply a diff to the schema in-place. The diff has the same
+        format as `dictdiffer` produces (and as `to_schema_patch`
+        returns): list of tuples (action, node, changes).
+
+        Unlike `dictdiffer.patch` the whole schema is not copied,
+        only the inserted values are. Every modification is
+        journaled, so if an error occurs then all changes made during
+        this call are rolled back and the error is reraised
+        :param diff: diff to apply
+        :return: self
+        """
+        journal = []  # Undo callbacks
+        try:
+            for action, node, changes in diff:
+                if action == 'add':
+                    dest = self._lookup(node)
+                    for key, value in changes:
+                        self._set(dest, key, deepcopy(value), journal, insert=True)
+                elif action == 'change':
+                    path = self._split_node(node)
+                    dest = self._lookup(path[:-1])
+                    key = int(path[-1]) if isinstance(dest, list) else path[-1]
+                    self._set(dest, key, deepcopy(changes[1]), journal)
+                elif action == 'remove':
+                    dest = self._lookup(node)
+                    for key, value in changes:
+                        self._remove(dest, key, value, journal)
+                else:
+                    raise ValueError(f'Unknown diff action: {action!r}')
+        except Exception:
+            for undo in reversed(journal):
+                undo()
+            raise
+
+        return self
+
+    @staticmethod
+    def _split_node(node: Union[str, Sequence]) -> list:
+        if isinstance(node, str):
+            return node.split('.') if node else []
+        return list(node)
+
+    def _lookup(self, node: Union[str, Sequence]):
+        dest = self
+        for key in self._split_node(node):
+            if isinstance(dest, list):
+                key = int(key)
+            dest = dest[key]
+        return dest
+
+    @staticmethod
+    def _set(dest, key, value, journal: list, insert: bool = False):
+        if isinstance(dest, list):
+            if insert:
+                dest.insert(key, value)
+                journal.append(lambda: dest.pop(key))
+                return
+            old_value = dest[key]
+        else:
+            old_value = dest.get(key, _missing)
+
+        dest[key] = value
+        if old_value is _missing:
+            journal.append(lambda: dest.pop(key))
+        else:
+            journal.append(lambda: dest.__setitem__(key, old_value))
+
+    @staticmethod
+    def _remove(dest, key, value, journal: list):
+        if isinstance(dest, set):
+            removed = dest & value
+            dest -= value
+            journal.append(lambda: dest.update(removed))
+            return
+
+        old_value = dest[key]
+        del dest[key]
+        if isinstance(dest, list):
+            journal.append(lambda: dest.insert(key, old_value))
+        else:
+            journal.append(lambda: dest.__setitem__(key, old_value))
+
+    def fingerprint(self, document_fingerprints: Optional[Dict[str, str]] = None) -> str:
+        """Return hash of schema contents. Equal schemas have the
+        same fingerprint regardless of keys order
+        :param document_fingerprints: Optional. Result of
+         `document_fingerprints()` if it was already calculated
+        """
+        if document_fingerprints is None:
+            document_fingerprints = self.document_fingerprints()
+        data = json.dumps(sorted(document_fingerprints.items()), separators=(',', ':'))
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    def document_fingerprints(self) -> Dict[str, str]:
+        """Return hashes of every document schema contents
+        :return: dict {document_type: hash}
+        """
+        return {
+            name: hashlib.sha1(
+                json.dumps(doc.dump(), sort_keys=True, separators=(',', ':'), default=repr).encode()
+            ).hexdigest()
+            for name, doc in self.items()
+        }
+
     def __str__(self):
         return f'Schema({super().__repr__()})'
 
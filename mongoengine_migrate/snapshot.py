@@ -0,0 +1,188 @@
+__all__ = [
+    'FieldSnapshot',
+    'get_current_snapshot'
+]
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Any, Callable
+
+import pymongo.errors
+from pymongo import UpdateOne, ASCENDING
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from mongoengine_migrate import flags
+
+log = logging.getLogger('mongoengine-migrate')
+
+#: Snapshot which is currently recording values. Set during an
+#: action run. Context variable, since several databases could be
+#: migrated concurrently in separate threads
+_current_snapshot: ContextVar[Optional['FieldSnapshot']] = \
+    ContextVar('current_snapshot', default=None)
+
+_missing = object()
+
+
+def get_current_snapshot() -> Optional['FieldSnapshot']:
+    """Return snapshot which is currently recording or None"""
+    return _current_snapshot.get()
+
+
+class FieldSnapshot:
+    """Original values of top-level document fields which are going
+    to be lost during an action run (dropped, truncated, etc.).
+
+    Values are streamed to a side collection before the data will be
+    changed, so that the action rollback could restore them instead
+    of writing defaults. Every value is stored as a separate record
+    `{migration, action, collection, document_id, field, value}`.
+    Record with `absent` flag instead of `value` means the field was
+    absent in a document.
+    """
+    def __init__(self, collection: Collection, migration_name: str, action_number: int):
+        """
+        :param collection: side collection where snapshots are kept
+        :param migration_name: migration which action belongs to
+        :param action_number: action sequence number in migration
+        """
+        self.collection = collection
+        self.migration_name = migration_name
+        self.action_number = action_number
+        self._buffer = []
+
+    @property
+    def _key(self) -> dict:
+        return {'migration': self.migration_name, 'action': self.action_number}
+
+    @contextmanager
+    def recording(self):
+        """Context manager which makes this snapshot current, so
+        updaters will write original values to it
+        """
+        self.ensure_collection()
+        token = _current_snapshot.set(self)
+        try:
+            yield self
+            self.flush()
+        finally:
+            _current_snapshot.reset(token)
+            self._buffer.clear()
+
+    def ensure_collection(self):
+        """Create compressed side collection and its index if needed"""
+        db = self.collection.database
+        if self.collection.name not in db.list_collection_names():
+            try:
+                db.create_collection(
+                    self.collection.name,
+                    storageEngine={'wiredTiger': {'configString': 'block_compressor=zlib'}}
+                )
+            except pymongo.errors.CollectionInvalid:
+                pass  # Somebody else has created it
+        self.collection.create_index([
+            ('migration', ASCENDING),
+            ('action', ASCENDING),
+            ('collection', ASCENDING),
+            ('document_id', ASCENDING),
+            ('field', ASCENDING)
+        ], unique=True)
+
+    def record(self, collection_name: str, document_id: Any, field: str, value: Any = _missing):
+        """
+        Add a field value to snapshot. Only the first recorded value
+        of a field is kept, so the value before the action run will
+        be restored even if the field was changed several times
+        :param collection_name: collection where document is placed
+        :param document_id: document _id
+        :param field: top-level field name
+        :param value: field value. Omit if the field is absent
+        """
+        fltr = {
+            **self._key,
+            'collection': collection_name,
+            'document_id': document_id,
+            'field': field
+        }
+        update = {'$setOnInsert': {'value': value} if value is not _missing else {'absent': True}}
+        self._buffer.append(UpdateOne(fltr, update, upsert=True))
+
+        if len(self._buffer) >= flags.BULK_BUFFER_LENGTH:
+            self.flush()
+
+    def record_document(self, collection_name: str, prev_doc: dict, doc: dict):
+        """
+        Add to snapshot values of fields which were changed in
+        a document
+        :param collection_name: collection where document is placed
+        :param prev_doc: document before the change
+        :param doc: changed document
+        """
+        for key in prev_doc.keys() | doc.keys():
+            value = prev_doc.get(key, _missing)
+            if key != '_id' and value != doc.get(key, _missing):
+                self.record(collection_name, doc['_id'], key, value)
+
+    def record_path(self,
+                    collection: Collection,
+                    filter_dotpath: str,
+                    extra_filter: dict,
+                    condition: Optional[Callable[[str], dict]] = None):
+        """
+        Add to snapshot values of top-level fields which contain
+        a given dotpath. Documents are streamed from the database
+        :param collection: collection to read documents from
+        :param filter_dotpath: field dotpath
+        :param extra_filter: filter to AND with the dotpath filter
+        :param condition: Optional. Callable which accepts dotpath and
+         returns filter of documents which are going to be changed.
+         By default all documents which contain the dotpath
+        """
+        field = filter_dotpath.split('.', 1)[0]
+        fltr = condition(filter_dotpath) if condition else {filter_dotpath: {'$exists': True}}
+        fltr = {**fltr, **extra_filter}
+        for doc in collection.find(fltr, projection={field: True}):
+            self.record(collection.name, doc['_id'], field, doc.get(field, _missing))
+
+    def flush(self):
+        """Write buffered values to the side collection"""
+        if self._buffer:
+            self.collection.bulk_write(self._buffer, ordered=False)
+            self._buffer.clear()
+
+    def clear(self):
+        """Delete all snapshot values"""
+        self.collection.delete_many(self._key)
+
+    def restore(self, db: Database) -> int:
+        """
+        Write snapshot values back to documents and delete snapshot
+        :param db: database where documents should be restored
+        :return: number of restored field values
+        """
+        count = 0
+        buffers = {}  # {collection_name: [UpdateOne, ...]}
+        for item in self.collection.find(self._key):
+            if 'value' in item:
+                update = {'$set': {item['field']: item['value']}}
+            else:
+                update = {'$unset': {item['field']: ''}}
+            buf = buffers.setdefault(item['collection'], [])
+            buf.append(UpdateOne({'_id': item['document_id']}, update))
+            count += 1
+
+            if len(buf) >= flags.BULK_BUFFER_LENGTH:
+                db[item['collection']].bulk_write(buf, ordered=False)
+                buf.clear()
+
+        for collection_name, buf in buffers.items():
+            if buf:
+                db[collection_name].bulk_write(buf, ordered=False)
+
+        if count:
+            log.debug('> Restored %s field values from snapshot', count)
+            self.clear()
+
+        return count
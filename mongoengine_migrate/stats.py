@@ -0,0 +1,130 @@
+__all__ = [
+    'ActionStats',
+    'CollectionStatsCollector',
+    'get_current_stats'
+]
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Tuple, Any, List
+
+import wrapt
+from pymongo.collection import Collection
+
+#: Statistics which is currently collecting. Set during an action run.
+#: Context variable, since several databases could be migrated
+#: concurrently in separate threads
+_current_stats: ContextVar[Optional['ActionStats']] = ContextVar('current_stats', default=None)
+
+#: Counters taken from write operation results
+RESULT_COUNTERS = ('matched_count', 'modified_count', 'deleted_count', 'upserted_count')
+
+
+def get_current_stats() -> Optional['ActionStats']:
+    """Return statistics which is currently collecting or None"""
+    return _current_stats.get()
+
+
+class ActionStats:
+    """Impact statistics of an action run. Counters are aggregated
+    per collection and field dotpath
+    """
+    def __init__(self):
+        self.elapsed = 0.0
+        self._items: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    @contextmanager
+    def collecting(self):
+        """Context manager which makes this statistics current, so
+        updaters will write counters to it
+        """
+        token = _current_stats.set(self)
+        started = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.elapsed += time.monotonic() - started
+            _current_stats.reset(token)
+
+    def _get_item(self, collection_name: str, field: str) -> Dict[str, Any]:
+        key = (collection_name, field)
+        if key not in self._items:
+            self._items[key] = {
+                'collection': collection_name,
+                'field': field,
+                'queries': 0,
+                'scanned_count': 0,
+                'elapsed': 0.0,
+                **{c: 0 for c in RESULT_COUNTERS}
+            }
+        return self._items[key]
+
+    def add_result(self, collection_name: str, field: str, result: Any, elapsed: float):
+        """
+        Add counters from a write operation result
+        :param collection_name: collection name
+        :param field: field dotpath
+        :param result: pymongo result object (UpdateResult,
+         BulkWriteResult, etc.)
+        :param elapsed: operation duration in seconds
+        """
+        item = self._get_item(collection_name, field)
+        item['queries'] += 1
+        item['elapsed'] += elapsed
+        for counter in RESULT_COUNTERS:
+            item[counter] += getattr(result, counter, None) or 0
+
+    def add_scanned(self, collection_name: str, field: str, count: int):
+        """
+        Add number of documents read and processed in python
+        :param collection_name: collection name
+        :param field: field dotpath
+        :param count: documents count
+        """
+        self._get_item(collection_name, field)['scanned_count'] += count
+
+    def wrap_collection(self, collection: Collection, field: str) -> 'CollectionStatsCollector':
+        """
+        Return collection proxy which passes write results to this
+        statistics
+        :param collection: collection object
+        :param field: field dotpath
+        :return:
+        """
+        return CollectionStatsCollector(collection, self, field)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Return list of counters for every collection and field"""
+        return list(self._items.values())
+
+
+def make_accounting_method(func_name):
+    def w(instance, *args, **kwargs):
+        f = getattr(instance.__wrapped__, func_name)
+        started = time.monotonic()
+        res = f(*args, **kwargs)
+        instance._self_stats.add_result(instance.__wrapped__.name,
+                                        instance._self_field,
+                                        res,
+                                        time.monotonic() - started)
+        return res
+    return w
+
+
+class CollectionStatsCollector(wrapt.ObjectProxy):
+    """
+    pymongo.Collection wrapper object which passes results of
+    modification methods calls to ActionStats
+    """
+    def __init__(self, wrapped: Collection, stats: ActionStats, field: str):
+        super().__init__(wrapped)
+        self._self_stats = stats
+        self._self_field = field
+
+    bulk_write = make_accounting_method('bulk_write')
+    replace_one = make_accounting_method('replace_one')
+    update_one = make_accounting_method('update_one')
+    update_many = make_accounting_method('update_many')
+    delete_one = make_accounting_method('delete_one')
+    delete_many = make_accounting_method('delete_many')
@@ -5,12 +5,12 @@ __all__ = [
     'FallbackDocumentUpdater'
 ]
 
+import itertools
 import logging
 from copy import copy
-from typing import NamedTuple, Optional, List, Union, Callable, Any, Generator, Tuple
+from typing import NamedTuple, Optional, List, Union, Callable, Any, Generator, Tuple, Iterable
 
-import jsonpath_rw
-from pymongo import ReplaceOne
+from pymongo import ReplaceOne, UpdateOne
 from pymongo.collection import Collection
 from pymongo.database import Database
 from copy import deepcopy
@@ -18,7 +18,11 @@ from copy import deepcopy
 from mongoengine_migrate import flags
 from mongoengine_migrate.graph import MigrationPolicy
 from mongoengine_migrate.schema import Schema
-from mongoengine_migrate.exceptions import InconsistencyError
+from mongoengine_migrate.exceptions import InconsistencyError, MigrationError
+from mongoengine_migrate.indexes import get_current_deferred_indexes
+from mongoengine_migrate.snapshot import get_current_snapshot
+from mongoengine_migrate.stats import get_current_stats
+from mongoengine_migrate.validation import get_current_validation
 
 log = logging.getLogger('mongoengine-migrate')
 
@@ -140,6 +144,9 @@ class DocumentUpdater:
         self.migration_policy = migration_policy
         self.document_cls = document_cls
         self._include_missed_fields = False
+        self._snapshot = False
+        self._snapshot_condition = None  # type: Optional[Callable[[str], dict]]
+        self._lookup = None  # type: Optional[Callable[[List[ByDocContext]], None]]
 
     @property
     def document_type(self):
@@ -159,6 +166,33 @@ class DocumentUpdater:
 
         return res
 
+    def with_snapshot(self,
+                      condition: Optional[Callable[[str], dict]] = None) -> 'DocumentUpdater':
+        """Return copy of current Updater which saves original values
+        of affected fields to the current snapshot (if any) before
+        changing them. Used for operations which lose data
+        :param condition: Optional. Callable which accepts field
+         dotpath and returns filter of documents which by_path
+         callback changes. By default all documents which contain
+         the field are saved
+        """
+        res = copy(self)
+        res._snapshot = True
+        res._snapshot_condition = condition
+
+        return res
+
+    def with_lookup(self, lookup: Callable[[List[ByDocContext]], None]) -> 'DocumentUpdater':
+        """Return copy of current Updater which calls a given callback
+        for every batch of documents before by_doc callback is called
+        for them. Callback accepts list of by_doc contexts. Used to
+        fetch documents referenced by a batch by one query
+        """
+        res = copy(self)
+        res._lookup = lookup
+
+        return res
+
     def update_by_path(self, callback: Callable) -> None:
         """
         Call the given callback for every path to a field contained
@@ -281,11 +315,23 @@ class DocumentUpdater:
 
         filter_dotpath = '.'.join(filter_path)
         update_dotpath = '.'.join(update_path)
+
+        stats = get_current_stats()
+        if stats is not None:
+            collection = stats.wrap_collection(collection, filter_dotpath)
+
         ctx = ByPathContext(collection=collection,
                             filter_dotpath=filter_dotpath,
                             update_dotpath=update_dotpath,
                             array_filters=array_filters,
                             extra_filter=extra_filter)
+
+        snapshot = get_current_snapshot() if self._snapshot else None
+        if snapshot is not None:
+            snapshot.record_path(collection, filter_dotpath, extra_filter,
+                                 self._snapshot_condition)
+            snapshot.flush()
+
         callback(ctx)
 
     def _update_by_document(self,
@@ -315,6 +361,7 @@ class DocumentUpdater:
             # update_path is mongo update path
             json_path = '.'.join(f.replace('$[]', '[*]') for f in update_path)
             json_path = json_path.replace('.[*]', '[*]')
+        import jsonpath_rw  # Slow to import, used only here
         parser = jsonpath_rw.parse(json_path)
 
         find_fltr = {}
@@ -328,12 +375,77 @@ class DocumentUpdater:
             log.info(msg, collection.name, find_fltr, filter_dotpath, collection.name)
             return
 
-        bulk_db = flags.database2
+        validation = get_current_validation()
+        if validation is not None and validation.collecting:
+            # Documents are not read while checks are being collected,
+            # but further checks must know that collection is modified
+            validation.mark_written(collection.name)
+            return
+
+        deferred_indexes = get_current_deferred_indexes()
+        if deferred_indexes is not None:
+            deferred_indexes.defer(collection, find_fltr.keys())
+
+        bulk_db = flags.get_database2()
         bulk_collection = bulk_db[collection.name]
 
+        stats = get_current_stats()
+        if stats is not None:
+            collection = stats.wrap_collection(collection, filter_dotpath)
+            bulk_collection = stats.wrap_collection(bulk_collection, filter_dotpath)
+
+        docs = collection.find(find_fltr)
+        for _ in range(flags.CONCURRENT_UPDATE_RETRIES + 1):
+            if self._lookup is not None:
+                docs = self._iter_with_lookup(docs, parser, collection, filter_dotpath)
+            conflicted_ids = self._process_documents(docs,
+                                                     callback,
+                                                     parser,
+                                                     collection,
+                                                     bulk_collection,
+                                                     filter_dotpath)
+            if not conflicted_ids:
+                break
+
+            # Reread documents which was modified by somebody else
+            # between reading and writing and process them again
+            log.debug('> %s documents in %s was concurrently modified, processing them again',
+                      len(conflicted_ids), collection.name)
+            docs = collection.find({'_id': {'$in': conflicted_ids}, **find_fltr})
+        else:
+            raise MigrationError(f'Could not update {len(conflicted_ids)} documents in '
+                                 f'{collection.name} since they are constantly modified '
+                                 f'concurrently. First several ids: {conflicted_ids[:3]}')
+
+    def _process_documents(self,
+                           docs: Iterable[dict],
+                           callback: Callable,
+                           parser,
+                           collection: Collection,
+                           bulk_collection: Collection,
+                           filter_dotpath: str) -> List[Any]:
+        """
+        Call a callback for every embedded document found by jsonpath
+        parser in given documents and write changed documents
+        :param docs: documents to process
+        :param callback: by_doc callback
+        :param parser: jsonpath parser object which points to embedded
+         documents
+        :param collection: collection where documents was taken from
+        :param bulk_collection: the same collection but in separate
+         connection, where write operations are performed
+        :param filter_dotpath: dotpath of field
+        :return: ids of documents which was not written because of
+         concurrent modification. Always empty if optimistic
+         concurrency mode is off
+        """
+        conflicted_ids = []
         buf = []
-        for doc in collection.find(find_fltr):
+        scanned_count = 0
+        snapshot = get_current_snapshot() if self._snapshot else None
+        for doc in docs:
             prev_doc = deepcopy(doc)
+            scanned_count += 1
 
             # Recursively apply the callback to every embedded doc
             for embedded_doc in parser.find(doc):
@@ -364,16 +476,155 @@ class DocumentUpdater:
 
             # Write a document only if it was changed by callback
             if prev_doc != doc:
-                buf.append(ReplaceOne({'_id': doc['_id']}, doc, upsert=False))
+                buf.append((prev_doc, doc))
+                if snapshot is not None:
+                    snapshot.record_document(collection.name, prev_doc, doc)
 
             # Flush buffer
             if len(buf) >= flags.BULK_BUFFER_LENGTH:
-                bulk_collection.bulk_write(buf, ordered=False)
+                if snapshot is not None:
+                    snapshot.flush()  # Original values must be saved first
+                conflicted_ids.extend(self._flush_buffer(bulk_collection, buf))
                 buf.clear()
         if buf:
-            bulk_collection.bulk_write(buf, ordered=False)
+            if snapshot is not None:
+                snapshot.flush()
+            conflicted_ids.extend(self._flush_buffer(bulk_collection, buf))
             buf.clear()
 
+        stats = get_current_stats()
+        if stats is not None:
+            stats.add_scanned(collection.name, filter_dotpath, scanned_count)
+
+        return conflicted_ids
+
+    def _iter_with_lookup(self,
+                          docs: Iterable[dict],
+                          parser,
+                          collection: Collection,
+                          filter_dotpath: str) -> Iterable[dict]:
+        """
+        Read documents by batches and call lookup callback for
+        embedded documents of every batch before yielding them
+        :param docs: documents to process
+        :param parser: jsonpath parser object which points to embedded
+         documents
+        :param collection: collection where documents was taken from
+        :param filter_dotpath: dotpath of field
+        :return: the same documents
+        """
+        docs = iter(docs)
+        while True:
+            batch = list(itertools.islice(docs, flags.LOOKUP_BATCH_SIZE))
+            if not batch:
+                return
+
+            contexts = [
+                ByDocContext(collection=collection, document=match.value,
+                             filter_dotpath=filter_dotpath)
+                for doc in batch for match in parser.find(doc) if isinstance(match.value, dict)
+            ]
+            self._lookup(contexts)
+            yield from batch
+
+    @staticmethod
+    def _build_concurrency_filter(prev_doc: dict, doc: dict) -> dict:
+        """
+        Build a filter for updating a document which matches only if
+        fields changed by a callback still contain values they had
+        before the change
+        :param prev_doc: document before the change
+        :param doc: changed document
+        :return: filter dict
+        """
+        fltr = {'_id': doc['_id']}
+        exprs = []
+        missing = object()
+        for key in prev_doc.keys() | doc.keys():
+            old_value = prev_doc.get(key, missing)
+            if key == '_id' or old_value == doc.get(key, missing):
+                continue
+
+            if old_value is missing:
+                fltr[key] = {'$exists': False}
+            elif old_value is None:
+                fltr[key] = {'$type': 'null'}  # {$eq: null} also matches unset fields
+            elif isinstance(old_value, (list, dict)):
+                # {$eq: value} also matches an array which contains
+                # value as element, expression compares exactly
+                exprs.append({'$eq': [f'${key}', {'$literal': old_value}]})
+            else:
+                fltr[key] = {'$eq': old_value}
+
+        if exprs:
+            fltr['$expr'] = exprs[0] if len(exprs) == 1 else {'$and': exprs}
+
+        return fltr
+
+    @staticmethod
+    def _build_concurrency_update(prev_doc: dict, doc: dict) -> dict:
+        """
+        Build an update which sets or unsets only fields changed by
+        a callback. Fields untouched by callback may be concurrently
+        modified by somebody else, so they should not be overwritten
+        :param prev_doc: document before the change
+        :param doc: changed document
+        :return: update dict
+        """
+        update = {}
+        missing = object()
+        for key in prev_doc.keys() | doc.keys():
+            value = doc.get(key, missing)
+            if key == '_id' or prev_doc.get(key, missing) == value:
+                continue
+
+            if value is missing:
+                update.setdefault('$unset', {})[key] = ''
+            else:
+                update.setdefault('$set', {})[key] = value
+
+        return update
+
+    def _flush_buffer(self, bulk_collection: Collection, buf: List[Tuple[dict, dict]]) -> List[Any]:
+        """
+        Write buffered documents and return ids of documents which
+        were not written because of concurrent modification
+        :param bulk_collection: collection to write to
+        :param buf: list of tuples (document before change, changed
+         document)
+        :return: list of document ids
+        """
+        if not flags.optimistic_concurrency:
+            ops = [ReplaceOne({'_id': doc['_id']}, doc, upsert=False) for _, doc in buf]
+            bulk_collection.bulk_write(ops, ordered=False)
+            return []
+
+        ops = [
+            UpdateOne(self._build_concurrency_filter(prev_doc, doc),
+                      self._build_concurrency_update(prev_doc, doc),
+                      upsert=False)
+            for prev_doc, doc in buf
+        ]
+        result = bulk_collection.bulk_write(ops, ordered=False)
+        if result.matched_count >= len(ops):
+            return []
+
+        # Bulk write result does not show which operations were
+        # matched, so find out documents whose changed fields don't
+        # contain values we have written
+        missing = object()
+        expected = {
+            doc['_id']: {k: doc.get(k, missing) for k in prev_doc.keys() | doc.keys()
+                         if prev_doc.get(k, missing) != doc.get(k, missing)}
+            for prev_doc, doc in buf
+        }
+        written_ids = set()
+        for doc in bulk_collection.find({'_id': {'$in': list(expected.keys())}}):
+            if all(doc.get(k, missing) == v for k, v in expected[doc['_id']].items()):
+                written_ids.add(doc['_id'])
+
+        return [doc_id for doc_id in expected.keys() if doc_id not in written_ids]
+
     def _get_embedded_paths(self) -> Generator[Tuple[Collection, list, list], None, None]:
         """
         Return dotpaths to fields of embedded documents found in db and
@@ -537,6 +788,9 @@ class FallbackDocumentUpdater(DocumentUpdater):
         super().__init__(updater.db, updater.document_type, updater.db_schema,
                          updater.field_name, updater.migration_policy, updater.document_cls)
         self._include_missed_fields = updater._include_missed_fields
+        self._snapshot = updater._snapshot
+        self._snapshot_condition = updater._snapshot_condition
+        self._lookup = updater._lookup
 
     def update_combined(self,
                         by_path_cb: Callable,
@@ -8,13 +8,13 @@ __all__ = [
 ]
 
 import inspect
-from typing import Type, Iterable, Optional, NamedTuple, Any
-
-from mongoengine import EmbeddedDocument
-from mongoengine.base import BaseDocument
+from typing import Type, Iterable, Optional, NamedTuple, Any, TYPE_CHECKING
 
 from .flags import EMBEDDED_DOCUMENT_NAME_PREFIX, DOCUMENT_NAME_SEPARATOR
 
+if TYPE_CHECKING:
+    from mongoengine.base import BaseDocument
+
 
 class _Unset:
     def __str__(self):
@@ -95,29 +95,24 @@ def get_closest_parent(target: Type, classes: Iterable[Type]) -> Type:
     :param classes:
     :return: the closest parent or None if not found
     """
-    target_mro = inspect.getmro(target)
-    res = None
-    min_distance = float('inf')
-    for parent in classes:
-        found = [x for x in enumerate(target_mro) if x[1] == parent]
-        if found:
-            distance, klass = found[0]
-            if distance == 0:  # Skip if klass is target
-                continue
-            if distance < min_distance:
-                res = klass
-                min_distance = distance
-
-    return res
-
-
-def get_document_type(document_cls: Type[BaseDocument]) -> Optional[str]:
+    classes = set(classes)
+    # Skip the first item since it is target itself
+    for klass in inspect.getmro(target)[1:]:
+        if klass in classes:
+            return klass
+
+    return None
+
+
+def get_document_type(document_cls: Type['BaseDocument']) -> Optional[str]:
     """
     Return document type for `document_type` parameter of Action
     :param document_cls: document class
     :return: document type or None if unable to get it (if document_cls
      is abstract)
     """
+    from mongoengine import EmbeddedDocument
+
     # Class name consisted of its name and all parent names separated
     # by dots, see mongoengine.base.DocumentMetaclass
     document_type = getattr(document_cls, '_class_name')
@@ -0,0 +1,227 @@
+__all__ = [
+    'ValidationBatch',
+    'get_current_validation',
+    'format_violation'
+]
+
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, List, NamedTuple, Dict, Tuple, Set
+
+from pymongo.collection import Collection
+
+from mongoengine_migrate import flags
+from mongoengine_migrate.exceptions import InconsistencyError
+
+log = logging.getLogger('mongoengine-migrate')
+
+#: Validation batch which is currently collecting or applying checks.
+#: Set during an action run
+_current_validation: ContextVar[Optional['ValidationBatch']] = \
+    ContextVar('current_validation', default=None)
+
+#: Key of action in pending actions list: (migration_name, action_number)
+ActionKey = Tuple[str, int]
+
+
+def get_current_validation() -> Optional['ValidationBatch']:
+    """Return validation batch which is currently active or None"""
+    return _current_validation.get()
+
+
+def format_violation(collection_name: str, db_field: str, bad_records: List[dict]) -> str:
+    """
+    Return error message about records with wrong field values
+    :param collection_name: collection name
+    :param db_field: field dotpath
+    :param bad_records: several records with wrong values
+    """
+    examples = (
+        f'{{_id: {x.get("_id", "unknown")},...{db_field}: {x.get(db_field, "unknown")}}}'
+        for x in bad_records
+    )
+    return f"Field {collection_name}.{db_field} in some records has wrong values. " \
+           f"First several examples: {','.join(examples)}"
+
+
+class _Check(NamedTuple):
+    collection: Collection
+    db_field: str
+    find_filter: dict
+
+
+class ValidationBatch:
+    """Strict policy checks of pending actions evaluated at once
+    before any write.
+
+    Actions are run in collecting mode first: database writes are
+    mocked and `check_empty_result` calls are recorded instead of
+    being executed. A check is taken to the batch only if the field it
+    checks was not modified by actions before. Then all checks of a
+    collection are evaluated by one aggregation with `$facet` stage,
+    and all violations are reported together.
+
+    During the real run checks which were taken to the batch are
+    skipped, the rest of them are executed as usual.
+    """
+    def __init__(self, examples_limit: int = 3):
+        """
+        :param examples_limit: how many wrong records to show for
+         every failed check
+        """
+        self.examples_limit = examples_limit
+        self._checks: Dict[ActionKey, List[_Check]] = {}
+        self._verified: Dict[ActionKey, Counter] = {}
+
+        self._action_key: Optional[ActionKey] = None
+        self._collecting = False
+        # Collections which were written by the current action
+        self._written_collections: Set[str] = set()
+        # Fields modified by previous actions {(collection_name, top_level_field), ...}
+        self._touched_fields: Set[Tuple[str, str]] = set()
+
+    @property
+    def collecting(self) -> bool:
+        """Whether checks are being recorded now"""
+        return self._collecting
+
+    @contextmanager
+    def collect(self, action_key: ActionKey):
+        """
+        Context manager in which checks made by an action are
+        recorded instead of being executed
+        :param action_key: (migration_name, action_number)
+        """
+        token = _current_validation.set(self)
+        self._action_key = action_key
+        self._collecting = True
+        self._written_collections = set()
+        try:
+            yield self
+        finally:
+            self._collecting = False
+            self._action_key = None
+            _current_validation.reset(token)
+
+    @contextmanager
+    def apply(self, action_key: ActionKey):
+        """
+        Context manager in which checks of an action which were
+        already evaluated by batch are skipped
+        :param action_key: (migration_name, action_number)
+        """
+        token = _current_validation.set(self)
+        self._action_key = action_key
+        try:
+            yield self
+        finally:
+            self._action_key = None
+            _current_validation.reset(token)
+
+    def touch(self, collection_name: str, db_field: Optional[str]):
+        """
+        Mark a field as modified by an action, so the further checks
+        of this field will not be taken to the batch
+        :param collection_name: collection name
+        :param db_field: field name. None means the whole collection
+        """
+        self._touched_fields.add((collection_name, db_field))
+
+    def mark_written(self, collection_name: str):
+        """Called on every mocked write made by an action"""
+        self._written_collections.add(collection_name)
+
+    def add(self, collection: Collection, db_field: str, find_filter: dict) -> bool:
+        """
+        Record a check made by the current action
+        :param collection: collection to check
+        :param db_field: field dotpath
+        :param find_filter: filter which must find nothing
+        :return: True if check was taken to batch
+        """
+        # Collection could be wrapped by query tracer in collecting mode
+        collection = getattr(collection, '__wrapped__', collection)
+        name = collection.name
+        top_field = db_field.split('.')[0]
+        if name in self._written_collections \
+                or (name, None) in self._touched_fields \
+                or (name, top_field) in self._touched_fields:
+            log.debug('> Check of %s.%s is made after modification, it will be run in place',
+                      name, db_field)
+            return False
+
+        self._checks.setdefault(self._action_key, []).append(_Check(collection,
+                                                                    db_field,
+                                                                    find_filter))
+        self._verified.setdefault(self._action_key, Counter())[
+            self._check_id(name, db_field, find_filter)
+        ] += 1
+        return True
+
+    def skip(self, collection: Collection, db_field: str, find_filter: dict) -> bool:
+        """
+        Return True if a check made by the current action was already
+        evaluated by batch
+        """
+        verified = self._verified.get(self._action_key)
+        if not verified:
+            return False
+
+        check_id = self._check_id(collection.name, db_field, find_filter)
+        if verified[check_id] > 0:
+            verified[check_id] -= 1
+            return True
+
+        return False
+
+    def run(self):
+        """
+        Evaluate all recorded checks, one aggregation per collection
+        :raises InconsistencyError: if any check has failed. Message
+         contains all violations found
+        """
+        by_collection: Dict[str, List[_Check]] = {}
+        for checks in self._checks.values():
+            for check in checks:
+                by_collection.setdefault(check.collection.name, []).append(check)
+
+        violations = []
+        for collection_name, checks in by_collection.items():
+            log.debug('> Running %d checks on collection %s', len(checks), collection_name)
+            for check, bad_records in zip(checks, self._find_violations(checks)):
+                if bad_records:
+                    violations.append(format_violation(collection_name,
+                                                       check.db_field,
+                                                       bad_records))
+
+        if violations:
+            raise InconsistencyError('\n'.join(violations))
+
+    def _find_violations(self, checks: List[_Check]) -> List[List[dict]]:
+        from mongoengine_migrate.mongo import mongo_version_below
+
+        collection = checks[0].collection
+        if flags.mongo_version is not None and mongo_version_below('3.4'):
+            # $facet is not supported
+            return [list(collection.find(c.find_filter, limit=self.examples_limit))
+                    for c in checks]
+
+        pipeline = [
+            {'$match': {'$or': [c.find_filter for c in checks]}},
+            {'$facet': {
+                str(num): [
+                    {'$match': c.find_filter},
+                    {'$limit': self.examples_limit},
+                    {'$project': {c.db_field: 1}}
+                ]
+                for num, c in enumerate(checks)
+            }}
+        ]
+        res = next(collection.aggregate(pipeline), {})
+        return [res.get(str(num), []) for num in range(len(checks))]
+
+    @staticmethod
+    def _check_id(collection_name: str, db_field: str, find_filter: dict) -> str:
+        return f'{collection_name}:{db_field}:{find_filter!r}'
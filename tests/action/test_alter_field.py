@@ -8,6 +8,7 @@ import pytest
 import bson
 from bson import ObjectId
 
+import mongoengine_migrate.flags as flags
 from mongoengine_migrate.actions import AlterField
 from mongoengine_migrate.exceptions import SchemaError, MigrationError, InconsistencyError
 from mongoengine_migrate.graph import MigrationPolicy
@@ -210,12 +211,163 @@ class TestAlterFieldCommonDefault:
         assert dump_db() == dump
 
 
+def get_unique_indexes(collection):
+    return {tuple(k for k, _ in info['key']): bool(info.get('sparse'))
+            for info in collection.index_information().values()
+            if info.get('unique')}
+
+
 class TestAlterFieldCommonUnique:
-    pass  # TODO
+    def test_forward__for_document__should_build_unique_index(
+            self, load_fixture, test_db, dump_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        dump = dump_db()
+
+        action = AlterField('Schema1Doc1', 'doc1_int', unique=True)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert get_unique_indexes(test_db['schema1_doc1']) == {('doc1_int', ): False}
+        assert dump_db() == dump
+
+    def test_forward__for_embedded_document__should_build_index_on_embedded_paths(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+
+        action = AlterField('~Schema1EmbDoc1', 'embdoc1_int', unique=True, sparse=True)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        indexes = get_unique_indexes(test_db['schema1_doc1'])
+        assert indexes[('doc1_emb_embdoc1.embdoc1_int', )] is True
+        assert indexes[('doc1_emblist_embdoc1.embdoc1_int', )] is True
+
+    def test_forward__if_duplicates_and_strict_policy__should_raise_error(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        test_db['schema1_doc1'].update_many({}, {'$set': {'doc1_int': 1}})
+
+        action = AlterField('Schema1Doc1', 'doc1_int', unique=True)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        with pytest.raises(InconsistencyError):
+            action.run_forward()
+
+        assert get_unique_indexes(test_db['schema1_doc1']) == {}
+
+    def test_forward__if_field_is_unset_in_several_documents__should_raise_error(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+
+        action = AlterField('Schema1Doc1', 'doc1_str_empty', unique=True)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        with pytest.raises(InconsistencyError):
+            action.run_forward()
+
+    def test_forward__if_duplicates_and_relaxed_policy__should_not_build_index(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        test_db['schema1_doc1'].update_many({}, {'$set': {'doc1_int': 1}})
+
+        action = AlterField('Schema1Doc1', 'doc1_int', unique=True)
+        action.prepare(test_db, schema, MigrationPolicy.relaxed)
+
+        action.run_forward()
+
+        assert get_unique_indexes(test_db['schema1_doc1']) == {}
+
+    def test_forward_backward__should_drop_unique_index(self, load_fixture, test_db, dump_db):
+        schema = load_fixture('schema1').get_schema()
+        dump = dump_db()
+
+        action = AlterField('Schema1Doc1', 'doc1_int', unique=True)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+        action.run_forward()
+        action.cleanup()
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_backward()
+
+        assert get_unique_indexes(test_db['schema1_doc1']) == {}
+        assert dump_db() == dump
 
 
 class TestAlterFieldCommonUniqueWith:
-    pass  # TODO
+    def test_forward__for_document__should_build_unique_index_with_fields(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+
+        action = AlterField('Schema1Doc1', 'doc1_int', unique=True, unique_with=['doc1_str'])
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert get_unique_indexes(test_db['schema1_doc1']) == {('doc1_int', 'doc1_str'): False}
+
+    def test_forward__if_unique_with_changed__should_rebuild_index(self, load_fixture, test_db):
+        schema = load_fixture('schema1').get_schema()
+        schema['Schema1Doc1']['doc1_int'].update(unique=True, unique_with=['doc1_str'])
+        test_db['schema1_doc1'].create_index([('doc1_int', 1), ('doc1_str', 1)], unique=True)
+
+        action = AlterField('Schema1Doc1', 'doc1_int', unique_with=['doc1_long'])
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert get_unique_indexes(test_db['schema1_doc1']) == {('doc1_int', 'doc1_long'): False}
+
+    def test_forward__if_duplicates_and_strict_policy__should_raise_error(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        test_db['schema1_doc1'].update_many({}, {'$set': {'doc1_int': 1, 'doc1_str': 'a'}})
+
+        action = AlterField('Schema1Doc1', 'doc1_int', unique=True, unique_with=['doc1_str'])
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        with pytest.raises(InconsistencyError):
+            action.run_forward()
+
+    def test_forward__if_duplicates_with_new_fields__should_keep_previous_index(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        schema['Schema1Doc1']['doc1_int'].update(unique=True, unique_with=['doc1_str'])
+        test_db['schema1_doc1'].create_index([('doc1_int', 1), ('doc1_str', 1)], unique=True)
+        test_db['schema1_doc1'].update_many({}, {'$set': {'doc1_long': 1}})
+        test_db['schema1_doc1'].update_many({'doc1_int': {'$gt': 1}}, {'$set': {'doc1_int': 1}})
+
+        action = AlterField('Schema1Doc1', 'doc1_int', unique_with=['doc1_long'])
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        with pytest.raises(InconsistencyError):
+            action.run_forward()
+
+        assert get_unique_indexes(test_db['schema1_doc1']) == {('doc1_int', 'doc1_str'): False}
+
+    def test_forward__if_document_inherited__should_prepend_cls_to_index(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        schema['Schema1Doc1'].parameters['inherit'] = True
+
+        action = AlterField('Schema1Doc1', 'doc1_int', unique=True, unique_with=['doc1_str'])
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert get_unique_indexes(test_db['schema1_doc1']) == {
+            ('_cls', 'doc1_int', 'doc1_str'): False
+        }
 
 
 class TestAlterFieldCommonPrimaryKey:
@@ -243,6 +395,16 @@ class TestAlterFieldCommonPrimaryKey:
         with pytest.raises(InconsistencyError):
             action.run_forward()
 
+    def test_forward__if_field_has_duplicates__raise_error(self, load_fixture, test_db):
+        schema = load_fixture('schema1').get_schema()
+        test_db['schema1_doc1'].update_many({}, {'$set': {'doc1_str': 'test!'}})
+
+        action = AlterField('Schema1Doc1', 'doc1_str', primary_key=True)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        with pytest.raises(InconsistencyError):
+            action.run_forward()
+
     def test_forward_backward__should_do_nothing(self, load_fixture, test_db, dump_db):
         schema = load_fixture('schema1').get_schema()
 
@@ -791,6 +953,24 @@ class TestAlterFieldStringMaxLength:
 
         assert dump_db() == expect
 
+    def test_forward__if_old_mongodb__should_cut_off_string_in_python(
+            self, load_fixture, test_db, dump_db, monkeypatch
+    ):
+        monkeypatch.setattr(flags, 'mongo_version', '4.0')
+        schema = load_fixture('schema1').get_schema()
+
+        expect = dump_db()
+        parser = jsonpath_rw.parse('schema1_doc1[*]')
+        for doc in parser.find(expect):
+            doc.value['doc1_str'] = 'st'
+
+        action = AlterField('Schema1Doc1', 'doc1_str', max_length=2)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert dump_db() == expect
+
     def test_forward__for_embedded_document_if_string_length_more_max_length__should_cut_off_string(
             self, load_fixture, test_db, dump_db
     ):
@@ -1260,6 +1440,24 @@ class TestAlterFieldListMaxLength:
 
         assert dump_db() == expect
 
+    def test_forward__for_document_if_zero_length__should_make_empty_lists(
+            self, load_fixture, test_db, dump_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+
+        expect = dump_db()
+        parser = jsonpath_rw.parse('schema1_doc1[*]')
+        for doc in parser.find(expect):
+            if 'doc1_list' in doc.value:
+                doc.value['doc1_list'] = []
+
+        action = AlterField('Schema1Doc1', 'doc1_list', max_length=0)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert dump_db() == expect
+
     def test_forward__for_embedded__should_cut_off_a_list(self, load_fixture, test_db, dump_db):
         schema = load_fixture('schema1').get_schema()
 
@@ -1392,6 +1590,61 @@ class TestAlterFieldReferenceDbref:
         assert dump_db() == expect
 
 
+class TestAlterFieldReferenceTargetDoctype:
+    @pytest.fixture(autouse=True)
+    def setup(self, test_db):
+        test_db['schema1_doc1'].update_one({'_id': ObjectId('000000000000000000000001')}, {
+            '$set': {'doc1_ref_self': ObjectId('000000000000000000000002')}
+        })
+        test_db['schema1_doc1'].update_one({'_id': ObjectId('000000000000000000000002')}, {
+            '$set': {'doc1_ref_self': bson.DBRef('schema1_doc1',
+                                                 ObjectId('000000000000000000000003'))}
+        })
+
+    def test_forward__if_references_exist__should_do_nothing(
+            self, load_fixture, test_db, dump_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        expect = dump_db()
+
+        action = AlterField('Schema1Doc1', 'doc1_ref_self', target_doctype='Schema1Doc1')
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert dump_db() == expect
+
+    def test_forward__if_dangling_references_and_strict_policy__should_raise_error(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        test_db['schema1_doc1'].update_one({'_id': ObjectId('000000000000000000000003')}, {
+            '$set': {'doc1_ref_self': ObjectId('000000000000000000000099')}
+        })
+
+        action = AlterField('Schema1Doc1', 'doc1_ref_self', target_doctype='Schema1Doc1')
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        with pytest.raises(InconsistencyError):
+            action.run_forward()
+
+    def test_forward__if_dangling_references_and_relaxed_policy__should_do_nothing(
+            self, load_fixture, test_db, dump_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        test_db['schema1_doc1'].update_one({'_id': ObjectId('000000000000000000000003')}, {
+            '$set': {'doc1_ref_self': ObjectId('000000000000000000000099')}
+        })
+        expect = dump_db()
+
+        action = AlterField('Schema1Doc1', 'doc1_ref_self', target_doctype='Schema1Doc1')
+        action.prepare(test_db, schema, MigrationPolicy.relaxed)
+
+        action.run_forward()
+
+        assert dump_db() == expect
+
+
 class TestAlterFieldCachedReferenceFields:
     def test_forward__for_document_when_fields_list_become_bigger__should_do_nothing(
             self, load_fixture, test_db, dump_db
@@ -1417,6 +1670,29 @@ class TestAlterFieldCachedReferenceFields:
 
         assert dump_db() == expect
 
+    def test_forward__for_document_when_new_fields_added__should_fill_them_from_referenced_docs(
+            self, load_fixture, test_db, dump_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        schema['Schema1Doc1']['doc1_cachedref_self']['fields'] = ['doc1_int']
+
+        doc = test_db['schema1_doc1'].find_one(ObjectId(f'000000000000000000000001'))
+        doc['doc1_cachedref_self'] = {'_id': ObjectId('000000000000000000000002'), 'doc1_int': 2}
+        test_db['schema1_doc1'].replace_one({'_id': ObjectId(f'000000000000000000000001')}, doc)
+
+        expect = dump_db()
+        parser = jsonpath_rw.parse('schema1_doc1[*]')
+        for doc in parser.find(expect):
+            if doc.value['_id'] == ObjectId(f'000000000000000000000001'):
+                doc.value['doc1_cachedref_self']['doc1_str'] = 'str2'
+
+        action = AlterField('Schema1Doc1', 'doc1_cachedref_self', fields=['doc1_int', 'doc1_str'])
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert dump_db() == expect
+
     def test_forward__for_document_when_fields_list_become_smaller__should_remove_extra_fields(
             self, load_fixture, test_db, dump_db
     ):
@@ -0,0 +1,133 @@
+from copy import deepcopy
+
+import pytest
+
+from mongoengine_migrate.actions import CreateIndex, DropIndex, build_actions_chain
+from mongoengine_migrate.graph import MigrationPolicy
+from mongoengine_migrate.indexes import IndexBuilds
+from mongoengine_migrate.schema import Schema
+
+
+@pytest.fixture
+def left_schema():
+    return Schema().load({
+        'Doc1': {
+            'fields': {},
+            'parameters': {'collection': 'doc1'},
+            'indexes': [{'name': 'field1_1', 'fields': [['field1', 1]]}]
+        }
+    })
+
+
+class TestCreateIndex:
+    def test_build_object__if_index_was_added__should_return_object(self, left_schema):
+        right_schema = deepcopy(left_schema)
+        right_schema['Doc1'].indexes['field2'] = {'fields': [['field2', -1]], 'sparse': True}
+
+        res = CreateIndex.build_object('Doc1', 'field2', left_schema, right_schema)
+
+        assert isinstance(res, CreateIndex)
+        assert res.index_name == 'field2'
+        assert res.parameters == {'fields': [['field2', -1]], 'sparse': True}
+
+    def test_build_object__if_index_exists__should_return_none(self, left_schema):
+        right_schema = deepcopy(left_schema)
+
+        assert CreateIndex.build_object('Doc1', 'field1_1', left_schema, right_schema) is None
+
+    def test_to_schema_patch__should_add_index(self, left_schema):
+        action = CreateIndex('Doc1', 'field2', fields=[['field2', -1]], sparse=True)
+        expect = deepcopy(left_schema)
+        expect['Doc1'].indexes['field2'] = {'fields': [['field2', -1]], 'sparse': True}
+
+        left_schema.patch(action.to_schema_patch(left_schema))
+
+        assert left_schema == expect
+
+    def test_forward__should_create_index(self, test_db, left_schema):
+        action = CreateIndex('Doc1', 'field2', fields=[['field2', -1]], sparse=True)
+        action.prepare(test_db, left_schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        info = test_db['doc1'].index_information()
+        assert info['field2']['key'] == [('field2', -1)]
+        assert info['field2']['sparse'] is True
+
+    def test_forward__if_builds_are_collecting__should_defer_build(self, test_db, left_schema):
+        action = CreateIndex('Doc1', 'field2', fields=[['field2', -1]])
+        action.prepare(test_db, left_schema, MigrationPolicy.strict)
+        index_builds = IndexBuilds()
+
+        with index_builds.collecting():
+            action.run_forward()
+
+        assert len(index_builds) == 1
+        assert 'field2' not in test_db['doc1'].index_information()
+
+        index_builds.run()
+
+        assert 'field2' in test_db['doc1'].index_information()
+
+    def test_backward__should_drop_index(self, test_db, left_schema):
+        test_db['doc1'].create_index([('field2', -1)], name='field2')
+        action = CreateIndex('Doc1', 'field2', fields=[['field2', -1]])
+        action.prepare(test_db, left_schema, MigrationPolicy.strict)
+
+        action.run_backward()
+
+        assert 'field2' not in test_db['doc1'].index_information()
+
+
+class TestDropIndex:
+    def test_build_object__if_index_was_changed__should_return_object(self, left_schema):
+        right_schema = deepcopy(left_schema)
+        right_schema['Doc1'].indexes['field1_1']['unique'] = True
+
+        res = DropIndex.build_object('Doc1', 'field1_1', left_schema, right_schema)
+
+        assert isinstance(res, DropIndex)
+        assert res.index_name == 'field1_1'
+
+    def test_build_object__if_document_was_dropped__should_return_object(self, left_schema):
+        res = DropIndex.build_object('Doc1', 'field1_1', left_schema, Schema())
+
+        assert isinstance(res, DropIndex)
+
+    def test_forward__should_drop_index(self, test_db, left_schema):
+        test_db['doc1'].create_index([('field1', 1)])
+        action = DropIndex('Doc1', 'field1_1')
+        action.prepare(test_db, left_schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert 'field1_1' not in test_db['doc1'].index_information()
+
+    def test_forward__if_index_does_not_exist__should_do_nothing(self, test_db, left_schema):
+        test_db['doc1'].insert_one({'field1': 'a'})
+        action = DropIndex('Doc1', 'field1_1')
+        action.prepare(test_db, left_schema, MigrationPolicy.strict)
+
+        action.run_forward()
+
+        assert list(test_db['doc1'].index_information()) == ['_id_']
+
+    def test_backward__should_create_index_from_left_schema(self, test_db, left_schema):
+        action = DropIndex('Doc1', 'field1_1')
+        action.prepare(test_db, left_schema, MigrationPolicy.strict)
+
+        action.run_backward()
+
+        assert test_db['doc1'].index_information()['field1_1']['key'] == [('field1', 1)]
+
+
+def test_build_actions_chain__if_index_was_changed__should_drop_and_create_it(left_schema):
+    right_schema = deepcopy(left_schema)
+    right_schema['Doc1'].indexes['field1_1']['unique'] = True
+
+    res = build_actions_chain(left_schema, right_schema)
+
+    assert [a.to_python_expr() for a in res] == [
+        "DropIndex('Doc1', 'field1_1')",
+        "CreateIndex('Doc1', 'field1_1', fields=[['field1', 1]], unique=True)"
+    ]
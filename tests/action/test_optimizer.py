@@ -0,0 +1,126 @@
+import pytest
+
+import mongoengine_migrate.flags as flags
+from mongoengine_migrate.actions import (
+    ActionsOptimizer,
+    AlterField,
+    CreateField,
+    DropField,
+    RenameField,
+    RunPython,
+)
+from mongoengine_migrate.schema import Schema
+
+
+def string_field_params(db_field):
+    return dict(choices=None, db_field=db_field, default=None, max_length=None, min_length=None,
+                null=False, primary_key=False, regex=None, required=False, sparse=False,
+                type_key='StringField', unique=False, unique_with=None)
+
+
+@pytest.fixture
+def left_schema():
+    return Schema().load({
+        'Doc1': {
+            'fields': {'field1': string_field_params('field1')},
+            'parameters': {'collection': 'doc1'}
+        }
+    })
+
+
+def optimize(left_schema, actions):
+    items = [(('0001_auto', num), action) for num, action in enumerate(actions, start=1)]
+    return ActionsOptimizer(left_schema).optimize(items)
+
+
+class TestActionsOptimizer:
+    def test_optimize__if_field_created_and_dropped__should_skip_all_data_passes(
+            self, left_schema
+    ):
+        actions = [
+            CreateField('Doc1', 'field2', **string_field_params('field2')),
+            RenameField('Doc1', 'field2', new_name='field3'),
+            AlterField('Doc1', 'field3', max_length=10, db_field='f3'),
+            DropField('Doc1', 'field3'),
+        ]
+
+        res = optimize(left_schema, actions)
+
+        assert res == {('0001_auto', 1): None, ('0001_auto', 3): None, ('0001_auto', 4): None}
+
+    def test_optimize__if_existing_field_altered_and_dropped__should_skip_alterations(
+            self, left_schema
+    ):
+        actions = [
+            AlterField('Doc1', 'field1', db_field='f1'),
+            AlterField('Doc1', 'field1', max_length=10, db_field='f1'),
+            AlterField('Doc1', 'field1', required=True, default='a'),
+            DropField('Doc1', 'field1'),
+        ]
+
+        res = optimize(left_schema, actions)
+
+        # db_field change must be performed, so that the field could
+        # be dropped by its new name
+        assert res == {('0001_auto', 2): None, ('0001_auto', 3): None}
+
+    def test_optimize__if_snapshot_enabled__should_not_skip_alterations_of_dropped_field(
+            self, left_schema, monkeypatch
+    ):
+        monkeypatch.setattr(flags, 'snapshot', True)
+        actions = [
+            AlterField('Doc1', 'field1', max_length=10),
+            DropField('Doc1', 'field1'),
+        ]
+
+        res = optimize(left_schema, actions)
+
+        assert res == {}
+
+    def test_optimize__if_type_changes_are_lossless__should_collapse_them(self, left_schema):
+        actions = [
+            AlterField('Doc1', 'field1', type_key='IntField', min_value=None, max_value=None),
+            AlterField('Doc1', 'field1', type_key='LongField'),
+            AlterField('Doc1', 'field1', type_key='DecimalField', force_string=False,
+                       precision=2, rounding='ROUND_HALF_UP'),
+        ]
+
+        res = optimize(left_schema, actions)
+
+        assert res.keys() == {('0001_auto', 2), ('0001_auto', 3)}
+        assert res[('0001_auto', 3)] is None
+        assert isinstance(res[('0001_auto', 2)], AlterField)
+        assert res[('0001_auto', 2)].field_name == 'field1'
+        assert res[('0001_auto', 2)].parameters == {'type_key': 'DecimalField'}
+
+    def test_optimize__if_intermediate_type_change_is_not_lossless__should_not_collapse(self, left_schema):
+        actions = [
+            AlterField('Doc1', 'field1', type_key='FloatField', min_value=None, max_value=None),
+            AlterField('Doc1', 'field1', type_key='IntField'),
+        ]
+
+        res = optimize(left_schema, actions)
+
+        assert res == {}
+
+    def test_optimize__if_run_python_between__should_not_optimize_across_it(self, left_schema):
+        actions = [
+            CreateField('Doc1', 'field2', **string_field_params('field2')),
+            RunPython('Doc1', forward_func=lambda db, collection, schema: None),
+            DropField('Doc1', 'field2'),
+        ]
+
+        res = optimize(left_schema, actions)
+
+        assert res == {}
+
+    def test_optimize__should_not_modify_left_schema(self, left_schema):
+        actions = [
+            CreateField('Doc1', 'field2', **string_field_params('field2')),
+            DropField('Doc1', 'field2'),
+        ]
+        expect = left_schema.fingerprint()
+
+        optimize(left_schema, actions)
+
+        assert left_schema.fingerprint() == expect
@@ -1,11 +1,15 @@
 import itertools
 
 import pytest
+from bson import ObjectId, DBRef
 
-from mongoengine_migrate.exceptions import MigrationError
+from mongoengine_migrate.exceptions import MigrationError, InconsistencyError
 from mongoengine_migrate.fields import converters
+from mongoengine_migrate.fields.common import ReferenceFieldHandler
+from mongoengine_migrate.mongo import version_tuple
 from mongoengine_migrate.updater import DocumentUpdater
 from mongoengine_migrate.graph import MigrationPolicy
+from mongoengine_migrate.utils import Diff
 
 
 def test_deny__should_raise_error(test_db, load_fixture):
@@ -296,3 +300,203 @@ def test_to_decimal__if_value_does_not_contain_number__should_raise_error(
 
     with pytest.raises(MigrationError):
         converters.to_decimal(updater)
+
+
+def test_to_dynamic_ref__should_fetch_class_names_of_referenced_documents(
+        test_db, load_fixture, dump_db
+):
+    schema = load_fixture('schema1').get_schema()
+    updater = DocumentUpdater(test_db, 'Schema1Doc1', schema, 'doc1_ref_self',
+                              MigrationPolicy.strict)
+    collection = test_db['schema1_doc1']
+    collection.update_one({'_id': ObjectId(f'{1:024}')}, {'$set': {
+        'doc1_ref_self': ObjectId(f'{2:024}')
+    }})
+    collection.update_one({'_id': ObjectId(f'{2:024}')}, {'$set': {
+        'doc1_ref_self': DBRef('schema1_doc1', ObjectId(f'{3:024}'))
+    }})
+    collection.update_one({'_id': ObjectId(f'{3:024}')}, {'$set': {
+        'doc1_ref_self': DBRef('unknown', ObjectId(f'{4:024}'))
+    }})
+
+    converters.to_dynamic_ref(updater)
+
+    ids = [ObjectId(f'{i:024}') for i in (1, 2, 3)]
+    refs = {doc['_id']: doc['doc1_ref_self'] for doc in collection.find({'_id': {'$in': ids}})}
+    assert refs == {
+        ObjectId(f'{1:024}'): {
+            '_cls': 'Schema1Doc1', '_ref': DBRef('schema1_doc1', ObjectId(f'{2:024}'))
+        },
+        ObjectId(f'{2:024}'): {
+            '_cls': 'Schema1Doc1', '_ref': DBRef('schema1_doc1', ObjectId(f'{3:024}'))
+        },
+        ObjectId(f'{3:024}'): DBRef('unknown', ObjectId(f'{4:024}')),  # Class is unknown
+    }
+
+
+#: Id of referenced document and the reference to it in every form
+REF_ID = ObjectId(f'{2:024}')
+REF_FORMS = {
+    'object_id': REF_ID,
+    'string': str(REF_ID),
+    'dbref': DBRef('schema1_doc1', REF_ID),
+    'manual_ref': {'_id': REF_ID},
+    'dynamic_ref': {'_cls': 'Schema1Doc1', '_ref': DBRef('schema1_doc1', REF_ID)},
+}
+
+
+@pytest.fixture
+def mongo_50(test_db):
+    # flags.mongo_version is faked by test_db, so ask the server
+    version = test_db.client.server_info()['version']
+    if version_tuple(version) < version_tuple('5.0'):
+        pytest.skip('MongoDB>=5.0 is required')
+
+
+def set_doc_reference(test_db, value):
+    """Set doc1_ref_self of document with id 1"""
+    test_db['schema1_doc1'].update_one({'_id': ObjectId(f'{1:024}')},
+                                       {'$set': {'doc1_ref_self': value}})
+
+
+def set_embedded_reference(test_db, value):
+    """Set embdoc1_ref_doc1 of both items of doc1_emblist_embdoc1 of document with id 3"""
+    collection = test_db['schema1_doc1']
+    items = collection.find_one({'_id': ObjectId(f'{3:024}')})['doc1_emblist_embdoc1']
+    for item in items:
+        item['embdoc1_ref_doc1'] = value
+    collection.update_one({'_id': ObjectId(f'{3:024}')},
+                          {'$set': {'doc1_emblist_embdoc1': items}})
+
+
+def convert_doc_reference(test_db, load_fixture, dump_db, converter, source, target):
+    schema = load_fixture('schema1').get_schema()
+    updater = DocumentUpdater(test_db, 'Schema1Doc1', schema, 'doc1_ref_self',
+                              MigrationPolicy.strict)
+    set_doc_reference(test_db, source)
+    expect = dump_db()
+    for doc in expect['schema1_doc1']:
+        if doc['_id'] == ObjectId(f'{1:024}'):
+            doc['doc1_ref_self'] = target
+
+    converter(updater)
+
+    assert dump_db() == expect
+
+
+def convert_embedded_reference(test_db, load_fixture, dump_db, converter, source, target):
+    schema = load_fixture('schema1').get_schema()
+    updater = DocumentUpdater(test_db, '~Schema1EmbDoc1', schema, 'embdoc1_ref_doc1',
+                              MigrationPolicy.strict)
+    set_embedded_reference(test_db, source)
+    expect = dump_db()
+    for doc in expect['schema1_doc1']:
+        if doc['_id'] == ObjectId(f'{3:024}'):
+            for item in doc['doc1_emblist_embdoc1']:
+                item['embdoc1_ref_doc1'] = target
+
+    converter(updater)
+
+    assert dump_db() == expect
+
+
+@pytest.mark.parametrize('convert', (convert_doc_reference, convert_embedded_reference))
+@pytest.mark.parametrize('source_form', REF_FORMS.keys())
+def test_to_object_id__should_convert_every_reference_form(
+        test_db, load_fixture, dump_db, mongo_50, convert, source_form
+):
+    convert(test_db, load_fixture, dump_db,
+            converters.to_object_id, REF_FORMS[source_form], REF_ID)
+
+
+@pytest.mark.parametrize('convert', (convert_doc_reference, convert_embedded_reference))
+@pytest.mark.parametrize('source_form', REF_FORMS.keys())
+def test_to_manual_ref__should_convert_every_reference_form(
+        test_db, load_fixture, dump_db, mongo_50, convert, source_form
+):
+    convert(test_db, load_fixture, dump_db,
+            converters.to_manual_ref, REF_FORMS[source_form], {'_id': REF_ID})
+
+
+@pytest.mark.parametrize('convert', (convert_doc_reference, convert_embedded_reference))
+@pytest.mark.parametrize('source_form', REF_FORMS.keys())
+def test_to_dbref__should_convert_every_reference_form(
+        test_db, load_fixture, dump_db, mongo_50, convert, source_form
+):
+    convert(test_db, load_fixture, dump_db,
+            converters.to_dbref, REF_FORMS[source_form], DBRef('schema1_doc1', REF_ID))
+
+
+@pytest.mark.parametrize('converter', (
+        converters.to_object_id,
+        converters.to_manual_ref,
+        converters.to_dbref
+))
+@pytest.mark.parametrize('value', ('str1', 1, {'key': REF_ID}))
+def test_reference_convertion__if_value_is_not_reference__should_raise_error(
+        test_db, load_fixture, mongo_50, converter, value
+):
+    schema = load_fixture('schema1').get_schema()
+    updater = DocumentUpdater(test_db, 'Schema1Doc1', schema, 'doc1_ref_self',
+                              MigrationPolicy.strict)
+    set_doc_reference(test_db, value)
+
+    with pytest.raises(InconsistencyError):
+        converter(updater)
+
+
+@pytest.mark.parametrize('value', ('str1', 1, {'key': REF_ID}))
+def test_reference_convertion__if_value_is_not_reference_in_embedded_array__should_raise_error(
+        test_db, load_fixture, mongo_50, value
+):
+    schema = load_fixture('schema1').get_schema()
+    updater = DocumentUpdater(test_db, '~Schema1EmbDoc1', schema, 'embdoc1_ref_doc1',
+                              MigrationPolicy.strict)
+    set_embedded_reference(test_db, value)
+
+    with pytest.raises(InconsistencyError):
+        converters.to_object_id(updater)
+
+
+def change_dbref(test_db, load_fixture, document_type, field_name, dbref):
+    schema = load_fixture('schema1').get_schema()
+    field_schema = schema[document_type][field_name]
+    handler = ReferenceFieldHandler(test_db, document_type, schema, field_schema,
+                                    dict(field_schema, dbref=dbref), MigrationPolicy.strict)
+    updater = DocumentUpdater(test_db, document_type, schema, field_name, MigrationPolicy.strict)
+
+    handler.change_dbref(updater, Diff(old=not dbref, new=dbref, key='dbref'))
+
+
+@pytest.mark.parametrize('document_type,field_name,set_reference', (
+        ('Schema1Doc1', 'doc1_ref_self', set_doc_reference),
+        ('~Schema1EmbDoc1', 'embdoc1_ref_doc1', set_embedded_reference),
+))
+def test_change_dbref__if_true__should_convert_object_id_to_dbref(
+        test_db, load_fixture, dump_db, mongo_50, document_type, field_name, set_reference
+):
+    load_fixture('schema1')
+    set_reference(test_db, DBRef('schema1_doc1', REF_ID))
+    expect = dump_db()
+    set_reference(test_db, REF_ID)
+
+    change_dbref(test_db, load_fixture, document_type, field_name, True)
+
+    assert dump_db() == expect
+
+
+@pytest.mark.parametrize('document_type,field_name,set_reference', (
+        ('Schema1Doc1', 'doc1_ref_self', set_doc_reference),
+        ('~Schema1EmbDoc1', 'embdoc1_ref_doc1', set_embedded_reference),
+))
+def test_change_dbref__if_false__should_convert_dbref_to_object_id(
+        test_db, load_fixture, dump_db, mongo_50, document_type, field_name, set_reference
+):
+    load_fixture('schema1')
+    set_reference(test_db, REF_ID)
+    expect = dump_db()
+    set_reference(test_db, DBRef('schema1_doc1', REF_ID))
+
+    change_dbref(test_db, load_fixture, document_type, field_name, False)
+
+    assert dump_db() == expect
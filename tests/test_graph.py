@@ -0,0 +1,195 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from mongoengine_migrate.exceptions import MigrationGraphError
+from mongoengine_migrate.graph import Migration, MigrationsGraph
+
+
+@pytest.fixture
+def migrations():
+    """
+      _____(01)_____
+     V      V       V
+    (02)   (03)    (04)__
+     |      |      V     V
+      \\     /    (05)  (06)
+       \\   /_____/  \\  /
+        V VV         VV
+        (07)        (08)
+           \\___  ___/
+               VV
+              (09)
+    """
+    return [
+        Migration(name='01', dependencies=[]),
+        Migration(name='02', dependencies=['01']),
+        Migration(name='03', dependencies=['01']),
+        Migration(name='04', dependencies=['01']),
+        Migration(name='05', dependencies=['04']),
+        Migration(name='06', dependencies=['04']),
+        Migration(name='07', dependencies=['02', '03', '05']),
+        Migration(name='08', dependencies=['05', '06']),
+        Migration(name='09', dependencies=['07', '08']),
+    ]
+
+
+@pytest.fixture
+def graph(migrations):
+    graph = MigrationsGraph()
+    for m in migrations:
+        graph.add(m)
+    return graph
+
+
+class TestMigrationsGraph:
+    def test_initial_last__should_return_initial_and_last_migrations(self, graph):
+        assert graph.initial.name == '01'
+        assert graph.last.name == '09'
+
+    def test_order__should_return_migrations_in_applying_order(self, graph):
+        expect = ['01', '02', '03', '04', '05', '07', '06', '08', '09']
+
+        assert [m.name for m in graph.order] == expect
+        assert [m.name for m in graph] == expect
+        assert [graph.position(name) for name in expect] == list(range(len(expect)))
+
+    def test_reversed_order__should_return_migrations_in_reverting_order(self, graph):
+        expect = ['09', '07', '02', '03', '08', '05', '06', '04', '01']
+
+        assert [m.name for m in graph.reversed_order] == expect
+        assert [m.name for m in reversed(graph)] == expect
+
+    def test_walk__should_filter_applied_migrations(self, graph):
+        for name in ('01', '02', '03', '04', '08'):
+            graph.migrations[name].applied = True
+
+        assert [m.name for m in graph.walk_down(graph.initial)] == ['05', '07', '06', '09']
+        assert [m.name for m in graph.walk_up(graph.last)] == ['02', '03', '08', '04', '01']
+
+    @pytest.mark.parametrize('from_node,walk_down_expect,walk_up_expect', (
+        ('04', ['04', '05', '06', '08'], []),
+        ('08', [], ['08', '06']),
+    ))
+    def test_walk__if_started_from_middle__should_traverse_graph(
+            self, graph, from_node, walk_down_expect, walk_up_expect
+    ):
+        from_node = graph.migrations[from_node]
+
+        assert [m.name for m in graph.walk_down(from_node, False)] == walk_down_expect
+        assert [m.name for m in graph.walk_up(from_node, False)] == walk_up_expect
+
+    def test_add__should_reset_cached_order(self, graph):
+        assert graph.last.name == '09'
+
+        graph.add(Migration(name='10', dependencies=['09']))
+
+        assert graph.last.name == '10'
+        assert graph.order[-1].name == '10'
+        assert graph.position('10') == 9
+
+    def test_add__if_migration_replaced__should_relink_partners(self, graph):
+        new_migration = Migration(name='05', dependencies=['03'])
+
+        graph.add(new_migration)
+
+        assert [m.name for m in graph._parents['05']] == ['03']
+        assert [m.name for m in graph._children['04']] == ['06']
+        assert all(m is new_migration
+                   for m in graph._parents['07'] + graph._parents['08'] if m.name == '05')
+        assert [m.name for m in graph.order] == ['01', '02', '03', '05', '07', '04', '06',
+                                                 '08', '09']
+
+    def test_clear__should_reset_cached_order(self, graph):
+        graph.clear()
+
+        assert graph.initial is None
+        assert graph.order == []
+
+    def test_position__if_migration_not_found__should_raise_error(self, graph):
+        with pytest.raises(MigrationGraphError):
+            graph.position('unknown')
+
+    def test_descendants__should_return_migrations_depending_on_given_one(self, graph):
+        assert graph.descendants('05') == {'05', '07', '08', '09'}
+        assert graph.descendants('09') == {'09'}
+
+    def test_walk__on_long_history__should_not_hit_recursion_limit(self):
+        count = sys.getrecursionlimit() * 2
+        graph = MigrationsGraph()
+        for i in range(count):
+            graph.add(Migration(name=f'{i:05}', dependencies=[f'{i - 1:05}'] if i else []))
+
+        assert len(list(graph.walk_down(graph.initial))) == count
+        assert len(list(graph.walk_up(graph.last, applied_only=False))) == count
+        assert graph.position(graph.last.name) == count - 1
+
+
+class TestMigrationsGraphReplacements:
+    @pytest.fixture
+    def graph(self):
+        graph = MigrationsGraph()
+        graph.add(Migration(name='01', dependencies=[]))
+        graph.add(Migration(name='02', dependencies=['01']))
+        graph.add(Migration(name='03', dependencies=['02']))
+        graph.add(Migration(name='04', dependencies=['03']))
+        graph.add(Migration(name='01_squashed_03', dependencies=[], replaces=['01', '02', '03']))
+        return graph
+
+    def test_resolve_replacements__if_nothing_applied__should_use_squashed_migration(self, graph):
+        graph.resolve_replacements()
+
+        assert [(m.name, m.applied) for m in graph] == [('01_squashed_03', False), ('04', False)]
+        assert graph.migrations['04'].dependencies == ['01_squashed_03']
+
+    @pytest.mark.parametrize('applied', (['01', '02', '03'], ['01_squashed_03']))
+    def test_resolve_replacements__if_all_replaced_applied__should_use_applied_squashed(
+            self, graph, applied
+    ):
+        for name in applied:
+            graph.migrations[name].applied = True
+
+        graph.resolve_replacements()
+
+        assert [(m.name, m.applied) for m in graph] == [('01_squashed_03', True), ('04', False)]
+
+    def test_resolve_replacements__if_partially_applied__should_use_replaced_migrations(
+            self, graph
+    ):
+        graph.migrations['01'].applied = True
+
+        graph.resolve_replacements()
+
+        assert [(m.name, m.applied) for m in graph] == [
+            ('01', True), ('02', False), ('03', False), ('04', False)
+        ]
+
+    def test_resolve_replacements__if_replaced_migrations_removed__should_use_squashed(self):
+        graph = MigrationsGraph()
+        graph.add(Migration(name='04', dependencies=['03']))
+        graph.add(Migration(name='01_squashed_03', dependencies=[], replaces=['01', '02', '03']))
+
+        graph.resolve_replacements()
+
+        assert [m.name for m in graph] == ['01_squashed_03', '04']
+
+
+class TestMigration:
+    def test_copy__should_copy_action_objects_and_reset_applied(self):
+        actions = [SimpleNamespace(parameters={'a': 1}), SimpleNamespace(parameters={'a': 2})]
+        migration = Migration(name='02',
+                              dependencies=['01'],
+                              module=SimpleNamespace(actions=actions),
+                              hash='abc',
+                              applied=True)
+
+        res = migration.copy()
+
+        assert res is not migration
+        assert (res.name, res.dependencies, res.hash, res.applied) == ('02', ['01'], 'abc', False)
+        assert res.dependencies is not migration.dependencies
+        assert len(res.get_actions()) == 2
+        assert all(a is not b for a, b in zip(res.get_actions(), actions))
+        assert [a.parameters for a in res.get_actions()] == [{'a': 1}, {'a': 2}]
+        assert migration.get_actions() is actions
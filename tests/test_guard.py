@@ -0,0 +1,91 @@
+import pytest
+
+from mongoengine_migrate.exceptions import SchemaError
+from mongoengine_migrate.guard import SchemaGuard, FINGERPRINT_ID, migrations_fingerprint
+from mongoengine_migrate.schema import Schema
+
+
+@pytest.fixture
+def models_schema(monkeypatch):
+    schema = Schema().load({
+        'Doc1': {'fields': {'field1': {'type_key': 'StringField'}},
+                 'parameters': {'collection': 'doc1'}}
+    })
+    monkeypatch.setattr('mongoengine_migrate.loader.collect_models_schema', lambda: schema)
+    return schema
+
+
+@pytest.fixture
+def migrations_records():
+    return [{'name': '0001_initial', 'hash': 'abc'}, {'name': '0002_auto', 'hash': 'def'}]
+
+
+@pytest.fixture
+def write_fingerprints(test_db):
+    def w(schema_fingerprint, migrations_fingerprint=None):
+        test_db['mongoengine_migrate'].replace_one(
+            {'_id': FINGERPRINT_ID},
+            {'type': 'fingerprint',
+             'schema': schema_fingerprint,
+             'migrations': migrations_fingerprint},
+            upsert=True
+        )
+
+    return w
+
+
+def test_migrations_fingerprint__should_depend_on_names_hashes_and_order(migrations_records):
+    res = migrations_fingerprint(migrations_records)
+
+    assert res == migrations_fingerprint([dict(r, ordering_number=1) for r in migrations_records])
+    assert res != migrations_fingerprint(reversed(migrations_records))
+    assert res != migrations_fingerprint(migrations_records[:1])
+    assert res != migrations_fingerprint([dict(r, hash='xyz') for r in migrations_records])
+
+
+class TestSchemaGuard:
+    def test_is_up_to_date__if_fingerprints_are_equal__should_return_true(
+            self, test_db, models_schema, write_fingerprints
+    ):
+        write_fingerprints(models_schema.fingerprint())
+
+        assert SchemaGuard(test_db).is_up_to_date() is True
+
+    def test_is_up_to_date__if_fingerprints_are_different__should_return_false(
+            self, test_db, models_schema, write_fingerprints
+    ):
+        write_fingerprints(Schema().fingerprint())
+        guard = SchemaGuard(test_db)
+
+        assert guard.is_up_to_date() is False
+        with pytest.raises(SchemaError):
+            guard.check()
+
+    def test_is_up_to_date__if_fingerprints_not_written__should_return_false(
+            self, test_db, models_schema
+    ):
+        assert SchemaGuard(test_db).is_up_to_date() is False
+
+    def test_is_up_to_date__should_cache_result(self, test_db, models_schema, write_fingerprints):
+        write_fingerprints(models_schema.fingerprint())
+        guard = SchemaGuard(test_db)
+        guard.is_up_to_date()
+
+        write_fingerprints(Schema().fingerprint())
+
+        assert guard.is_up_to_date() is True
+        assert guard.is_up_to_date(refresh=True) is False
+
+    def test_is_up_to_date__if_migrations_fingerprint_expected__should_check_it(
+            self, test_db, models_schema, write_fingerprints, migrations_records
+    ):
+        expected = migrations_fingerprint(migrations_records)
+        write_fingerprints(models_schema.fingerprint(),
+                           migrations_fingerprint(migrations_records[:1]))
+        guard = SchemaGuard(test_db, expected_migrations_fingerprint=expected)
+
+        assert guard.is_up_to_date() is False
+
+        write_fingerprints(models_schema.fingerprint(), expected)
+
+        assert guard.is_up_to_date(refresh=True) is True
@@ -0,0 +1,44 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+#: Modules which must not be imported on CLI startup
+HEAVY_MODULES = ('jinja2', 'dictdiffer', 'mongoengine', 'dateutil', 'jsonpath_rw',
+                 'mongoengine_migrate.actions', 'mongoengine_migrate.fields',
+                 'mongoengine_migrate.updater')
+
+
+def import_in_subprocess(statement: str) -> dict:
+    """
+    Execute import statement in a clean interpreter and return
+    imported modules
+    """
+    code = (
+        'import sys, json\n'
+        f'{statement}\n'
+        'print(json.dumps({"modules": sorted(sys.modules)}))\n'
+    )
+    res = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True)
+    return json.loads(res.stdout.decode())
+
+
+@pytest.mark.parametrize('statement', (
+    'import mongoengine_migrate.cli',
+    'from mongoengine_migrate.loader import MongoengineMigrate',
+))
+def test_import__should_not_import_heavy_modules(statement):
+    res = import_in_subprocess(statement)
+
+    loaded = [m for m in res['modules']
+              if m in HEAVY_MODULES or m.startswith(tuple(f'{h}.' for h in HEAVY_MODULES))]
+    assert loaded == []
+
+
+def test_import__cli_should_import_less_than_full_import():
+    cli_import = import_in_subprocess('import mongoengine_migrate.cli')
+    full_import = import_in_subprocess('import mongoengine_migrate.cli, '
+                                       'mongoengine_migrate.actions, jinja2, dictdiffer')
+
+    assert set(cli_import['modules']) < set(full_import['modules'])
@@ -0,0 +1,105 @@
+import pytest
+
+from mongoengine_migrate.graph import MigrationPolicy
+from mongoengine_migrate.indexes import (
+    DeferredIndexes,
+    IndexBuilds,
+    get_current_deferred_indexes
+)
+from mongoengine_migrate.updater import DocumentUpdater, ByDocContext
+
+
+@pytest.fixture
+def indexes(test_db):
+    collection = test_db['schema1_doc1']
+    collection.create_index([('doc1_int', 1)], name='doc1_int_1', sparse=True)
+    collection.create_index([('doc1_str', 1)], name='doc1_str_1')
+    collection.create_index([('doc1_str_ten', -1)], name='doc1_str_ten_-1', unique=True,
+                            sparse=True)
+    return collection.index_information()
+
+
+class TestDeferredIndexes:
+    def test_deferring__by_doc__should_drop_indexes_and_build_them_after(
+            self, load_fixture, test_db, indexes
+    ):
+        schema = load_fixture('schema1').get_schema()
+        updater = DocumentUpdater(test_db, 'Schema1Doc1', schema, 'doc1_str',
+                                  MigrationPolicy.strict)
+        seen_indexes = set()
+
+        def by_doc(ctx: ByDocContext):
+            seen_indexes.update(test_db['schema1_doc1'].index_information().keys())
+            ctx.document['doc1_str'] = 'test'
+
+        journal = test_db['mongoengine_migrate']
+        with DeferredIndexes(journal).deferring():
+            assert get_current_deferred_indexes() is not None
+            updater.update_by_document(by_doc)
+            assert journal.count_documents({'type': 'deferred_index'}) == 1
+
+        assert get_current_deferred_indexes() is None
+        assert journal.count_documents({'type': 'deferred_index'}) == 0
+        # Unique index and index used by the query are kept
+        assert seen_indexes == {'_id_', 'doc1_str_1', 'doc1_str_ten_-1'}
+        assert test_db['schema1_doc1'].index_information() == indexes
+
+    def test_deferring__if_error__should_build_indexes_and_reraise(
+            self, load_fixture, test_db, indexes
+    ):
+        schema = load_fixture('schema1').get_schema()
+        updater = DocumentUpdater(test_db, 'Schema1Doc1', schema, 'doc1_str',
+                                  MigrationPolicy.strict)
+
+        def by_doc(ctx: ByDocContext):
+            raise ValueError('test')
+
+        with pytest.raises(ValueError), DeferredIndexes().deferring():
+            updater.update_by_document(by_doc)
+
+        assert test_db['schema1_doc1'].index_information() == indexes
+
+    def test_deferring__if_error_and_build_failed__should_reraise_action_error(
+            self, load_fixture, test_db, indexes, monkeypatch
+    ):
+        schema = load_fixture('schema1').get_schema()
+        updater = DocumentUpdater(test_db, 'Schema1Doc1', schema, 'doc1_str',
+                                  MigrationPolicy.strict)
+        journal = test_db['mongoengine_migrate']
+
+        def by_doc(ctx: ByDocContext):
+            raise ValueError('test')
+
+        def run(self):
+            raise RuntimeError('build failed')
+
+        monkeypatch.setattr(IndexBuilds, 'run', run)
+        with pytest.raises(ValueError), DeferredIndexes(journal).deferring():
+            updater.update_by_document(by_doc)
+
+        # Indexes are left in journal
+        assert journal.count_documents({'type': 'deferred_index'}) == 1
+
+    def test_build_pending__should_build_indexes_left_in_journal(self, test_db, indexes):
+        journal = test_db['mongoengine_migrate']
+        # Process was killed after index was dropped
+        DeferredIndexes(journal).defer(test_db['schema1_doc1'], ['doc1_str'])
+        assert 'doc1_int_1' not in test_db['schema1_doc1'].index_information()
+
+        DeferredIndexes.build_pending(journal)
+
+        assert test_db['schema1_doc1'].index_information() == indexes
+        assert journal.count_documents({'type': 'deferred_index'}) == 0
+
+    def test_build_pending__should_keep_collation_and_ttl(self, test_db):
+        collection = test_db['schema1_doc1']
+        collection.create_index([('doc1_str', 1)], name='doc1_str_1',
+                                collation={'locale': 'en', 'strength': 2})
+        collection.create_index([('doc1_date', 1)], name='doc1_date_1', expireAfterSeconds=3600)
+        indexes = collection.index_information()
+        journal = test_db['mongoengine_migrate']
+        DeferredIndexes(journal).defer(collection, [])
+
+        DeferredIndexes.build_pending(journal)
+
+        assert collection.index_information() == indexes
@@ -0,0 +1,69 @@
+import pytest
+from mongoengine import fields
+
+from mongoengine_migrate.inspectdb import infer_schema, _get_field_cls, _build_field_schema, \
+    _class_name, _embedded_document_type
+
+
+class TestGetFieldCls:
+    @pytest.mark.parametrize('types,expect', (
+        ({'string'}, fields.StringField),
+        ({'int', 'long'}, fields.LongField),
+        ({'int', 'double'}, fields.FloatField),
+        ({'int', 'string'}, fields.DynamicField),
+        ({'regex'}, fields.DynamicField),
+        (set(), fields.DynamicField),
+    ))
+    def test_get_field_cls__should_return_the_widest_field_class(self, types, expect):
+        assert _get_field_cls(types) is expect
+
+
+class TestNames:
+    @pytest.mark.parametrize('name,expect', (
+        ('users', 'Users'),
+        ('user_groups', 'UserGroups'),
+        ('app.user-groups', 'AppUserGroups'),
+    ))
+    def test_class_name__should_return_camel_case_name(self, name, expect):
+        assert _class_name(name) == expect
+
+    def test_embedded_document_type__should_return_embedded_name_with_parent_prefix(self):
+        assert _embedded_document_type('Users', 'address') == '~UsersAddress'
+        assert _embedded_document_type('~UsersAddress', 'geo') == '~UsersAddressGeo'
+
+
+class TestBuildFieldSchema:
+    def test_build_field_schema__should_set_db_field_and_null(self):
+        res = _build_field_schema(fields.StringField, 'name', True, None)
+
+        assert res['type_key'] == 'StringField'
+        assert res['db_field'] == 'name'
+        assert res['null'] is True
+
+    def test_build_field_schema__if_embedded_document__should_set_target_doctype(self):
+        res = _build_field_schema(fields.EmbeddedDocumentListField, 'items', False, '~DocItems')
+
+        assert res['type_key'] == 'EmbeddedDocumentListField'
+        assert res['target_doctype'] == '~DocItems'
+
+
+class TestInferSchema:
+    def test_infer_schema__should_infer_fields_and_embedded_documents(self, test_db):
+        test_db['users'].insert_many([
+            {'name': 'John', 'age': 30, 'address': {'city': 'NY'}, 'tags': [{'t': 'a'}]},
+            {'name': None, 'age': 30.5, 'address': {'city': 'LA', 'zip': 1}},
+        ])
+
+        res = infer_schema(test_db, ['users'], sample_size=10)
+
+        assert set(res.keys()) == {'Users', '~UsersAddress', '~UsersTags'}
+        assert res['Users'].parameters == {'collection': 'users'}
+        assert set(res['Users'].keys()) == {'name', 'age', 'address', 'tags'}
+        assert res['Users']['name']['type_key'] == 'StringField'
+        assert res['Users']['name']['null'] is True
+        assert res['Users']['age']['type_key'] == 'FloatField'
+        assert res['Users']['address']['type_key'] == 'EmbeddedDocumentField'
+        assert res['Users']['address']['target_doctype'] == '~UsersAddress'
+        assert res['Users']['tags']['type_key'] == 'EmbeddedDocumentListField'
+        assert res['Users']['tags']['target_doctype'] == '~UsersTags'
+        assert set(res['~UsersAddress'].keys()) == {'city', 'zip'}
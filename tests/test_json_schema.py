@@ -0,0 +1,75 @@
+import pytest
+
+from mongoengine_migrate.json_schema import document_json_schema, collection_json_schemas
+from mongoengine_migrate.schema import Schema
+
+
+@pytest.fixture
+def schema():
+    return Schema().load({
+        'Doc1': {
+            'fields': {
+                'str': {'type_key': 'StringField', 'db_field': 'db_str', 'required': True,
+                        'null': False, 'max_length': 10, 'min_length': None, 'regex': '^a'},
+                'int': {'type_key': 'IntField', 'null': True, 'min_value': 1, 'max_value': None,
+                        'choices': [[1, 'one'], [2, 'two']]},
+                'emb': {'type_key': 'EmbeddedDocumentListField', 'target_doctype': '~Emb1'},
+                'dyn': {'type_key': 'DynamicField'},
+            },
+            'parameters': {'collection': 'doc1'}
+        },
+        '~Emb1': {
+            'fields': {
+                'date': {'type_key': 'DateTimeField', 'required': True},
+                'emb': {'type_key': 'EmbeddedDocumentField', 'target_doctype': '~Emb1'},
+            },
+            'parameters': {}
+        },
+    })
+
+
+class TestDocumentJsonSchema:
+    def test_document_json_schema__should_translate_fields_restrictions(self, schema):
+        res = document_json_schema(schema, 'Doc1')
+
+        assert res == {
+            'bsonType': 'object',
+            'properties': {
+                'db_str': {'bsonType': 'string', 'maxLength': 10, 'pattern': '^a'},
+                'int': {'bsonType': ['int', 'long', 'null'], 'enum': [1, 2, None],
+                        'minimum': 1},
+                'emb': {
+                    'bsonType': 'array',
+                    'items': {
+                        'properties': {
+                            'date': {'bsonType': 'date'},
+                            'emb': {'bsonType': 'object'}  # Recursion is not followed
+                        },
+                        'required': ['date']
+                    }
+                },
+                'dyn': {},
+            },
+            'required': ['db_str']
+        }
+
+
+class TestCollectionJsonSchemas:
+    def test_collection_json_schemas__should_skip_embedded_documents(self, schema):
+        res = collection_json_schemas(schema)
+
+        assert res == {'doc1': document_json_schema(schema, 'Doc1')}
+
+    def test_collection_json_schemas__if_inherited_documents__should_distinguish_them_by_cls(
+            self, schema
+    ):
+        for document_type in ('Doc1', 'Doc1->Doc2'):
+            schema[document_type] = Schema.Document(schema['Doc1'])
+            schema[document_type].parameters.update(collection='doc1', inherit=True)
+
+        res = collection_json_schemas(schema)
+
+        variants = res['doc1']['anyOf']
+        assert [v['properties']['_cls'] for v in variants] == [
+            {'enum': ['Doc1']}, {'enum': ['Doc1.Doc2']}
+        ]
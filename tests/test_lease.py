@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import MongoClient
+
+from mongoengine_migrate.exceptions import LeaseError
+from mongoengine_migrate.lease import MigrationLease, LEASE_ID
+
+
+def run_under_lease(worker_id: int):
+    collection = MongoClient(os.environ['DATABASE_URL']).get_database()['mongoengine_migrate']
+    with MigrationLease(collection, ttl=2, poll_interval=0.05):
+        started = time.time()
+        time.sleep(0.3)
+        collection.database['lease_runs'].insert_one(
+            {'worker': worker_id, 'started': started, 'finished': time.time()}
+        )
+
+
+class TestMigrationLease:
+    def test_lease__if_several_processes__should_run_them_one_by_one(self, test_db):
+        ctx = multiprocessing.get_context('spawn')
+        processes = [ctx.Process(target=run_under_lease, args=(i,)) for i in range(4)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join(30)
+
+        assert all(p.exitcode == 0 for p in processes)
+        runs = sorted(test_db['lease_runs'].find(), key=lambda x: x['started'])
+        assert len(runs) == 4
+        for prev, nxt in zip(runs, runs[1:]):
+            assert prev['finished'] <= nxt['started']
+        assert test_db['mongoengine_migrate'].count_documents({'_id': LEASE_ID}) == 0
+
+    def test_try_acquire__if_lease_is_held__should_return_false(self, test_db):
+        collection = test_db['mongoengine_migrate']
+        lease1 = MigrationLease(collection)
+        lease2 = MigrationLease(collection)
+
+        assert lease1.try_acquire() is True
+        assert lease2.try_acquire() is False
+        assert lease1.try_acquire() is True
+
+    def test_try_acquire__if_lease_is_expired__should_take_it_over(self, test_db):
+        collection = test_db['mongoengine_migrate']
+        collection.insert_one({
+            '_id': LEASE_ID,
+            'type': 'lease',
+            'holder': 'dead',
+            'expires_at': datetime.now(timezone.utc) - timedelta(seconds=1)
+        })
+        lease = MigrationLease(collection)
+
+        assert lease.try_acquire() is True
+        assert collection.find_one({'_id': LEASE_ID})['holder'] == lease.holder
+
+    def test_acquire__if_wait_timeout_exceeded__should_raise_error(self, test_db):
+        collection = test_db['mongoengine_migrate']
+        MigrationLease(collection).try_acquire()
+        lease = MigrationLease(collection, poll_interval=0.05, wait_timeout=0.2)
+
+        with pytest.raises(LeaseError):
+            lease.acquire()
+
+    def test_heartbeat__should_prolong_lease(self, test_db):
+        collection = test_db['mongoengine_migrate']
+
+        with MigrationLease(collection, ttl=0.6):
+            expires_at = collection.find_one({'_id': LEASE_ID})['expires_at']
+            time.sleep(0.5)
+
+            assert collection.find_one({'_id': LEASE_ID})['expires_at'] > expires_at
+
+    def test_heartbeat__if_lease_taken_over__should_mark_it_lost(self, test_db):
+        collection = test_db['mongoengine_migrate']
+
+        with MigrationLease(collection, ttl=0.3) as lease:
+            collection.update_one({'_id': LEASE_ID}, {'$set': {'holder': 'other'}})
+            time.sleep(0.3)
+
+            assert lease.lost is True
+            with pytest.raises(LeaseError):
+                lease.check()
+
+        # Lease of other holder is not released
+        assert collection.find_one({'_id': LEASE_ID})['holder'] == 'other'
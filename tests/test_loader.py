@@ -0,0 +1,228 @@
+import os
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from mongoengine_migrate.exceptions import MigrationGraphError
+from mongoengine_migrate.graph import Migration, MigrationsGraph
+from mongoengine_migrate.loader import MongoengineMigrate
+from mongoengine_migrate.schema import Schema
+
+
+@pytest.fixture
+def mongoengine_migrate(test_db, tmp_path):
+    return MongoengineMigrate(os.environ['DATABASE_URL'],
+                              'mongoengine_migrate',
+                              str(tmp_path),
+                              client=MongoClient(os.environ['DATABASE_URL']))
+
+
+@pytest.fixture
+def schema():
+    return Schema().load({
+        'Doc1': {'fields': {'field1': {'type_key': 'StringField'}},
+                 'parameters': {'collection': 'doc1'}},
+        'Doc2': {'fields': {'field1': {'type_key': 'IntField'}},
+                 'parameters': {'collection': 'doc2'}},
+    })
+
+
+@pytest.fixture
+def graph():
+    graph = MigrationsGraph()
+    graph.add(Migration(name='0001', dependencies=[], hash='a', applied=True))
+    graph.add(Migration(name='0002', dependencies=['0001'], hash='b', applied=True))
+    graph.add(Migration(name='0003', dependencies=['0002'], hash='c'))
+    return graph
+
+
+class TestMongoengineMigrateStorage:
+    def test_write_db_schema__should_write_record_per_document(
+            self, test_db, mongoengine_migrate, schema
+    ):
+        mongoengine_migrate.write_db_schema(schema)
+
+        records = test_db['mongoengine_migrate'].find({'type': 'schema_document'})
+        assert {r['name']: r['value'] for r in records} == schema.dump()
+        assert mongoengine_migrate.load_db_schema() == schema
+
+    def test_write_db_schema__should_write_only_changed_documents(
+            self, test_db, mongoengine_migrate, schema
+    ):
+        mongoengine_migrate.write_db_schema(schema)
+        collection = test_db['mongoengine_migrate']
+        collection.update_many({'type': 'schema_document'}, {'$set': {'value.marker': 1}})
+        schema['Doc2']['field2'] = {'type_key': 'StringField'}
+
+        mongoengine_migrate.write_db_schema(schema)
+
+        records = {r['name']: r['value'] for r in collection.find({'type': 'schema_document'})}
+        assert records['Doc1'] == dict(schema['Doc1'].dump(), marker=1)
+        assert records['Doc2'] == schema['Doc2'].dump()
+
+    def test_write_db_schema__if_document_removed__should_remove_its_record(
+            self, test_db, mongoengine_migrate, schema
+    ):
+        mongoengine_migrate.write_db_schema(schema)
+        del schema['Doc1']
+
+        mongoengine_migrate.write_db_schema(schema)
+
+        records = test_db['mongoengine_migrate'].find({'type': 'schema_document'})
+        assert [r['name'] for r in records] == ['Doc2']
+        assert mongoengine_migrate.load_db_schema() == schema
+
+    def test_load_db_schema__if_previous_layout__should_load_and_replace_it(
+            self, test_db, mongoengine_migrate, schema
+    ):
+        collection = test_db['mongoengine_migrate']
+        collection.insert_one({'type': 'schema', 'value': schema.dump()})
+
+        res = mongoengine_migrate.load_db_schema()
+        mongoengine_migrate.write_db_schema(res)
+
+        assert res == schema
+        assert collection.count_documents({'type': 'schema'}) == 0
+        assert collection.count_documents({'type': 'schema_document'}) == 2
+
+    def test_write_db_schema__if_write_failed__should_keep_previous_layout(
+            self, test_db, mongoengine_migrate, schema, monkeypatch
+    ):
+        collection = test_db['mongoengine_migrate']
+        collection.insert_one({'type': 'schema', 'value': schema.dump()})
+
+        def bulk_write(*args, **kwargs):
+            raise PyMongoError('Write failed')
+
+        res = mongoengine_migrate.load_db_schema()
+        monkeypatch.setattr(type(mongoengine_migrate.migration_collection),
+                            'bulk_write',
+                            bulk_write)
+        with pytest.raises(PyMongoError):
+            mongoengine_migrate.write_db_schema(res)
+
+        assert collection.count_documents({'type': 'schema'}) == 1
+
+    def test_write_db_migrations_graph__should_write_record_per_applied_migration(
+            self, test_db, mongoengine_migrate, graph
+    ):
+        mongoengine_migrate.write_db_migrations_graph(graph)
+        graph.migrations['0002'].applied = False
+
+        mongoengine_migrate.write_db_migrations_graph(graph)
+
+        records = test_db['mongoengine_migrate'].find({'type': 'migration'})
+        assert [r['name'] for r in records] == ['0001']
+        assert mongoengine_migrate.get_db_migrations() == [
+            {'name': '0001', 'ordering_number': 0, 'hash': 'a'}
+        ]
+
+    def test_get_db_migrations__if_previous_layout__should_load_and_replace_it(
+            self, test_db, mongoengine_migrate, graph
+    ):
+        collection = test_db['mongoengine_migrate']
+        collection.insert_one({'type': 'migrations', 'value': [
+            {'name': '0002', 'ordering_number': 1, 'hash': 'b'},
+            {'name': '0001', 'ordering_number': 0, 'hash': 'a'},
+        ]})
+
+        res = mongoengine_migrate.get_db_migrations()
+        mongoengine_migrate.write_db_migrations_graph(graph)
+
+        assert [r['name'] for r in res] == ['0001', '0002']
+        assert collection.count_documents({'type': 'migrations'}) == 0
+        assert mongoengine_migrate.get_db_migrations() == [
+            {'name': '0001', 'ordering_number': 0, 'hash': 'a'},
+            {'name': '0002', 'ordering_number': 1, 'hash': 'b'},
+        ]
+
+
+class TestMongoengineMigrateCheck:
+    def test_check__should_find_non_conforming_records(self, test_db, mongoengine_migrate, schema):
+        mongoengine_migrate.write_db_schema(schema)
+        test_db['doc1'].insert_many([{'_id': 1, 'field1': 'a'}, {'_id': 2, 'field1': 2}])
+        test_db['doc2'].insert_many([{'_id': 1, 'field1': 1}, {'_id': 2}])
+
+        res = mongoengine_migrate.check()
+
+        assert res == [
+            {'collection': 'doc1', 'count': 1, 'examples': [2]},
+            {'collection': 'doc2', 'count': 0, 'examples': []},
+        ]
+
+    def test_check__if_install_validators__should_set_validator(
+            self, test_db, mongoengine_migrate, schema
+    ):
+        mongoengine_migrate.write_db_schema(schema)
+        test_db['doc1'].insert_one({'field1': 'a'})
+
+        mongoengine_migrate.check(install_validators=True)
+
+        options = test_db['doc1'].options()
+        assert options['validator'] == {
+            '$jsonSchema': {'bsonType': 'object', 'properties': {'field1': {'bsonType': 'string'}}}
+        }
+        assert options['validationLevel'] == 'moderate'
+        assert 'doc2' in test_db.list_collection_names()
+
+
+class TestMongoengineMigrateSquashmigrations:
+    @pytest.fixture
+    def migrations_dir(self, tmp_path):
+        header = 'from mongoengine_migrate.actions import *\n'
+        (tmp_path / '0001_initial.py').write_text(
+            f"{header}dependencies = []\n"
+            f"actions = [CreateDocument('Doc1', collection='doc1')]\n"
+        )
+        (tmp_path / '0002_auto.py').write_text(
+            f"{header}dependencies = ['0001_initial']\n"
+            f"actions = [RunPython('Doc1', forward_func=lambda db, col: None)]\n"
+        )
+        (tmp_path / '0003_auto.py').write_text(
+            f"{header}dependencies = ['0002_auto']\n"
+            f"actions = [DropDocument('Doc1')]\n"
+        )
+        return tmp_path
+
+    def test_squashmigrations__if_run_python_in_range__should_raise_error(
+            self, mongoengine_migrate, migrations_dir
+    ):
+        with pytest.raises(MigrationGraphError, match='RunPython'):
+            mongoengine_migrate.squashmigrations('0001_initial', '0003_auto')
+
+        assert sorted(f.name for f in migrations_dir.glob('*.py')) == [
+            '0001_initial.py', '0002_auto.py', '0003_auto.py'
+        ]
+
+
+class TestMongoengineMigrateIsUpToDate:
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, tmp_path_factory, monkeypatch):
+        monkeypatch.setenv('MONGOENGINE_MIGRATE_CACHE_DIR', str(tmp_path_factory.mktemp('cache')))
+
+    @pytest.fixture
+    def migrations_dir(self, tmp_path):
+        (tmp_path / '0001_initial.py').write_text('dependencies = []\nactions = []\n')
+        return tmp_path
+
+    def test_is_up_to_date__if_record_has_no_hash__should_return_true(
+            self, test_db, mongoengine_migrate, migrations_dir
+    ):
+        test_db['mongoengine_migrate'].insert_one(
+            {'type': 'migration', 'name': '0001_initial', 'ordering_number': 0}
+        )
+
+        assert mongoengine_migrate.is_up_to_date() is True
+
+    def test_migrate__if_record_has_no_hash__should_write_hash(
+            self, test_db, mongoengine_migrate, migrations_dir
+    ):
+        collection = test_db['mongoengine_migrate']
+        collection.insert_one({'type': 'migration', 'name': '0001_initial', 'ordering_number': 0})
+        expect = mongoengine_migrate.load_manifest()['0001_initial']['hash']
+
+        mongoengine_migrate.migrate('0001_initial')
+
+        record = collection.find_one({'type': 'migration', 'name': '0001_initial'})
+        assert record['hash'] == expect
@@ -0,0 +1,119 @@
+from pathlib import Path
+
+import pytest
+
+from mongoengine_migrate.manifest import (
+    read_dependencies,
+    read_replaces,
+    file_hash,
+    MigrationsManifest
+)
+
+
+@pytest.mark.parametrize('source,expect', (
+    (b"dependencies = ['0001_initial', '0002_auto']\nactions = []\n",
+     ['0001_initial', '0002_auto']),
+    (b"from mongoengine_migrate.actions import *\n\ndependencies = [\n]\n", []),
+    (b"dependencies = ('0001_initial', )\n", ['0001_initial']),
+    (b"dependencies = get_dependencies()\n", None),
+    (b"actions = []\n", None),
+    (b"dependencies = [\n", None),
+))
+def test_read_dependencies(source, expect):
+    assert read_dependencies(source) == expect
+
+
+@pytest.mark.parametrize('source,expect', (
+    (b"dependencies = []\nreplaces = ['0001_initial', '0002_auto']\n",
+     ['0001_initial', '0002_auto']),
+    (b"dependencies = []\nactions = []\n", []),
+    (b"replaces = get_replaces()\n", None),
+))
+def test_read_replaces(source, expect):
+    assert read_replaces(source) == expect
+
+
+class TestMigrationsManifest:
+    @pytest.fixture
+    def migrations_dir(self, tmp_path):
+        (tmp_path / '0001_initial.py').write_text("dependencies = []\nactions = []\n")
+        (tmp_path / '0002_auto.py').write_text("dependencies = ['0001_initial']\nactions = []\n")
+        (tmp_path / '__init__.py').write_text("")
+        return tmp_path
+
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, tmp_path_factory, monkeypatch):
+        cache_dir = tmp_path_factory.mktemp('cache')
+        monkeypatch.setenv('MONGOENGINE_MIGRATE_CACHE_DIR', str(cache_dir))
+        return cache_dir
+
+    def test_build__should_return_names_dependencies_and_hashes(self, migrations_dir, cache_dir):
+        expect = {
+            '0001_initial': {
+                'hash': file_hash((migrations_dir / '0001_initial.py').read_bytes()),
+                'dependencies': [],
+                'replaces': []
+            },
+            '0002_auto': {
+                'hash': file_hash((migrations_dir / '0002_auto.py').read_bytes()),
+                'dependencies': ['0001_initial'],
+                'replaces': []
+            }
+        }
+
+        res = MigrationsManifest(migrations_dir, lambda f: pytest.fail('Module executed')).build()
+
+        assert res == expect
+        assert len(list(cache_dir.iterdir())) == 1
+        assert not any(f.name.endswith('.json') for f in migrations_dir.iterdir())
+
+    def test_build__if_cache_could_not_be_written__should_return_manifest(
+            self, migrations_dir, tmp_path_factory
+    ):
+        cache_dir = tmp_path_factory.mktemp('readonly') / 'file'
+        cache_dir.write_text('')  # Directory could not be created in place of file
+
+        res = MigrationsManifest(migrations_dir,
+                                 lambda f: pytest.fail('Module executed'),
+                                 cache_dir=cache_dir).build()
+
+        assert set(res.keys()) == {'0001_initial', '0002_auto'}
+
+    def test_build__if_file_is_not_changed__should_take_it_from_cache(
+            self, migrations_dir, monkeypatch
+    ):
+        manifest = MigrationsManifest(migrations_dir, lambda f: pytest.fail('Module executed'))
+        expect = manifest.build()
+        monkeypatch.setattr(Path, 'read_bytes', lambda self: pytest.fail('File was read'))
+
+        res = manifest.build()
+
+        assert res == expect
+
+    def test_build__if_file_is_changed__should_reread_it(self, migrations_dir):
+        manifest = MigrationsManifest(migrations_dir, lambda f: pytest.fail('Module executed'))
+        manifest.build()
+        source = "dependencies = ['0001_initial']\nactions = [None]\n"
+        (migrations_dir / '0002_auto.py').write_text(source)
+
+        res = manifest.build()
+
+        assert res['0002_auto']['hash'] == file_hash(source.encode())
+
+    def test_build__if_dependencies_are_not_literal__should_use_fallback(self, migrations_dir):
+        (migrations_dir / '0003_auto.py').write_text("dependencies = list(['0002_auto'])\n")
+
+        res = MigrationsManifest(migrations_dir, lambda f: ['0002_auto']).build()
+
+        assert res['0003_auto']['dependencies'] == ['0002_auto']
+
+    def test_build__if_migration_is_squashed__should_return_replaced_migrations(
+            self, migrations_dir
+    ):
+        (migrations_dir / '0001_squashed_0002_auto.py').write_text(
+            "dependencies = []\nreplaces = ['0001_initial', '0002_auto']\n"
+        )
+
+        res = MigrationsManifest(migrations_dir, lambda f: pytest.fail('Module executed')).build()
+
+        assert res['0001_squashed_0002_auto']['replaces'] == ['0001_initial', '0002_auto']
@@ -0,0 +1,56 @@
+from mongoengine_migrate import flags
+from mongoengine_migrate.mongo import (
+    build_path_filter,
+    build_path_update,
+    version_tuple,
+    mongo_version_below
+)
+
+
+class TestBuildPathFilter:
+    def test_build_path_filter__if_no_arrays__should_apply_condition_to_path(self):
+        res = build_path_filter('a.b', lambda p: {p: {'$type': 'string'}})
+
+        assert res == {'a.b': {'$type': 'string'}}
+
+    def test_build_path_filter__should_match_every_array_element_separately(self):
+        res = build_path_filter('a.$[elem1].b.c.$[elem4].d', lambda p: {p: {'$type': 'string'}})
+
+        assert res == {'a': {'$elemMatch': {'b.c': {'$elemMatch': {'d': {'$type': 'string'}}}}}}
+
+
+class TestBuildPathUpdate:
+    def test_build_path_update__if_no_arrays__should_set_expression(self):
+        res = build_path_update('a', lambda v: {'$toUpper': v})
+
+        assert res == [{'$set': {'a': {'$toUpper': '$a'}}}]
+
+    def test_build_path_update__should_map_arrays_and_merge_embedded_documents(self):
+        res = build_path_update('a.$[elem1].b', lambda v: {'$toUpper': v})
+
+        assert res == [{'$set': {'a': {'$cond': [
+            {'$isArray': '$a'},
+            {'$map': {'input': '$a', 'as': 'item0', 'in': {'$cond': [
+                {'$eq': [{'$type': '$$item0'}, 'object']},
+                {'$mergeObjects': ['$$item0', {'b': {'$toUpper': '$$item0.b'}}]},
+                '$$item0'
+            ]}}},
+            '$a'
+        ]}}}]
+
+
+class TestVersionTuple:
+    def test_version_tuple__should_compare_parts_as_numbers(self):
+        assert version_tuple('3.4.10') > version_tuple('3.4.4')
+        assert version_tuple('10.0') > version_tuple('9.9')
+
+    def test_version_tuple__should_ignore_suffixes_and_trailing_zeros(self):
+        assert version_tuple('4.4.0-rc1') == (4, 4)
+        assert version_tuple('3.6.0') == version_tuple('3.6')
+
+    def test_mongo_version_below__should_compare_current_version(self, monkeypatch):
+        monkeypatch.setattr(flags, 'mongo_version', '10.0.1')
+
+        assert mongo_version_below('10.1')
+        assert not mongo_version_below('5.0')
+        assert not mongo_version_below('10.0')
@@ -0,0 +1,50 @@
+from mongoengine import fields
+
+from mongoengine_migrate.fields import converters
+from mongoengine_migrate.fields.registry import (
+    CONVERTION_MATRIX,
+    add_type_key,
+    get_registry_item,
+    get_type_converter,
+    invalidate_caches,
+    type_key_registry
+)
+
+
+class CustomStringField(fields.StringField):
+    pass
+
+
+class TestGetRegistryItem:
+    def test_get_registry_item__if_class_registered__should_return_its_item(self):
+        assert get_registry_item(fields.URLField) is type_key_registry['URLField']
+
+    def test_get_registry_item__if_class_not_registered__should_return_parent_item(self):
+        assert get_registry_item(CustomStringField) is type_key_registry['StringField']
+
+    def test_get_registry_item__if_class_added_to_registry__should_invalidate_cache(self):
+        assert get_registry_item(CustomStringField).field_cls is fields.StringField
+
+        add_type_key(CustomStringField)
+        try:
+            assert get_registry_item(CustomStringField).field_cls is CustomStringField
+        finally:
+            del type_key_registry['CustomStringField']
+            invalidate_caches()
+
+
+class TestGetTypeConverter:
+    def test_get_type_converter__should_resolve_parent_classes(self):
+        assert get_type_converter(CustomStringField, fields.IntField) is converters.to_int
+        assert get_type_converter(fields.IntField, CustomStringField) is converters.to_string
+
+    def test_get_type_converter__if_matrix_changed_and_cache_invalidated__should_return_new(self):
+        assert get_type_converter(fields.IntField, fields.LongField) is converters.to_long
+
+        CONVERTION_MATRIX[fields.IntField][fields.LongField] = converters.nothing
+        invalidate_caches()
+        try:
+            assert get_type_converter(fields.IntField, fields.LongField) is converters.nothing
+        finally:
+            CONVERTION_MATRIX[fields.IntField][fields.LongField] = converters.to_long
+            invalidate_caches()
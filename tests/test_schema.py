@@ -0,0 +1,144 @@
+from copy import deepcopy
+
+import dictdiffer
+import pytest
+
+from mongoengine_migrate.exceptions import SchemaError
+from mongoengine_migrate.schema import Schema
+
+
+class TestSchemaFingerprint:
+    def test_fingerprint__if_schemas_are_equal__should_be_equal(self):
+        schema1 = Schema().load({
+            'Doc1': {'fields': {'field1': {'a': 1, 'b': 2}, 'field2': {}},
+                     'parameters': {'collection': 'doc1'}}
+        })
+        schema2 = Schema().load({
+            'Doc1': {'parameters': {'collection': 'doc1'},
+                     'fields': {'field2': {}, 'field1': {'b': 2, 'a': 1}}}
+        })
+
+        assert schema1.fingerprint() == schema2.fingerprint()
+
+    def test_fingerprint__if_schemas_are_different__should_be_different(self):
+        schema1 = Schema().load({
+            'Doc1': {'fields': {'field1': {'a': 1}}, 'parameters': {'collection': 'doc1'}}
+        })
+        schema2 = Schema().load({
+            'Doc1': {'fields': {'field1': {'a': 1}}, 'parameters': {'collection': 'doc2'}}
+        })
+
+        assert schema1.fingerprint() != schema2.fingerprint()
+
+
+class TestSchemaPatch:
+    @pytest.fixture
+    def schema(self):
+        return Schema().load({
+            'Doc1': {
+                'fields': {'field1': {'a': 1, 'b': [1, 2]}, 'field2': {'a': 2}},
+                'parameters': {'collection': 'doc1'}
+            }
+        })
+
+    @pytest.fixture
+    def diff(self):
+        return [
+            ('add', 'Doc1', [('field3', {'a': 3})]),
+            ('change', 'Doc1.field1.a', (1, 10)),
+            ('change', ['Doc1', 'field1', 'b', '0'], (1, 5)),
+            ('remove', 'Doc1.field1', [('b', ())]),
+            ('remove', 'Doc1', [('field2', {'a': 2})]),
+            ('add', '', [('Doc2', Schema.Document(parameters={'collection': 'doc2'}))]),
+        ]
+
+    def test_patch__should_give_the_same_result_as_dictdiffer(self, schema, diff):
+        expect = dictdiffer.patch(diff, schema)
+
+        res = schema.patch(diff)
+
+        assert res is schema
+        assert res == expect
+
+    def test_patch__should_copy_inserted_values(self, schema, diff):
+        schema.patch(diff)
+
+        schema['Doc1']['field3']['a'] = 4
+
+        assert diff[0][2][0][1] == {'a': 3}
+
+    @pytest.mark.parametrize('bad_diff,exc', (
+        (('remove', 'Doc1', [('unknown_field', {})]), SchemaError),
+        (('change', 'Doc1.field1.c.d', (1, 2)), KeyError),
+        (('unknown_action', 'Doc1', []), ValueError),
+    ))
+    def test_patch__if_error__should_rollback_changes_and_reraise(
+            self, schema, diff, bad_diff, exc
+    ):
+        expect = deepcopy(schema)
+
+        with pytest.raises(exc):
+            schema.patch(diff + [bad_diff])
+
+        assert schema == expect
+        assert schema['Doc1'].parameters == expect['Doc1'].parameters
+
+    def test_patch__for_large_schema__should_give_the_same_result_as_dictdiffer(self):
+        # 500 documents, 10k fields
+        schema = Schema().load({
+            f'Doc{d}': {
+                'fields': {f'field{f}': {'type_key': 'StringField', 'max_length': None}
+                           for f in range(20)},
+                'parameters': {'collection': f'doc{d}'}
+            }
+            for d in range(500)
+        })
+        diffs = [
+            [('change', f'Doc{d}.field{d % 20}.max_length', (None, d)),
+             ('add', f'Doc{d}', [('new_field', {'type_key': 'IntField'})])]
+            for d in range(0, 500, 10)
+        ]
+
+        expect = schema
+        for diff in diffs:
+            expect = dictdiffer.patch(diff, expect)
+
+        for diff in diffs:
+            schema.patch(diff)
+
+        assert schema == expect
+
+
+class TestSchemaDocumentIndexes:
+    @pytest.fixture
+    def db_schema(self):
+        return {
+            'Doc1': {
+                'fields': {'field1': {'a': 1}},
+                'parameters': {'collection': 'doc1'},
+                'indexes': [{'name': 'field1_1', 'fields': [['field1', 1]], 'sparse': True}]
+            }
+        }
+
+    def test_load__should_load_indexes_by_name(self, db_schema):
+        schema = Schema().load(db_schema)
+
+        assert schema['Doc1'].indexes == {'field1_1': {'fields': [['field1', 1]], 'sparse': True}}
+
+    def test_dump__should_give_the_same_result_as_loaded(self, db_schema):
+        assert Schema().load(db_schema).dump() == db_schema
+
+    def test_dump__if_no_indexes__should_not_dump_them(self):
+        schema = Schema().load({'Doc1': {'fields': {}, 'parameters': {'collection': 'doc1'}}})
+
+        assert 'indexes' not in schema['Doc1'].dump()
+
+    def test_eq__if_indexes_are_different__should_not_be_equal(self, db_schema):
+        schema1 = Schema().load(db_schema)
+        schema2 = deepcopy(schema1)
+
+        assert schema1 == schema2
+
+        schema2['Doc1'].indexes['field1_1']['sparse'] = False
+
+        assert schema1 != schema2
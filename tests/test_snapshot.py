@@ -0,0 +1,91 @@
+import pytest
+from bson import ObjectId
+
+from mongoengine_migrate.actions import DropField, AlterField
+from mongoengine_migrate.graph import MigrationPolicy
+from mongoengine_migrate.snapshot import FieldSnapshot, get_current_snapshot
+
+
+@pytest.fixture
+def snapshot(test_db):
+    return FieldSnapshot(test_db['mongoengine_migrate_snapshot'], '0001_test', 1)
+
+
+@pytest.fixture
+def dump_data(dump_db):
+    def w():
+        res = dump_db()
+        res.pop('mongoengine_migrate_snapshot', None)
+        return res
+
+    return w
+
+
+class TestFieldSnapshot:
+    @pytest.mark.parametrize('document_type,field_name', (
+        ('Schema1Doc1', 'doc1_str'),
+        ('~Schema1EmbDoc1', 'embdoc1_str'),
+    ))
+    def test_restore__after_drop_field__should_restore_original_values(
+            self, load_fixture, test_db, dump_data, snapshot, document_type, field_name
+    ):
+        schema = load_fixture('schema1').get_schema()
+        expect = dump_data()
+
+        action = DropField(document_type, field_name)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+        with snapshot.recording():
+            assert get_current_snapshot() is snapshot
+            action.run_forward()
+        assert get_current_snapshot() is None
+        assert expect != dump_data()
+
+        action.run_backward()
+        snapshot.restore(test_db)
+
+        assert expect == dump_data()
+        assert snapshot.collection.count_documents({}) == 0
+
+    def test_record_document__should_keep_the_first_recorded_value(self, test_db, snapshot):
+        with snapshot.recording():
+            snapshot.record_document('test_col', {'_id': 1, 'a': 1}, {'_id': 1, 'a': 2, 'b': 3})
+            snapshot.record_document('test_col', {'_id': 1, 'a': 2}, {'_id': 1, 'a': 3})
+        test_db['test_col'].insert_one({'_id': 1, 'a': 3, 'b': 3})
+
+        snapshot.restore(test_db)
+
+        assert list(test_db['test_col'].find()) == [{'_id': 1, 'a': 1}]
+
+    def test_restore__if_nothing_recorded__should_do_nothing(self, test_db, dump_data, snapshot):
+        dump = dump_data()
+
+        res = snapshot.restore(test_db)
+
+        assert res == 0
+        assert dump == dump_data()
+
+    def test_record_path__if_condition_given__should_record_only_matched_documents(
+            self, test_db, snapshot
+    ):
+        test_db['test_col'].insert_many([{'_id': 1, 'a': 'long'}, {'_id': 2, 'a': 's'}])
+
+        with snapshot.recording():
+            snapshot.record_path(test_db['test_col'], 'a', {}, lambda p: {p: 'long'})
+
+        records = snapshot.collection.find({}, {'_id': 0, 'document_id': 1, 'value': 1})
+        assert list(records) == [{'document_id': 1, 'value': 'long'}]
+
+    def test_record__after_string_truncation__should_record_only_truncated_values(
+            self, load_fixture, test_db, snapshot
+    ):
+        schema = load_fixture('schema1').get_schema()
+        doc_id = ObjectId(f'{1:024}')
+        test_db['schema1_doc1'].update_one({'_id': doc_id}, {'$set': {'doc1_str': 'long string'}})
+
+        action = AlterField('Schema1Doc1', 'doc1_str', max_length=5)
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+        with snapshot.recording():
+            action.run_forward()
+
+        records = snapshot.collection.find({}, {'_id': 0, 'document_id': 1, 'value': 1})
+        assert list(records) == [{'document_id': doc_id, 'value': 'long string'}]
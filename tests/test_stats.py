@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from mongoengine_migrate.actions import DropField
+from mongoengine_migrate.graph import MigrationPolicy
+from mongoengine_migrate.stats import ActionStats, get_current_stats
+from mongoengine_migrate.updater import DocumentUpdater, ByDocContext
+
+
+class TestActionStats:
+    def test_collecting__by_path__should_aggregate_write_results(self, load_fixture, test_db):
+        schema = load_fixture('schema1').get_schema()
+        expect_count = test_db['schema1_doc1'].count_documents({'doc1_str': {'$exists': True}})
+        stats = ActionStats()
+        action = DropField('Schema1Doc1', 'doc1_str')
+        action.prepare(test_db, schema, MigrationPolicy.strict)
+
+        with stats.collecting():
+            assert get_current_stats() is stats
+            action.run_forward()
+
+        assert get_current_stats() is None
+        assert stats.elapsed > 0
+        res = stats.to_list()
+        assert len(res) == 1
+        assert res[0]['collection'] == 'schema1_doc1'
+        assert res[0]['field'] == 'doc1_str'
+        assert res[0]['queries'] == 1
+        assert res[0]['matched_count'] == expect_count
+        assert res[0]['modified_count'] == expect_count
+
+    def test_collecting__by_doc__should_count_scanned_documents(self, load_fixture, test_db):
+        schema = load_fixture('schema1').get_schema()
+        expect_count = test_db['schema1_doc1'].count_documents({'doc1_str': {'$exists': True}})
+        stats = ActionStats()
+        updater = DocumentUpdater(test_db, 'Schema1Doc1', schema, 'doc1_str',
+                                  MigrationPolicy.strict)
+
+        def by_doc(ctx: ByDocContext):
+            ctx.document['doc1_str'] = 'test'
+
+        with stats.collecting():
+            updater.update_by_document(by_doc)
+
+        res = stats.to_list()
+        assert len(res) == 1
+        assert res[0]['scanned_count'] == expect_count
+        assert res[0]['matched_count'] == expect_count
+
+    def test_collecting__should_be_current_only_in_its_own_thread(self):
+        stats = ActionStats()
+
+        with stats.collecting(), ThreadPoolExecutor(max_workers=1) as executor:
+            res = executor.submit(get_current_stats).result()
+
+            assert get_current_stats() is stats
+
+        assert res is None
+        assert get_current_stats() is None
@@ -0,0 +1,96 @@
+import pytest
+from bson import ObjectId
+
+import mongoengine_migrate.flags as flags
+from mongoengine_migrate.exceptions import MigrationError
+from mongoengine_migrate.graph import MigrationPolicy
+from mongoengine_migrate.updater import DocumentUpdater, ByDocContext
+
+
+class TestUpdateByDocumentOptimisticConcurrency:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        flags.optimistic_concurrency = True
+        yield
+        flags.optimistic_concurrency = False
+
+    def test_update_by_document__on_concurrent_modification__should_process_document_again(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        updater = DocumentUpdater(test_db, 'Schema1Doc1', schema, 'doc1_str',
+                                  MigrationPolicy.strict)
+        touched = set()
+
+        def by_doc(ctx: ByDocContext):
+            doc = ctx.document
+            if doc['_id'] not in touched:
+                # Simulate a concurrent write between read and write
+                touched.add(doc['_id'])
+                flags.database2['schema1_doc1'].update_one({'_id': doc['_id']},
+                                                           {'$set': {'doc1_str': 'concurrent'}})
+            doc['doc1_str'] = doc['doc1_str'] + '!'
+
+        updater.update_by_document(by_doc)
+
+        values = [doc['doc1_str'] for doc in test_db['schema1_doc1'].find()
+                  if 'doc1_str' in doc]
+        assert values
+        assert all(val == 'concurrent!' for val in values)
+
+    def test_update_by_document__if_documents_are_modified_constantly__should_raise_error(
+            self, load_fixture, test_db
+    ):
+        schema = load_fixture('schema1').get_schema()
+        updater = DocumentUpdater(test_db, 'Schema1Doc1', schema, 'doc1_str',
+                                  MigrationPolicy.strict)
+
+        def by_doc(ctx: ByDocContext):
+            doc = ctx.document
+            flags.database2['schema1_doc1'].update_one({'_id': doc['_id']},
+                                                       {'$set': {'doc1_str': str(ObjectId())}})
+            doc['doc1_str'] = doc['doc1_str'] + '!'
+
+        with pytest.raises(MigrationError):
+            updater.update_by_document(by_doc)
+
+    def test_build_concurrency_filter__should_include_only_changed_fields(self):
+        prev_doc = {'_id': 1, 'a': 1, 'b': {'c': 2}, 'd': None, 'e': 'unchanged'}
+        doc = {'_id': 1, 'a': 2, 'b': {'c': 3}, 'd': 5, 'e': 'unchanged', 'f': 6}
+        expect = {
+            '_id': 1,
+            'a': {'$eq': 1},
+            'd': {'$type': 'null'},
+            'f': {'$exists': False},
+            '$expr': {'$eq': ['$b', {'$literal': {'c': 2}}]}
+        }
+
+        res = DocumentUpdater._build_concurrency_filter(prev_doc, doc)
+
+        assert res == expect
+
+    def test_build_concurrency_filter__if_value_wrapped_in_array__should_not_match(
+            self, test_db
+    ):
+        prev_doc = {'_id': 1, 'a': [1, 2], 'b': {'c': 2}}
+        doc = {'_id': 1, 'a': [1], 'b': {'c': 3}}
+        # Concurrent write has wrapped values in arrays
+        test_db['test_col'].insert_one({'_id': 1, 'a': [[1, 2]], 'b': [{'c': 2}]})
+
+        res = DocumentUpdater._build_concurrency_filter(prev_doc, doc)
+
+        assert test_db['test_col'].count_documents(res) == 0
+        test_db['test_col'].replace_one({'_id': 1}, prev_doc)
+        assert test_db['test_col'].count_documents(res) == 1
+
+    def test_build_concurrency_update__should_set_and_unset_only_changed_fields(self):
+        prev_doc = {'_id': 1, 'a': 1, 'b': 2, 'e': 'unchanged'}
+        doc = {'_id': 1, 'a': 2, 'e': 'unchanged', 'f': 6}
+        expect = {
+            '$set': {'a': 2, 'f': 6},
+            '$unset': {'b': ''}
+        }
+
+        res = DocumentUpdater._build_concurrency_update(prev_doc, doc)
+
+        assert res == expect
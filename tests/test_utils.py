@@ -1,5 +1,5 @@
 import pytest
-from mongoengine_migrate.utils import Slotinit
+from mongoengine_migrate.utils import Slotinit, get_closest_parent
 
 
 class SlotinitStub(Slotinit):
@@ -115,3 +115,27 @@ class TestSlotinit:
         assert not obj2 == obj1
         assert obj1 != obj2
         assert obj2 != obj1
+
+
+class TestGetClosestParent:
+    class A:
+        pass
+
+    class B(A):
+        pass
+
+    class C(B):
+        pass
+
+    @pytest.mark.parametrize('target,classes,expect', (
+        (C, [A, B], B),
+        (C, [B, A], B),
+        (C, [A], A),
+        (C, [C, A], A),
+        (C, [C], None),
+        (A, [B, C], None),
+    ))
+    def test_get_closest_parent__should_return_nearest_parent_in_mro(
+            self, target, classes, expect
+    ):
+        assert get_closest_parent(target, iter(classes)) is expect
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+from pymongo import MongoClient
+
+from mongoengine_migrate.actions import AlterField, RenameField
+from mongoengine_migrate.exceptions import InconsistencyError
+from mongoengine_migrate.graph import Migration
+from mongoengine_migrate.loader import MongoengineMigrate
+from mongoengine_migrate.mongo import check_empty_result, check_no_duplicates
+from mongoengine_migrate.schema import Schema
+from mongoengine_migrate.validation import ValidationBatch, get_current_validation
+
+
+def string_field_params(db_field):
+    return dict(choices=None, db_field=db_field, default=None, max_length=None, min_length=None,
+                null=False, primary_key=False, regex=None, required=False, sparse=False,
+                type_key='StringField', unique=False, unique_with=None)
+
+
+@pytest.fixture
+def left_schema():
+    return Schema().load({
+        'Doc1': {
+            'fields': {'field1': string_field_params('field1'),
+                       'field2': string_field_params('field2')},
+            'parameters': {'collection': 'doc1'}
+        }
+    })
+
+
+@pytest.fixture
+def mongoengine_migrate(test_db, tmp_path):
+    return MongoengineMigrate(os.environ['DATABASE_URL'],
+                              'mongoengine_migrate',
+                              str(tmp_path),
+                              client=MongoClient(os.environ['DATABASE_URL']))
+
+
+class TestValidationBatch:
+    def test_run__should_report_all_violations_at_once(self, test_db):
+        test_db['doc1'].insert_many([{'field1': 'a', 'field2': 'b'}, {'field1': 'c'}])
+        validation = ValidationBatch()
+        with validation.collect(('0001_auto', 1)):
+            check_empty_result(test_db['doc1'], 'field1', {'field1': {'$nin': ['a']}})
+            check_empty_result(test_db['doc1'], 'field2', {'field2': 'b'})
+            check_empty_result(test_db['doc1'], 'field2', {'field2': 'z'})
+
+        with pytest.raises(InconsistencyError) as exc_info:
+            validation.run()
+
+        lines = str(exc_info.value).splitlines()
+        assert len(lines) == 2
+        assert 'doc1.field1' in lines[0] and 'c' in lines[0]
+        assert 'doc1.field2' in lines[1] and 'b' in lines[1]
+
+    def test_apply__should_skip_only_checks_made_by_batch(self, test_db):
+        test_db['doc1'].insert_one({'field1': 'a'})
+        fltr = {'field1': 'a'}
+        validation = ValidationBatch()
+        with validation.collect(('0001_auto', 1)):
+            check_empty_result(test_db['doc1'], 'field1', fltr)
+
+        with validation.apply(('0001_auto', 1)):
+            assert get_current_validation() is validation
+            check_empty_result(test_db['doc1'], 'field1', fltr)
+            with pytest.raises(InconsistencyError):
+                check_empty_result(test_db['doc1'], 'field1', fltr)
+
+        with validation.apply(('0001_auto', 2)), pytest.raises(InconsistencyError):
+            check_empty_result(test_db['doc1'], 'field1', fltr)
+        assert get_current_validation() is None
+
+    def test_collect__should_leave_duplicates_check_for_action_run(self, test_db):
+        test_db['doc1'].insert_many([{'field1': 'a'}, {'field1': 'a'}])
+        validation = ValidationBatch()
+        with validation.collect(('0001_auto', 1)):
+            check_no_duplicates(test_db['doc1'], ['field1'])
+
+        validation.run()
+        with validation.apply(('0001_auto', 1)), pytest.raises(InconsistencyError):
+            check_no_duplicates(test_db['doc1'], ['field1'])
+
+    def test_add__if_field_was_touched__should_not_take_check(self, test_db):
+        validation = ValidationBatch()
+        validation.touch('doc1', 'field1')
+        validation.touch('doc2', None)
+
+        with validation.collect(('0001_auto', 1)):
+            assert validation.add(test_db['doc1'], 'field1.sub', {}) is False
+            assert validation.add(test_db['doc2'], 'field1', {}) is False
+            assert validation.add(test_db['doc1'], 'field2', {}) is True
+
+            validation.mark_written('doc1')
+
+            assert validation.add(test_db['doc1'], 'field2', {}) is False
+
+
+class TestMongoengineMigratePrevalidate:
+    def test_prevalidate__should_report_violations_of_all_migrations_before_writes(
+            self, test_db, mongoengine_migrate, left_schema
+    ):
+        test_db['doc1'].insert_many([{'field1': 'a', 'field2': 'b'}, {'field1': 'x'}])
+        migrations = [
+            Migration(name='0001_auto', dependencies=[], module=None,
+                      actions=[AlterField('Doc1', 'field1', choices=['a', 'b'])]),
+            Migration(name='0002_auto', dependencies=['0001_auto'], module=None,
+                      actions=[AlterField('Doc1', 'field2', choices=['a'])]),
+        ]
+
+        with pytest.raises(InconsistencyError) as exc_info:
+            mongoengine_migrate._prevalidate(left_schema, migrations, {})
+
+        assert 'doc1.field1' in str(exc_info.value)
+        assert 'doc1.field2' in str(exc_info.value)
+
+    def test_prevalidate__if_field_modified_before__should_leave_check_in_place(
+            self, test_db, mongoengine_migrate, left_schema
+    ):
+        test_db['doc1'].insert_one({'field1': 'x'})
+        migrations = [
+            Migration(name='0001_auto', dependencies=[], module=None, actions=[
+                RenameField('Doc1', 'field1', new_name='field3'),
+                AlterField('Doc1', 'field3', db_field='field3'),
+                AlterField('Doc1', 'field3', choices=['a']),
+            ]),
+        ]
+
+        res = mongoengine_migrate._prevalidate(left_schema, migrations, {})
+
+        assert res._checks == {}